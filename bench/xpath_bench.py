@@ -0,0 +1,290 @@
+#! /usr/bin/env python
+'''
+ * File:    xpath_bench.py
+ * Author:  George Ungureanu <ugeorge@kth.se>
+ * Purpose: microbenchmark for the bundled XPath engine. Times the
+            query shapes used by the f2dot label settings on generated
+            ForSyDe-IR documents and writes the results as JSON.
+ * License: BSD3
+'''
+
+'''
+Copyright (c) 2014, George Ungureanu
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are
+met:
+
+1. Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its
+contributors may be used to endorse or promote products derived from
+this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+"AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+'''
+
+import os
+import sys
+import json
+import random
+import argparse
+import platform
+import resource
+import xml.dom.minidom as xmlparser
+from timeit import default_timer as timer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import xpath
+import xpath.adapters
+import xpath.expr
+
+## The benchmarked queries, as (name, query, context nodes). The
+## context nodes are selected with an XPath query on the document.
+QUERIES = [
+	('attribute',        './@name',
+	                     '//leaf_process'),
+	('child_path',       './process_constructor/@name',
+	                     '//leaf_process'),
+	('deep_child_path',  './process_constructor/argument/@value',
+	                     '//leaf_process'),
+	('child_predicate',  './port[@direction = "in"]/@name',
+	                     '//leaf_process'),
+	('positional_first', './port[1]/@name',
+	                     '//leaf_process'),
+	('positional_last',  './port[last()]/@name',
+	                     '//leaf_process'),
+	('self_predicate',   '.[@type != "int"]/@moc',
+	                     '//signal'),
+	('descendant',       './/argument[@name = "_func"]/@value',
+	                     '//leaf_process'),
+	('union',            './@name | ./process_constructor/@name',
+	                     '//leaf_process'),
+	('string_value',     'string(./process_constructor/argument)',
+	                     '//leaf_process'),
+	('port_attributes',  './@name && ./@type',
+	                     '//leaf_process/port'),
+	('document_lookup',  '//signal[@source = "p1"]/@name',
+	                     '/process_network'),
+]
+
+## Generates a ForSyDe-IR process network with leaf processes chained
+## by signals, each leaf with ports and a process constructor
+# @param int $processes
+#        Number of leaf processes
+# @param int $ports
+#        Number of input (and output) ports of each leaf process
+# @param int $seed
+#        Seed for the random attribute values
+# @return A string with the XML document
+def generateModel(processes, ports, seed=1):
+	rand = random.Random(seed)
+	types = ['int', 'double', 'std::vector&lt;int&gt;']
+	out = ['<?xml version="1.0" ?>\n',
+	       '<!-- Automatically generated by ForSyDe -->\n',
+	       '<process_network name="top">\n',
+	       '  <port name="iport1" type="int" direction="in" bound_process="p0" bound_port="iport1"/>\n',
+	       '  <port name="oport1" type="int" direction="out" bound_process="p%d" bound_port="oport1"/>\n' % (processes - 1)]
+	for i in xrange(processes - 1):
+		out.append('  <signal name="s%d" moc="sy" type="%s" source="p%d" source_port="oport1" target="p%d" target_port="iport1"/>\n'
+		           % (i, rand.choice(types), i, i + 1))
+	for i in xrange(processes):
+		out.append('  <leaf_process name="p%d">\n' % i)
+		for j in xrange(ports):
+			out.append('    <port name="iport%d" type="%s" direction="in"/>\n' % (j + 1, rand.choice(types)))
+		for j in xrange(ports):
+			out.append('    <port name="oport%d" type="%s" direction="out"/>\n' % (j + 1, rand.choice(types)))
+		out.append('    <process_constructor name="comb%d" moc="sy">\n' % ports)
+		out.append('      <argument name="_func" value="p%d_func">\n' % i)
+		out.append('        int p%d_func(int a) { return a + %d; }\n' % (i, rand.randint(0, 9)))
+		out.append('      </argument>\n')
+		out.append('      <argument name="init" value="%d"/>\n' % rand.randint(0, 3))
+		out.append('    </process_constructor>\n')
+		out.append('  </leaf_process>\n')
+	out.append('</process_network>\n')
+	return ''.join(out)
+
+## Returns the peak resident memory of the process
+# @return The maximum resident set size, in kilobytes
+def maxRss():
+	rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	if sys.platform == 'darwin':
+		rss = rss / 1024
+	return rss
+
+## Builds a document tree from an XML string
+# @param str $text
+#        The XML document
+# @param str $tree
+#        \c dom for xml.dom.minidom, \c etree for the compact trees
+#        of xpath.adapters
+# @return The document node
+def parseModel(text, tree):
+	if tree == 'etree':
+		return xpath.adapters.fromstring(text)
+	return xmlparser.parseString(text)
+
+## Counts the nodes of a document, attributes included
+# @param Node $document
+#        The document node
+# @return The number of nodes
+def countNodes(document):
+	axes = xpath.expr.axes
+	return sum(1 + len(list(axes['attribute'](node)))
+	           for node in axes['descendant-or-self'](document))
+
+## Returns the best (lowest) time of several runs of a function
+# @param function $f
+#        The function to time
+# @param int $repeat
+#        Number of runs
+# @return The best time in seconds, and the value returned by \c f
+def bestOf(f, repeat):
+	best = None
+	for i in xrange(repeat):
+		start = timer()
+		value = f()
+		elapsed = timer() - start
+		if best is None or elapsed < best:
+			best = elapsed
+	return best, value
+
+## Times the compilation of a query, bypassing the compiled query cache
+# @param list $queries
+#        The queries, as separated by '&&' in a label
+# @param int $repeat
+#        Number of compilations
+# @return The mean compilation time in microseconds
+def timeCompile(queries, repeat):
+	start = timer()
+	for i in xrange(repeat):
+		for query in queries:
+			xpath.XPath(query)
+	return (timer() - start) / repeat * 1e6
+
+## Benchmarks one query on a document
+# @param Node $document
+#        The document node
+# @param tuple $shape
+#        The (name, query, context nodes) entry of QUERIES
+# @param dict $args
+#        The command-line arguments
+# @return A dictionary with the measurements
+def benchQuery(document, shape, args):
+	name, label, contextQuery = shape
+	queries = [q.strip() for q in label.split('&&')]
+	nodes = xpath.find(contextQuery, document)
+	context = xpath.XPathContext(document)
+	compiled = [xpath.XPath(q) for q in queries]
+
+	def evaluate():
+		results = 0
+		for node in nodes:
+			for expr in compiled:
+				value = expr.find(node, context)
+				results += len(value) if isinstance(value, list) else 1
+		return results
+
+	def evaluateGroup():
+		results = context.findgroupeach(queries, nodes)
+		return sum(len(v) if isinstance(v, list) else 1
+		           for row in results for v in row)
+
+	evalTime, results = bestOf(evaluate, args.repeat)
+	groupTime, groupResults = bestOf(evaluateGroup, args.repeat)
+	perNode = evalTime / len(nodes) * 1e6 if nodes else 0.0
+	return {
+		'name'               : name,
+		'query'              : label,
+		'context'            : contextQuery,
+		'context_nodes'      : len(nodes),
+		'results'            : results,
+		'compile_us'         : timeCompile(queries, args.compile_repeat),
+		'eval_s'             : evalTime,
+		'eval_us_per_node'   : perNode,
+		'group_eval_s'       : groupTime,
+		'maxrss_kb'          : maxRss(),
+	}
+
+## Benchmarks all queries on a generated document of a given size
+# @param int $processes
+#        Number of leaf processes in the document
+# @param dict $args
+#        The command-line arguments
+# @return A dictionary with the measurements
+def benchDocument(processes, args):
+	text = generateModel(processes, args.ports)
+	rssBefore = maxRss()
+	start = timer()
+	document = parseModel(text, args.tree)
+	parseTime = timer() - start
+	rssParsed = maxRss()
+	nodes = countNodes(document)
+	shapes = [s for s in QUERIES if not args.query or s[0] in args.query]
+	return {
+		'processes'          : processes,
+		'ports'              : args.ports,
+		'bytes'              : len(text),
+		'nodes'              : nodes,
+		'parse_s'            : parseTime,
+		'tree_kb'            : rssParsed - rssBefore,
+		'tree_bytes_per_node': (rssParsed - rssBefore) * 1024.0 / nodes,
+		'queries'            : [benchQuery(document, s, args) for s in shapes],
+	}
+
+def main():
+	parser = argparse.ArgumentParser(description='Microbenchmark for the '
+	                                 'bundled XPath engine.')
+	parser.add_argument('-s', '--sizes', default='100,1000',
+	                    help="Comma-separated numbers of leaf processes of the \
+	                    generated documents (default 100,1000).")
+	parser.add_argument('-p', '--ports', type=int, default=2,
+	                    help="Input and output ports per leaf process (default 2).")
+	parser.add_argument('-r', '--repeat', type=int, default=3,
+	                    help="Evaluation runs per query; the best one is \
+	                    reported (default 3).")
+	parser.add_argument('--compile-repeat', type=int, default=200,
+	                    help="Compilations per query (default 200).")
+	parser.add_argument('-t', '--tree', choices=['dom', 'etree'], default='dom',
+	                    help="Document tree: xml.dom.minidom or the compact \
+	                    ElementTree-based trees (default dom).")
+	parser.add_argument('-q', '--query', action='append',
+	                    help="Only run the named query shape. May be repeated.")
+	parser.add_argument('-o', '--output',
+	                    help="Write the JSON results to this file instead of \
+	                    the standard output.")
+	args = parser.parse_args()
+
+	results = {
+		'python'     : platform.python_version(),
+		'platform'   : platform.platform(),
+		'tree'       : args.tree,
+		'repeat'     : args.repeat,
+		'documents'  : [benchDocument(int(n), args) for n in args.sizes.split(',')],
+	}
+	if args.output:
+		with open(args.output, 'w') as f:
+			json.dump(results, f, indent=2, sort_keys=True)
+	else:
+		json.dump(results, sys.stdout, indent=2, sort_keys=True)
+		print
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,354 @@
+'''
+ * File:    dotwriter.py
+ * Author:  George Ungureanu <ugeorge@kth.se>
+ * Purpose: streaming DOT writer. Writes the nodes, edges and nested
+            clusters of a graph to a DOT file as soon as they are added,
+            without building a pygraphviz graph in memory.
+ * License: BSD3
+'''
+
+'''
+Copyright (c) 2014, George Ungureanu
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are
+met:
+
+1. Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its
+contributors may be used to endorse or promote products derived from
+this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+"AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+'''
+
+import gzip
+
+INDENT = '\t'
+
+## Quotes a DOT identifier or attribute value
+# @param str $value
+#        The identifier or value. Other objects are converted to strings
+# @return The quoted, UTF-8 encoded string
+def quote(value):
+	if not isinstance(value, basestring):
+		value = str(value)
+	if isinstance(value, unicode):
+		value = value.encode('utf-8')
+	return '"' + value.replace('"', '\\"') + '"'
+
+## Formats a list of DOT attributes
+# @param dict $attrs
+#        The attributes
+# @param dict $common
+#        (optional) Attributes shared with other elements, overridden
+#        by \c attrs
+# @return The attribute list, in brackets, or an empty string
+def formatAttrs(attrs, common=None):
+	if common:
+		common = dict(common)
+		common.update(attrs)
+		attrs = common
+	if not attrs:
+		return ''
+	return ' [' + ', '.join(key + '=' + quote(attrs[key])
+	                        for key in sorted(attrs)) + ']'
+
+## Returns the attributes which differ from their defaults
+# @param dict $attrs
+#        The attributes of an element
+# @param dict $defaults
+#        The default attributes, as set with DotSubgraph.setDefaults.
+#        Attributes with no default are assumed to default to ''
+# @return A dictionary with the attributes to write for the element
+def nonDefaultAttrs(attrs, defaults):
+	return dict((key, value) for key, value in attrs.iteritems()
+	            if str(defaults.get(key, '')) != str(value))
+
+## A subgraph (or cluster) of a graph written by a DotWriter. It
+## provides the methods of \c pygraphviz.AGraph used by the model
+## parsers, but keeps no nodes or edges.
+class DotSubgraph:
+
+	## Class constructor
+	# @param DotSubgraph $self
+	#        The object pointer
+	# @param DotWriter $writer
+	#        The writer of the graph
+	# @param DotSubgraph $parent
+	#        The parent subgraph, or \c None for the root graph
+	# @param str $name
+	#        The subgraph name
+	def __init__(self, writer, parent, name):
+		self.writer = writer
+		self.parent = parent
+		self.name = name
+		if parent is None:
+			self.path = []
+		else:
+			self.path = parent.path + [self]
+
+	## Adds a subgraph to this subgraph
+	# @param DotSubgraph $self
+	#        The object pointer
+	# @param str $name
+	#        The subgraph name. Names starting with \c cluster make
+	#        clusters
+	# @return The new DotSubgraph object
+	def subgraph(self, name=None, **attrs):
+		sub = DotSubgraph(self.writer, self, name)
+		self.writer.writeSubgraph(sub, attrs)
+		return sub
+
+	## Adds a node to this subgraph
+	# @param DotSubgraph $self
+	#        The object pointer
+	# @param str $n
+	#        The node name
+	def add_node(self, n, **attrs):
+		self.writer.nodeCount += 1
+		self.writer.writeStatement(self, self.writer.nodeStatement(n, attrs))
+
+	## Adds several nodes to this subgraph
+	# @param DotSubgraph $self
+	#        The object pointer
+	# @param list $nodes
+	#        The nodes, each given as a name or as a (name, attributes)
+	#        tuple. The keyword arguments are attributes for all nodes.
+	def add_nodes_from(self, nodes, **attrs):
+		statements = []
+		for n in nodes:
+			own = {}
+			if isinstance(n, tuple):
+				n, own = n
+			statements.append(self.writer.nodeStatement(n, own, attrs))
+		self.writer.nodeCount += len(statements)
+		self.writer.writeStatements(self, statements)
+
+	## Adds an edge to this subgraph
+	# @param DotSubgraph $self
+	#        The object pointer
+	# @param str $u
+	#        The tail node name
+	# @param str $v
+	#        The head node name
+	def add_edge(self, u, v, **attrs):
+		self.writer.edgeCount += 1
+		self.writer.writeStatement(self, self.writer.edgeStatement(u, v, attrs))
+
+	## Adds several edges to this subgraph
+	# @param DotSubgraph $self
+	#        The object pointer
+	# @param list $edges
+	#        The edges, each given as a (tail, head) or a (tail, head,
+	#        attributes) tuple. The keyword arguments are attributes for
+	#        all edges.
+	def add_edges_from(self, edges, **attrs):
+		statements = []
+		for e in edges:
+			own = e[2] if len(e) > 2 else {}
+			statements.append(self.writer.edgeStatement(e[0], e[1], own, attrs))
+		self.writer.edgeCount += len(statements)
+		self.writer.writeStatements(self, statements)
+
+	## Sets default attributes for the elements added afterwards to this
+	## subgraph, including those of its subgraphs
+	# @param DotSubgraph $self
+	#        The object pointer
+	# @param str $element
+	#        \c node, \c edge or \c graph
+	def setDefaults(self, element, **attrs):
+		self.writer.writeStatement(self, element + formatAttrs(attrs))
+
+	## Adds the subgraph of a composite process. Unlike subgraph, the
+	## writer may lay it out on its own (see hierlayout).
+	# @param DotSubgraph $self
+	#        The object pointer
+	# @param str $name
+	#        The subgraph name
+	# @param str $prefix
+	#        The prefix shared by the names of the nodes in the subgraph
+	# @return The new subgraph
+	def composite(self, name, prefix, **attrs):
+		return self.writer.addComposite(self, name, prefix, attrs)
+
+	## Called when all the elements of a composite subgraph were added
+	# @param DotSubgraph $self
+	#        The object pointer
+	def finish(self):
+		pass
+
+## Writes a graph to a DOT file, as it is built. The statements of a
+## subgraph are grouped in one block as long as they are added one
+## after the other; otherwise the subgraph is closed and later reopened
+## by name, which DOT merges into the same subgraph.
+class DotWriter(DotSubgraph):
+	## @var nodeCount
+	#       The number of node statements written
+	## @var edgeCount
+	#       The number of edges written
+
+	## Class constructor. Opens the file and writes the graph header.
+	# @param DotWriter $self
+	#        The object pointer
+	# @param str $path
+	#        The output file
+	# @param bool $directed
+	#        \c True for a digraph
+	# @param bool $strict
+	#        \c True for a strict graph
+	# @param bool $compress
+	#        \c True to write the file gzip-compressed
+	# @param str $name
+	#        (optional) The graph name
+	def __init__(self, path, directed=True, strict=False, compress=False,
+	             name='', **attrs):
+		DotSubgraph.__init__(self, self, None, name)
+		if compress:
+			self.file = gzip.open(path, 'wb')
+		else:
+			self.file = open(path, 'wb')
+		self.edgeOp = ' -> ' if directed else ' -- '
+		self.stack = []
+		self.nodeCount = 0
+		self.edgeCount = 0
+		header = ('strict ' if strict else '') + \
+		         ('digraph ' if directed else 'graph ')
+		self.file.write(header + quote(name) + ' {\n')
+		if attrs:
+			self.file.write(INDENT + 'graph' + formatAttrs(attrs) + ';\n')
+
+	## Formats a node statement
+	# @param DotWriter $self
+	#        The object pointer
+	# @param str $n
+	#        The node name
+	# @param dict $attrs
+	#        The node attributes
+	# @param dict $common
+	#        (optional) Attributes shared with other nodes
+	# @return The statement
+	def nodeStatement(self, n, attrs, common=None):
+		return quote(n) + formatAttrs(attrs, common)
+
+	## Formats an edge statement
+	# @param DotWriter $self
+	#        The object pointer
+	# @param str $u
+	#        The tail node name
+	# @param str $v
+	#        The head node name
+	# @param dict $attrs
+	#        The edge attributes
+	# @param dict $common
+	#        (optional) Attributes shared with other edges
+	# @return The statement
+	def edgeStatement(self, u, v, attrs, common=None):
+		return quote(u) + self.edgeOp + quote(v) + formatAttrs(attrs, common)
+
+	## Adds the subgraph of a composite process, as a plain subgraph
+	# @param DotWriter $self
+	#        The object pointer
+	# @param DotSubgraph $sub
+	#        The parent subgraph
+	# @param str $name
+	#        The subgraph name
+	# @param str $prefix
+	#        The prefix shared by the names of the nodes in the subgraph
+	# @param dict $attrs
+	#        The subgraph attributes
+	# @return The new DotSubgraph object
+	def addComposite(self, sub, name, prefix, attrs):
+		return sub.subgraph(name, **attrs)
+
+	## Closes the open subgraphs until \c sub is the innermost one,
+	## opening it and its parents if needed
+	# @param DotWriter $self
+	#        The object pointer
+	# @param DotSubgraph $sub
+	#        The subgraph to write into
+	def enter(self, sub):
+		path = sub.path
+		depth = 0
+		while (depth < len(self.stack) and depth < len(path) and
+		       self.stack[depth] is path[depth]):
+			depth += 1
+		while len(self.stack) > depth:
+			self.stack.pop()
+			self.file.write(INDENT * (len(self.stack) + 1) + '}\n')
+		for s in path[depth:]:
+			self.file.write(INDENT * (len(self.stack) + 1) + 'subgraph ' +
+			                quote(self.subgraphName(s.name)) + ' {\n')
+			self.stack.append(s)
+
+	## Returns the name under which a subgraph is written
+	# @param DotWriter $self
+	#        The object pointer
+	# @param str $name
+	#        The subgraph name
+	# @return The name to write
+	def subgraphName(self, name):
+		return name
+
+	## Writes the header of a new subgraph, with its attributes
+	# @param DotWriter $self
+	#        The object pointer
+	# @param DotSubgraph $sub
+	#        The new subgraph
+	# @param dict $attrs
+	#        The subgraph attributes
+	def writeSubgraph(self, sub, attrs):
+		self.enter(sub)
+		if attrs:
+			self.file.write(INDENT * (len(self.stack) + 1) + 'graph' +
+			                formatAttrs(attrs) + ';\n')
+
+	## Writes a node or edge statement in a subgraph
+	# @param DotWriter $self
+	#        The object pointer
+	# @param DotSubgraph $sub
+	#        The subgraph
+	# @param str $statement
+	#        The statement
+	def writeStatement(self, sub, statement):
+		self.enter(sub)
+		self.file.write(INDENT * (len(self.stack) + 1) + statement + ';\n')
+
+	## Writes several node or edge statements in a subgraph
+	# @param DotWriter $self
+	#        The object pointer
+	# @param DotSubgraph $sub
+	#        The subgraph
+	# @param list $statements
+	#        The statements
+	def writeStatements(self, sub, statements):
+		if not statements:
+			return
+		self.enter(sub)
+		indent = INDENT * (len(self.stack) + 1)
+		self.file.write(''.join(indent + s + ';\n' for s in statements))
+
+	## Closes the open subgraphs and the graph, and the file
+	# @param DotWriter $self
+	#        The object pointer
+	def close(self):
+		self.enter(self)
+		self.file.write('}\n')
+		self.file.close()
@@ -40,14 +40,113 @@ OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 '''
 
 import os
+import gzip
+import shutil
 import argparse
 import logging
+import tempfile
 import __init__
-import pygraphviz as pgv
+import dotwriter
+import renderer
+import layoutcache
+import hierlayout
+import shardrenderer
+import layoutengine
+import lxmlbackend
+import xpathprofiler
+import parsemethods
+import utils
 from sdf3modelparser import Sdf3ModelParser
 from forsydemodelparser import ForsydeModelParser
 from settings import *
 
+logger = logging.getLogger('f2dot')
+
+## Copies a DOT file to the dot output
+# @param str $dotFile
+#        The DOT file
+# @param str $outFile
+#        The output file
+# @param bool $compress
+#        \c True to gzip-compress the output
+def writeDot(dotFile, outFile, compress):
+	with open(dotFile, 'rb') as fin:
+		if compress:
+			fout = gzip.open(outFile, 'wb')
+		else:
+			fout = open(outFile, 'wb')
+		with fout:
+			shutil.copyfileobj(fin, fout)
+
+## Plots a graph with the hierarchical layout. The dot output is the
+## assembled graph, with the positions.
+# @param Settings $settings
+#        The run-time settings
+# @param object $parser
+#        The model parser
+# @param dict $graphAttrs
+#        The graph attributes
+# @param list $outputs
+#        The (format, output file) pairs to render
+# @param LayoutCache $cache
+#        The layout cache, or \c None
+# @param list $fallbacks
+#        The layout fallbacks in use
+# @return \c True if the graph was plotted
+def plotHierarchical(settings, parser, graphAttrs, outputs, cache, fallbacks):
+	layout = hierlayout.HierarchicalLayout(settings.outPath, directed=True,
+	                                       **graphAttrs)
+	parser.plotModel(layout.root)
+	layout.root.finish()
+	dotFile = os.path.join(layout.directory, 'layout.dot')
+	ok = layout.layout(lambda nodes, edges:
+	                   layoutengine.chooseEngine(settings, nodes, edges, fallbacks), cache)
+	if ok:
+		layout.compose(dotFile)
+		ok = renderer.renderLayout(dotFile, outputs)
+	if ok and 'dot' in settings.formats:
+		writeDot(dotFile, settings.outputFile('dot'), settings['COMPRESS_DOT'] == 'YES')
+	layout.cleanup()
+	return ok
+
+## Plots a graph with a single layout
+# @param Settings $settings
+#        The run-time settings
+# @param object $parser
+#        The model parser
+# @param dict $graphAttrs
+#        The graph attributes
+# @param list $outputs
+#        The (format, output file) pairs to render
+# @param LayoutCache $cache
+#        The layout cache, or \c None
+# @param list $fallbacks
+#        The layout fallbacks in use
+# @return \c True if the graph was plotted
+def plotFlat(settings, parser, graphAttrs, outputs, cache, fallbacks):
+	# GraphViz reads plain DOT files only
+	compress = settings['COMPRESS_DOT'] == 'YES'
+	keepDot = 'dot' in settings.formats and not compress
+	if keepDot:
+		dotFile = settings.outputFile('dot')
+	else:
+		fd, dotFile = tempfile.mkstemp(suffix='.dot', dir=settings.outPath)
+		os.close(fd)
+	G = dotwriter.DotWriter(dotFile, directed=True, strict=False,
+	                        **graphAttrs)
+	parser.plotModel(G)
+	G.close()
+	if 'dot' in settings.formats and compress:
+		writeDot(dotFile, settings.outputFile('dot'), compress)
+	prog, options = layoutengine.chooseEngine(settings, G.nodeCount, G.edgeCount,
+	                                          fallbacks)
+	logger.info('Laying out %d nodes and %d edges with %s', G.nodeCount,
+	            G.edgeCount, ' '.join([prog] + options))
+	ok = renderer.render(dotFile, prog, outputs, cache, options)
+	if not keepDot:
+		os.remove(dotFile)
+	return ok
+
 def main():
 	parser = argparse.ArgumentParser(version= 'f2dot-' + __init__.__version__ +
                                      '  (c) 2014 ugeorge@kth.se',
@@ -78,14 +177,31 @@ def main():
                         level of detail before composite processes are displayed as black \
                         boxes. Overrides the setting in the configuration file.")
 	parser.add_argument("--prog", help="Graph generation algorithm \
-                        (neato, dot, twopi, circo, fdp, nop). Overrides the setting in \
-                        the configuration file.")
+                        (neato, dot, twopi, circo, fdp, sfdp, osage, patchwork, nop, \
+                        auto). auto chooses it from the size of the graph. Overrides \
+                        the setting in the configuration file.")
 	parser.add_argument("--format", help="Output file format (canon, \
                         cmap, cmapx, cmapx_np, dia, dot, fig, gd, gd2, gif, hpgl, imap, \
                         imap_np, ismap, jpe, jpeg, jpg, mif, mp, pcl, pdf, pic, plain, \
                         plain-ext, png, ps, ps2, svg, svgz, vml, vmlz, vrml, vtx, wbmp, \
-                        xdot, xlib - default dot). Overrides the setting \
+                        xdot, xlib - default dot). Several formats may be given, \
+                        separated by commas (e.g. svg,pdf,cmapx), in which case the \
+                        layout is computed only once. Overrides the setting \
                         in the configuration file.")
+	parser.add_argument("--draft", help="Quick preview: straight edges, \
+                        simple nodes without ports and edge labels as tooltips, with \
+                        a relaxed layout. Overrides the setting in the configuration \
+                        file.", action='store_true')
+	parser.add_argument("--focus", help="Hierarchical ID of the process \
+                        to plot, e.g. top@rx@demod@fft. The processes outside of its \
+                        neighbourhood are left out or drawn as stubs. Overrides the \
+                        setting in the configuration file.")
+	parser.add_argument("--radius", help="Size of the neighbourhood of \
+                        the focus, in signals (default 0). Overrides the setting in \
+                        the configuration file.", type=int)
+	parser.add_argument("--profile", help="Profile the XPath queries of \
+                        the label settings and report the slowest ones.",
+                        action='store_true')
 	args = parser.parse_args()
 
 	print 
@@ -116,10 +232,17 @@ def main():
 	logger.debug('Starting the program execution...')
 	settings = Settings(args)
 	logger.debug(settings.printSettings())
+	lxmlbackend.setBackend(settings['XPATH_BACKEND'])
+	renderer.setLimits(int(settings['LAYOUT_TIMEOUT']),
+	                   int(settings['LAYOUT_MEMORY_LIMIT']) << 20)
+	if args.profile:
+		xpathprofiler.enable()
+		parsemethods.profileLabelSettings(settings)
 
-	G = pgv.AGraph(directed=True, rankdir=settings['DIRECTION'],
-                   fontname='Helvetica', strict=False, overlap='prism',
-                   splines='true')
+	graphAttrs = dict(rankdir=settings['DIRECTION'], fontname='Helvetica',
+	                  overlap='prism', splines='true')
+	if settings['DRAFT'] == 'YES':
+		graphAttrs.update(overlap='true', splines='line')
 
 	if args.mode == 'forsyde':
 		parser = ForsydeModelParser(settings)
@@ -127,10 +250,77 @@ def main():
 	else:
 		parser = Sdf3ModelParser(settings)
 
-	parser.plotModel(G)
-	G.write(settings.outPathAndFile)
-	G.draw(path=settings.outPathAndFile, format=settings['FORMAT'], prog=settings['PROG'])
-	logger.info('Graph plotted in ' + settings.outPathAndFile)
+	# the DOT file is streamed while parsing, without any layout
+	compress = settings['COMPRESS_DOT'] == 'YES'
+	rendered = [fmt for fmt in settings.formats if fmt != 'dot']
+	if not rendered:
+		dotFile = settings.outputFile('dot')
+		G = dotwriter.DotWriter(dotFile, directed=True, strict=False,
+		                        compress=compress, **graphAttrs)
+		parser.plotModel(G)
+		G.close()
+		logger.info('Graph plotted in ' + dotFile)
+	else:
+		outputs = [(fmt, settings.outputFile(fmt)) for fmt in rendered]
+		cache = None
+		if settings['LAYOUT_CACHE']:
+			try:
+				cache = layoutcache.LayoutCache(os.path.expanduser(settings['LAYOUT_CACHE']),
+				                                int(settings['LAYOUT_CACHE_SIZE']) << 20)
+			except (IOError, OSError), e:
+				logger.warn('Cannot use the layout cache: %s', e)
+		# when the layout fails or exceeds its limits, it is retried
+		# with the fallbacks, each one added to the previous ones
+		steps = [step for step in utils.splitBy(settings['LAYOUT_FALLBACKS'], ',') if step]
+		sharded = settings['LAYOUT_MODE'] == 'sharded'
+		if sharded and not hasattr(parser, 'plotComponent'):
+			logger.warn('The sharded layout needs a ForSyDe model, using the flat one')
+			sharded = False
+		fallbacks = []
+		depth = None
+		while True:
+			attrs = dict(graphAttrs)
+			if 'lines' in fallbacks:
+				attrs['splines'] = 'line'
+			if sharded:
+				ok = shardrenderer.plotShards(settings, parser, attrs, cache, fallbacks)
+			elif settings['LAYOUT_MODE'] == 'hierarchical':
+				ok = plotHierarchical(settings, parser, attrs, outputs, cache, fallbacks)
+			else:
+				ok = plotFlat(settings, parser, attrs, outputs, cache, fallbacks)
+			if depth is None:
+				depth = getattr(parser, 'depth', 0)
+			if ok:
+				break
+			# skip the steps which cannot apply, rather than plotting
+			# the same graph again
+			applied = False
+			while steps and not applied:
+				step = steps.pop(0)
+				applied = True
+				if step == 'blackbox':
+					level = depth - fallbacks.count('blackbox')
+					if level < 2:
+						logger.warn('No composite process is left to draw as a black box')
+						applied = False
+						continue
+					settings.settingDict['DETAIL_LEVEL'] = str(level)
+			if not applied:
+				break
+			fallbacks.append(step)
+			logger.warn('Retrying the layout with the fallback: %s', step)
+		if not ok:
+			os._exit(1)
+		if fallbacks:
+			logger.warn('The graph was plotted with the layout fallbacks: %s',
+			            ', '.join(fallbacks))
+		if sharded:
+			logger.info('Graph plotted in ' + settings.outputFile('html'))
+		else:
+			for fmt in settings.formats:
+				logger.info('Graph plotted in ' + settings.outputFile(fmt))
+	if args.profile:
+		logger.info(xpathprofiler.report())
 
 	return
 
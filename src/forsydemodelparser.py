@@ -40,13 +40,55 @@ OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 '''
 
 import xml.dom.minidom as xmlparser
+import xml.etree.cElementTree as ElementTree
 import os
 import logging
 import utils
 from parsemethods import *
+from dotwriter import nonDefaultAttrs
 
 ID_SEP='@'
 
+## Counts the nodes and edges the process network of a component adds
+## to the graph, without extracting any label
+# @param str $xmlFile The ForSyDe-XML file of the component
+# @return A (nodes, edges, composites) tuple, where composites lists the
+#         (name, component name) pairs of its composite processes, which
+#         are not counted
+def countComponent(xmlFile):
+	nodes = 1 # the dummy node
+	edges = 0
+	composites = []
+	for pn in ElementTree.parse(xmlFile).getroot().iter('process_network'):
+		composites.extend((c.get('name'), c.get('component_name'))
+		                  for c in pn.iter('composite_process'))
+		ports = len(pn.findall('port'))
+		nodes += ports + sum(1 for leaf in pn.iter('leaf_process'))
+		edges += ports + sum(1 for signal in pn.iter('signal'))
+	return nodes, edges, composites
+
+## Default attributes of the process and port nodes, set once for the
+## whole graph
+NODE_DEFAULTS = {
+	'label'       : '',
+	'shape'       : 'record',
+	'color'       : 'black',
+	'fillcolor'   : 'transparent',
+	'style'       : 'rounded,filled',
+	'fontname'    : 'Helvetica',
+	'fontsize'    : '12',
+	'orientation' : '90',
+}
+
+## Attributes of the stub nodes, which stand for the processes just
+## outside of the focus
+STUB_ATTRS = {
+	'shape'     : 'box',
+	'style'     : 'dashed',
+	'color'     : 'gray',
+	'fontcolor' : 'gray',
+}
+
 ## Controller class for parsing ForSyDe-XML models.
 #
 #  This is a controller class which contains the main method for
@@ -63,9 +105,25 @@ class ForsydeModelParser:
 		self.set = settings
 		if settings['DIRECTION'] == "TB":
 			self.vertical = True
+			self.edgeDefaults = dict(tailport='s', headport='n', style='', penwidth='1')
 		else:
 			self.vertical = False
+			self.edgeDefaults = dict(tailport='e', headport='w', style='', penwidth='1')
 		self.rootProcess = utils.getFileName(settings.inFile)
+		self.depth = 0
+		self.draft = settings['DRAFT'] == 'YES'
+		self.blackBoxes = set()
+		self.link = None
+		self.focus = settings['FOCUS']
+		self.radius = int(settings['FOCUS_RADIUS'])
+		if self.focus and not (self.focus + ID_SEP).startswith(self.rootProcess + ID_SEP):
+			self.logger.error('The focus ' + self.focus + ' is not in the process network "' +
+			                  self.rootProcess + '"')
+			os._exit(1)
+		if self.draft:
+			self.nodeDefaults = dict(NODE_DEFAULTS, shape='box')
+		else:
+			self.nodeDefaults = NODE_DEFAULTS
 		
 		## @var logger 
 		#  Logger for this class
@@ -75,28 +133,84 @@ class ForsydeModelParser:
 
 		## @var vertical 
 		#  \c True if the plot was set to TB (top-bottom)
+
+		## @var edgeDefaults 
+		#  Default attributes of the edges
+
+		## @var depth 
+		#  The deepest level at which a composite process was plotted
+		#  as a subgraph
+
+		## @var draft 
+		#  \c True for a quick preview, without records nor edge labels
+
+		## @var nodeDefaults 
+		#  Default attributes of the nodes
+
+		## @var blackBoxes 
+		#  The IDs of the composite processes drawn as black boxes to
+		#  fit the MAX_NODES and MAX_EDGES budget
+
+		## @var link 
+		#  When plotting a single component, the function giving the
+		#  URL of the plot of a child component, else \c None
+
+		## @var focus 
+		#  The hierarchical ID of the process in focus, or an empty
+		#  string to plot the whole model
+
+		## @var radius 
+		#  The number of signals between the focus and the farthest
+		#  processes plotted around it
 		
 
 	## Function to parse a ForSyDe-XML model and plot a DOT graph,
 	## according to the settings.
 	# @param ForsydeModelParser $self The object pointer
 	def plotModel(self, graph):
-		xmldoc = xmlparser.parse(self.set.inPathAndFile)
+		self.link = None
+		self.blackBoxes = self.__fitBudget()
+		self.__plot(graph, self.set.inPathAndFile, self.rootProcess)
+
+	## Plots a single component of the model. Its composite processes
+	## are drawn as black boxes, linked to the plots of their components.
+	# @param ForsydeModelParser $self The object pointer
+	# @param DotWriter $graph The graph to plot to
+	# @param str $component The name of the component
+	# @param function $link Gives the URL of the plot of a component,
+	#        from its name
+	def plotComponent(self, graph, component, link):
+		focus = self.focus
+		self.link = link
+		self.focus = ''
+		self.blackBoxes = set()
+		try:
+			self.__plot(graph, os.path.join(self.set.inPath, component) + '.xml', component)
+		finally:
+			self.link = None
+			self.focus = focus
+
+	def __plot(self, graph, xmlFile, name):
+		xmldoc = xmlparser.parse(xmlFile)
+		setComponentFile(xmldoc, xmlFile)
 		if not xmldoc.childNodes[0].nodeValue == ' Automatically generated by ForSyDe ':
 			self.logger.error('File is not ForSyDe-IR! Re-run f2dot with the proper -t command.')
 			os._exit(1)
 
+		self.depth = 0
+		graph.setDefaults('node', **self.nodeDefaults)
+		graph.setDefaults('edge', **self.edgeDefaults)
 		bgColor = utils.computeBackground(utils.splitBy(self.set['COMPOSITE_BACKGROUND_COLOR_COEFFICIENTS'], ','),1)
 		frame = graph.subgraph( \
-			name="cluster_" + self.set.inFile, \
-			label = self.rootProcess, \
+			name="cluster_" + os.path.basename(xmlFile), \
+			label = name, \
 			style = 'filled, rounded', \
 			color = bgColor, \
 			fontsize = '13')
 
 		self.logger.info('Starting the parser on process network "' +
-                         self.rootProcess + '"...')
-		self.__parseXmlFile(xmldoc, frame, self.rootProcess, 2)
+                         name + '"...')
+		self.__parseXmlFile(xmldoc, frame, name, 2)
 
 
 	def __parseXmlFile(self, root, graph, parentId, level):
@@ -122,18 +236,33 @@ class ForsydeModelParser:
 		# process network node
 		for pn in root.getElementsByTagName('process_network'):
 			list_of_leaves = []
+			edges = []
 
-			# child composite processes
-			for composite in pn.getElementsByTagName('composite_process'):
-				compositeInfo = getBasicCompositeInfo(composite, parentId, self.set)
+			# the processes around the focus, if it is in this process
+			# network, and the stubs standing for their neighbours
+			focus = self.__focusNetwork(pn, parentId)
+			if focus:
+				list_of_leaves.extend(focus[1])
 
-				# if max level has been reached, transform composite into leaf
-				if (level>= int(self.set['DETAIL_LEVEL'])):	
+			# child composite processes
+			composites = pn.getElementsByTagName('composite_process')
+			if focus:
+				composites = self.__focusElements(composites, parentId, focus, clusters)
+			labels = getXpathLabels(composites, self.set.label('COMPOSITE_INFO_TAGS'))
+			for composite, label in zip(composites, labels):
+				compositeInfo = getBasicCompositeInfo(composite, parentId, self.set, label)
+
+				# if max level has been reached, transform composite into
+				# leaf, unless the focus is inside. Around the focus, only
+				# the path to it is expanded.
+				if (not self.__onFocusPath(compositeInfo.ID) and
+				    (level>= int(self.set['DETAIL_LEVEL']) or focus or
+				     compositeInfo.ID in self.blackBoxes or self.link)):
 					list_of_leaves.append(compositeInfo.ID)
 	
 					#build composite process information
 					list_of_ports = getCompositePortList(composite, self.set)
-					processLabel = buildRecord(compositeInfo.label, list_of_ports)
+					processLabel = self.__nodeLabel(compositeInfo.label, list_of_ports)
 					if not list_of_ports.in_ports and self.set['CLUSTER_SOURCES']:
 						clusterName = 'sources'
 					elif not list_of_ports.out_ports and self.set['CLUSTER_SINKS']:
@@ -147,7 +276,8 @@ class ForsydeModelParser:
 					clusters.add_node(clusterName, \
 						node = compositeInfo.ID, 
 						label = processLabel, \
-						fillcolor = self.set['COMPOSITE_BOX_COLOR'])
+						fillcolor = self.set['COMPOSITE_BOX_COLOR'],
+						URL = self.link(compositeInfo.component_name) if self.link else '')
 					self.logger.debug( 'Converted composite process ' + compositeInfo.ID 
 										+ ' to "black box" node' + ' in <' 
 										+ parentId + '>, clustered in ' + clusterName)
@@ -155,7 +285,9 @@ class ForsydeModelParser:
 
 				#else 
 				#build composite process information
-				xmlRoot = xmlparser.parse(os.path.join(self.set.inPath, compositeInfo.component_name) + '.xml')
+				xmlFile = os.path.join(self.set.inPath, compositeInfo.component_name) + '.xml'
+				xmlRoot = xmlparser.parse(xmlFile)
+				setComponentFile(xmlRoot, xmlFile)
 				bgColor = utils.computeBackground(utils.splitBy(self.set['COMPOSITE_BACKGROUND_COLOR_COEFFICIENTS'], ','),level)
 				if self.set['CLUSTER_OTHERS']:
 					clusterName = 'others'
@@ -170,20 +302,27 @@ class ForsydeModelParser:
 					name = "cluster_" + compositeInfo.ID, \
 					label = prettyPrintLables(compositeInfo.label), 
 					style = 'filled, rounded', 
-					color = bgColor)
+					color = bgColor,
+					prefix = compositeInfo.ID + ID_SEP)
 				self.logger.debug( 'Found composite process ' + compositeInfo.ID 
 									+ ' in <' + parentId 
 									+ '>. Building a subgraph in cluster ' + clusterName)
+				self.depth = max(self.depth, level)
 				self.__parseXmlFile(xmlRoot, frame, compositeInfo.ID, level + 1)
+				frame.finish()
 
 			#child leaf processes
-			for leaf in pn.getElementsByTagName('leaf_process'):
+			leaves = pn.getElementsByTagName('leaf_process')
+			if focus:
+				leaves = self.__focusElements(leaves, parentId, focus, clusters)
+			labels = getXpathLabels(leaves, self.set.label('LEAF_INFO_TAGS'))
+			for leaf, label in zip(leaves, labels):
 	
 				# build leaf process info	
-				leafInfo = getBasicLeafInfo(leaf, parentId, self.set)
+				leafInfo = getBasicLeafInfo(leaf, parentId, self.set, label)
 				list_of_leaves.append(leafInfo.ID)
 				list_of_ports = getLeafPortList(leaf, self.set)
-				processLabel = buildRecord(leafInfo.label, list_of_ports)
+				processLabel = self.__nodeLabel(leafInfo.label, list_of_ports)
 				if not list_of_ports.in_ports and self.set['CLUSTER_SOURCES']:
 					clusterName = 'sources'
 				elif not list_of_ports.out_ports and self.set['CLUSTER_SINKS']:
@@ -203,8 +342,10 @@ class ForsydeModelParser:
 				+ ' in <' + parentId + '>\n\t' + str(list_of_leaves))
 
 			#child (composite process) ports
-			for port in utils.getChildrenByTag(pn, 'port'):
-				portInfo = getBasicPortInfo(port, parentId, self.set)
+			ports = list(utils.getChildrenByTag(pn, 'port'))
+			labels = getXpathLabels(ports, self.set.label('COMPOSITE_PORT_INFO_TAGS'))
+			for port, label in zip(ports, labels):
+				portInfo = getBasicPortInfo(port, parentId, self.set, label)
 				
 				# build port info info	
 				portType = port.getAttribute('type')
@@ -268,15 +409,27 @@ class ForsydeModelParser:
 						dst = portInfo.ID
 						src_p = '' + compassOut
 						dst_p = '' + compassIn
+				if focus:
+					# the stubs have no ports
+					if src in focus[1]:
+						src_p = '' + compassOut
+					if dst in focus[1]:
+						dst_p = '' + compassIn
 	
 				#add edge
-				graph.add_edge(src, dst, tailport=src_p, headport=dst_p, \
-					style=style, penwidth=penwidth)
+				edges.append((src, dst, self.__edgeAttrs(src_p, dst_p, style, penwidth)))
 				self.logger.debug( 'Added signal %s:%s->%s:%s',src, src_p, dst, dst_p )
 
 			#signal child nodes
-			for signal in pn.getElementsByTagName('signal'):
-				signalInfo = getBasicSignalInfo(signal, parentId, self.set)
+			signals = pn.getElementsByTagName('signal')
+			if focus:
+				# leave out the signals between stubs
+				signals = [signal for signal in signals
+				           if parentId + ID_SEP + signal.getAttribute('source') in focus[0] or
+				              parentId + ID_SEP + signal.getAttribute('target') in focus[0]]
+			labels = getXpathLabels(signals, self.set.label('SIGNAL_INFO_TAGS'))
+			for signal, label in zip(signals, labels):
+				signalInfo = getBasicSignalInfo(signal, parentId, self.set, label)
 
 				#build signal info
 				signalType = signal.getAttribute('type')
@@ -320,15 +473,194 @@ class ForsydeModelParser:
 						dst = signalInfo.target + ID_SEP + signalInfo.target_port
 						src_p = '' + compassOut
 						dst_p = '' + compassIn
+				if focus:
+					# the stubs have no ports
+					if src in focus[1]:
+						src_p = '' + compassOut
+					if dst in focus[1]:
+						dst_p = '' + compassIn
 
 				#add edge
-				graph.add_edge(src, dst, tailport=src_p, headport=dst_p, \
-					style=style, penwidth=penwidth, label=prettyPrintLables(signalInfo.label))
+				edges.append((src, dst, self.__edgeAttrs(src_p, dst_p, style, penwidth,
+					prettyPrintLables(signalInfo.label))))
 				self.logger.debug( 'Added signal %s:%s->%s:%s',src, src_p, dst, dst_p )
 
+			# add the nodes before the edges, which would otherwise
+			# create them in this subgraph
+			clusters.flush()
+			graph.add_edges_from(edges)
+
 		# flush the root node
 		del root
 
+	## Chooses the composite processes to draw as black boxes so that the
+	## graph fits the MAX_NODES and MAX_EDGES budget. The model is first
+	## counted, with ElementTree and without labels. Then the composite
+	## processes are turned into black boxes, the deepest first and, on
+	## each level, the largest first, until the graph fits.
+	# @param ForsydeModelParser $self The object pointer
+	# @return A set with the IDs of the composite processes
+	def __fitBudget(self):
+		maxNodes = int(self.set['MAX_NODES'])
+		maxEdges = int(self.set['MAX_EDGES'])
+		if not maxNodes and not maxEdges:
+			return set()
+		if self.focus:
+			# counting would parse the whole model, which the focus avoids
+			self.logger.warn('MAX_NODES and MAX_EDGES are ignored with a focus')
+			return set()
+		fits = lambda nodes, edges: ((not maxNodes or nodes <= maxNodes) and
+		                             (not maxEdges or edges <= maxEdges))
+		detailLevel = int(self.set['DETAIL_LEVEL'])
+		components = {}
+		nodes, edges, composites = countComponent(self.set.inPathAndFile)
+		# the composite processes plotted as subgraphs, as (level, ID,
+		# nodes, edges, children) tuples
+		expanded = []
+		stack = [(self.rootProcess, composites, 2)]
+		while stack:
+			parentId, composites, level = stack.pop()
+			for name, component in composites:
+				if level >= detailLevel:
+					nodes += 1
+					continue
+				if component not in components:
+					components[component] = countComponent(
+						os.path.join(self.set.inPath, component) + '.xml')
+				ownNodes, ownEdges, children = components[component]
+				ID = parentId + ID_SEP + name
+				nodes += ownNodes
+				edges += ownEdges
+				expanded.append((level, ID, ownNodes, ownEdges, len(children)))
+				stack.append((ID, children, level + 1))
+		self.logger.info('The model has %d nodes and %d edges', nodes, edges)
+
+		blackBoxes = set()
+		expanded.sort(key=lambda c: (-c[0], -(c[2] + c[3] + c[4])))
+		for level, ID, ownNodes, ownEdges, children in expanded:
+			if fits(nodes, edges):
+				break
+			# its children are black boxes already
+			blackBoxes.add(ID)
+			nodes -= ownNodes + children - 1
+			edges -= ownEdges
+		if blackBoxes:
+			self.logger.info('Drawing %d of %d composite processes as black boxes, '
+			                 'leaving %d nodes and %d edges', len(blackBoxes),
+			                 len(expanded), nodes, edges)
+		if not fits(nodes, edges):
+			self.logger.warn('The graph does not fit in %d nodes and %d edges, '
+			                 'even with all composite processes as black boxes',
+			                 maxNodes, maxEdges)
+		return blackBoxes
+
+	## Checks whether a composite process contains the focus, or is the
+	## focus itself
+	# @param ForsydeModelParser $self The object pointer
+	# @param str $ID The ID of the composite process
+	# @return \c True if the composite process must be plotted as a
+	#         subgraph
+	def __onFocusPath(self, ID):
+		return bool(self.focus) and (self.focus + ID_SEP).startswith(ID + ID_SEP)
+
+	## Finds the processes to plot in a process network containing the
+	## focus: the process in the path to the focus and, in the process
+	## network of the focus itself, the ones at most \c radius signals
+	## away from it. Their neighbours outside of the radius, and the
+	## processes bound to the ports of the network, are drawn as stubs.
+	# @param ForsydeModelParser $self The object pointer
+	# @param Node $pn The process network
+	# @param str $parentId The ID of the process network
+	# @return A (processes, stubs) tuple of ID sets, or \c None if the
+	#         whole process network is plotted
+	def __focusNetwork(self, pn, parentId):
+		if not self.focus.startswith(parentId + ID_SEP):
+			return None
+		centre = parentId + ID_SEP + self.focus[len(parentId + ID_SEP):].split(ID_SEP)[0]
+		names = set(parentId + ID_SEP + process.getAttribute('name')
+		            for tag in ('composite_process', 'leaf_process')
+		            for process in pn.getElementsByTagName(tag))
+		if centre not in names:
+			self.logger.error('The focus ' + self.focus + ' is not in the process network "' +
+			                  parentId + '"')
+			os._exit(1)
+		neighbours = {}
+		for signal in pn.getElementsByTagName('signal'):
+			source = parentId + ID_SEP + signal.getAttribute('source')
+			target = parentId + ID_SEP + signal.getAttribute('target')
+			neighbours.setdefault(source, set()).add(target)
+			neighbours.setdefault(target, set()).add(source)
+		processes = set([centre])
+		frontier = processes
+		radius = self.radius if centre == self.focus else 0
+		for hop in range(radius):
+			frontier = set(n for ID in frontier for n in neighbours.get(ID, ())) - processes
+			processes |= frontier
+		stubs = set(n for ID in processes for n in neighbours.get(ID, ())) - processes
+		# the parent process network connects to all the ports, so they
+		# are all drawn, along with the processes they are bound to
+		for port in utils.getChildrenByTag(pn, 'port'):
+			bound = parentId + ID_SEP + port.getAttribute('bound_process')
+			if bound not in processes:
+				stubs.add(bound)
+		self.logger.debug('Focus on ' + centre + ' in <' + parentId + '>: ' +
+		                  str(len(processes)) + ' processes and ' + str(len(stubs)) + ' stubs')
+		return processes, stubs
+
+	## Draws the stubs among some processes, and returns the other
+	## processes to plot
+	# @param ForsydeModelParser $self The object pointer
+	# @param list $elements The process elements
+	# @param str $parentId The ID of the process network
+	# @param tuple $focus The (processes, stubs) tuple returned by
+	#        __focusNetwork
+	# @param Clusters $clusters The clusters of the process network
+	# @return The elements of the processes to plot
+	def __focusElements(self, elements, parentId, focus, clusters):
+		processes, stubs = focus
+		clusterName = 'others' if self.set['CLUSTER_OTHERS'] else 'parent'
+		plotted = []
+		for element in elements:
+			name = element.getAttribute('name')
+			ID = parentId + ID_SEP + name
+			if ID in processes:
+				plotted.append(element)
+			elif ID in stubs:
+				clusters.add_node(clusterName, node = ID, label = name, **STUB_ATTRS)
+		return plotted
+
+	## Builds the label of a process node: a record with its ports, or in
+	## draft mode the process information only
+	# @param ForsydeModelParser $self The object pointer
+	# @param list $label The process information
+	# @param object $listOfPorts The ports of the process
+	# @return The label
+	def __nodeLabel(self, label, listOfPorts):
+		if self.draft:
+			return prettyPrintLables(label)
+		return buildRecord(label, listOfPorts)
+
+	## Builds the attributes of an edge which differ from the defaults. In
+	## draft mode, the edges end on the nodes instead of record ports, and
+	## their label is a tooltip, which needs no room in the layout.
+	# @param ForsydeModelParser $self The object pointer
+	# @param str $tailport The tail port, as \c port:compass or \c compass
+	# @param str $headport The head port
+	# @param str $style The edge style
+	# @param int $penwidth The edge width
+	# @param str $label (optional) The edge label
+	# @return A dictionary with the attributes
+	def __edgeAttrs(self, tailport, headport, style, penwidth, label=''):
+		attrs = dict(tailport=tailport, headport=headport, style=style,
+		             penwidth=penwidth)
+		if self.draft:
+			attrs['tailport'] = tailport.split(':')[-1]
+			attrs['headport'] = headport.split(':')[-1]
+			attrs['tooltip'] = label
+		else:
+			attrs['label'] = label
+		return nonDefaultAttrs(attrs, self.edgeDefaults)
+
 ## Object class for extracting composite process information from the
 ## ForSyDe-XML model and yeald it as a structure.
 class getBasicCompositeInfo(object):
@@ -356,14 +688,16 @@ class getBasicCompositeInfo(object):
     # @param Settings $settings
     #        The f2dot.settings.Settings object holding the run-time
     #        settings
-	def __init__(self, node, parentID, settings):
+    # @param list $label
+    #        (optional) The label, if already extracted in bulk
+	def __init__(self, node, parentID, settings, label=None):
 		self.name = node.getAttribute('name')
 		self.component_name = node.getAttribute('component_name')
 		self.ID = parentID + ID_SEP + self.name
-		var1, exp = parseLableTags(settings['COMPOSITE_INFO_TAGS'])		
-		self.label = getXpathVarList(node, exp, var1)
-		logger.debug('Labels for composite process <' + self.ID + '>:\n ' 
-				+ str(self.label))
+		if label is None:
+			label = settings.label('COMPOSITE_INFO_TAGS').evaluate(node)
+		self.label = label
+		logger.debug('Labels for composite process <%s>:\n %s', self.ID, self.label)
 
 	
 ## Object class for extracting leaf process information from the
@@ -391,14 +725,15 @@ class getBasicLeafInfo(object):
     # @param Settings $settings
     #        The f2dot.settings.Settings object holding the run-time
     #        settings
-	def __init__(self, node, parentID, settings):
-		context = xpath.XPathContext(node)
+    # @param list $label
+    #        (optional) The label, if already extracted in bulk
+	def __init__(self, node, parentID, settings, label=None):
 		self.name = node.getAttribute('name')
 		self.ID = parentID + ID_SEP + self.name
-		var1, exp = parseLableTags(settings['LEAF_INFO_TAGS'])		
-		self.label = getXpathVarList(node, exp, var1)
-		logger.debug('Labels for leaf process <' + self.ID + '>: \n '
-                     + str(self.label))
+		if label is None:
+			label = settings.label('LEAF_INFO_TAGS').evaluate(node)
+		self.label = label
+		logger.debug('Labels for leaf process <%s>: \n %s', self.ID, self.label)
 
 
 ## Object class for extracting port information from the ForSyDe-XML
@@ -426,17 +761,19 @@ class getBasicPortInfo(object):
 	# @param Settings $settings
     #        The f2dot.settings.Settings object holding the run-time
     #        settings
-	def __init__(self, node, parentID, settings):
+    # @param list $label
+    #        (optional) The label, if already extracted in bulk
+	def __init__(self, node, parentID, settings, label=None):
 		self.name = node.getAttribute('name')
 		self.ID = parentID + ID_SEP + self.name
 		self.direction = node.getAttribute('direction')
 		self.bound_process = parentID + ID_SEP + \
                              node.getAttribute('bound_process')
 		self.bound_port = node.getAttribute('bound_port')
-		var1, exp  = parseLableTags(settings['COMPOSITE_PORT_INFO_TAGS'])
-		self.label = getXpathVarList(node, exp, var1)
-		logger.debug('Labels for port <' + self.ID + '>: \n ' +
-                     str(self.label))
+		if label is None:
+			label = settings.label('COMPOSITE_PORT_INFO_TAGS').evaluate(node)
+		self.label = label
+		logger.debug('Labels for port <%s>: \n %s', self.ID, self.label)
 
 
 ## Object class for extracting signal information from the ForSyDe-XML
@@ -464,7 +801,9 @@ class getBasicSignalInfo(object):
     # @param Settings $settings
     #        The f2dot.settings.Settings object holding the run-time
     #        settings
-	def __init__(self, node, parentID, settings):
+    # @param list $label
+    #        (optional) The label, if already extracted in bulk
+	def __init__(self, node, parentID, settings, label=None):
 		self.name = node.getAttribute('name')
 		self.source = parentID + ID_SEP + \
                       node.getAttribute('source')
@@ -472,8 +811,9 @@ class getBasicSignalInfo(object):
 		self.target = parentID + ID_SEP + \
                       node.getAttribute('target')
 		self.target_port = node.getAttribute('target_port')
-		var1, exp = parseLableTags(settings['SIGNAL_INFO_TAGS'])		
-		self.label = getXpathVarList(node, exp, var1)
+		if label is None:
+			label = settings.label('SIGNAL_INFO_TAGS').evaluate(node)
+		self.label = label
 		logger.debug('Labels for signal %s:%s->%s:%s\n  %s', \
 					 self.source, self.source_port, self.target, \
                      self.target_port, self.label)
@@ -501,12 +841,12 @@ class getLeafPortList(object):
 	def __init__(self, parentNode, settings):
 		self.in_ports = []
 		self.out_ports = []
-		for port in parentNode.getElementsByTagName('port'):		
+		ports = parentNode.getElementsByTagName('port')
+		labels = getXpathLabels(ports, settings.label('LEAF_PORT_INFO_TAGS'))
+		for port, info in zip(ports, labels):		
 			port_name = port.getAttribute('name')
 			port_dir  = port.getAttribute('direction')
-			var1, exp = parseLableTags(settings['LEAF_PORT_INFO_TAGS'])
-			info = getXpathVarList(port, exp, var1)
-			logger.debug('Got port info:' + str(info))
+			logger.debug('Got port info:%s', info)
 			# build port lists having tuples of name and info
 			if port_dir == 'in':
 				self.in_ports.append((port_name, info))
@@ -535,11 +875,11 @@ class getCompositePortList(object):
 	def __init__(self, parentNode, settings):
 		self.in_ports = []
 		self.out_ports = []
-		for port in parentNode.getElementsByTagName('port'):		
+		ports = parentNode.getElementsByTagName('port')
+		labels = getXpathLabels(ports, settings.label('COMPOSITE_PORT_INFO_TAGS'))
+		for port, info in zip(ports, labels):		
 			port_name = port.getAttribute('name')
 			port_dir = port.getAttribute('direction')
-			var1, exp = parseLableTags(settings['COMPOSITE_PORT_INFO_TAGS'])				
-			self.label = getXpathVarList(port, exp, var1)
 			# build port lists having tuples of name and info
 			if port_dir == 'in':
 				self.in_ports.append((port_name, info))
@@ -552,6 +892,9 @@ class Clusters(object):
 	## @var clusters
 	#       Dynamic dictionary storing just the clusters specified by
 	#       the user
+	## @var nodes
+	#       The nodes not yet added to each cluster, as (name,
+	#       attributes) tuples
 
 	## Class constructor.
 	# @param $self
@@ -567,47 +910,48 @@ class Clusters(object):
     #        addressing
 	def __init__(self, settings, graph, listOfNames):
 		self.clusters = {}
+		self.nodes = {}
 		self.clusters['parent'] = graph
+		self.nodes['parent'] = []
 		for name in listOfNames:
 			c = graph.subgraph(name= str(graph.name) + name, label='' )
 			self.clusters[name] = c
-
-	## Method for adding nodes to this cluster.
-	def add_node(self,
-                 clusterName,
-                 node,
-                 label='',
-                 shape='record',
-                 color='black',
-                 fillcolor='transparent',
-                 style='rounded,filled',
-                 fontname='Helvetica',
-                 fontsize='12',
-                 width='',
-                 height='',
-                 orientation='90'):
-		self.clusters[clusterName].add_node( \
-			node, \
-			label = label, \
-			shape = shape, \
-			color = color, \
-			fillcolor = fillcolor, \
-			style = style, \
-			fontname = fontname, \
-			width = width, 
-			height = height, 
-			orientation = orientation, 
-			fontsize = fontsize)
+			self.nodes[name] = []
+
+	## Method for adding nodes to this cluster. The nodes are kept
+	## until flush is called, so that they are added in bulk, and only
+	## their attributes differing from NODE_DEFAULTS are written.
+	# @param Clusters $self
+	#        The object pointer
+	# @param str $clusterName
+	#        The name of the cluster
+	# @param str $node
+	#        The node name
+	def add_node(self, clusterName, node, **attrs):
+		self.nodes[clusterName].append((node, nonDefaultAttrs(attrs, NODE_DEFAULTS)))
+
+	## Adds the pending nodes to their clusters
+	# @param Clusters $self
+	#        The object pointer
+	def flush(self):
+		for clusterName, nodes in self.nodes.iteritems():
+			if nodes:
+				self.clusters[clusterName].add_nodes_from(nodes)
+				self.nodes[clusterName] = []
 	
-	## Method for including subgraphs to this cluster.
+	## Method for including the subgraph of a composite process to
+	## this cluster. \c prefix is the prefix of the IDs inside the
+	## composite process.
 	def subgraph(self,
                  clusterName,
                  name,
                  label='',
                  style='',
-                 color='') :
-		frame = self.clusters[clusterName].subgraph( \
+                 color='',
+                 prefix='') :
+		frame = self.clusters[clusterName].composite( \
 			name = name, \
+			prefix = prefix, \
 			label = label, \
 			style = style, \
 			color = color)
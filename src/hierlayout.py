@@ -0,0 +1,527 @@
+'''
+ * File:    hierlayout.py
+ * Author:  George Ungureanu <ugeorge@kth.se>
+ * Purpose: hierarchical layout. Each composite process is laid out on
+            its own, in parallel, and placed as a block of fixed size
+            in the layout of its parent.
+ * License: BSD3
+'''
+
+'''
+Copyright (c) 2014, George Ungureanu
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are
+met:
+
+1. Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its
+contributors may be used to endorse or promote products derived from
+this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+"AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+'''
+
+import os
+import re
+import json
+import time
+import shutil
+import logging
+import tempfile
+import multiprocessing
+import renderer
+import layoutcache
+from dotwriter import INDENT, DotWriter
+
+logger = logging.getLogger('f2dot.hierlayout')
+
+## Prefix of the node names made relative to their block
+LOCAL = '~'
+
+## Space between the frame of a composite and its content, in points
+FRAME_MARGIN = 8.0
+
+## Height of a line of a frame label, in points
+LABEL_LINE_HEIGHT = 18.0
+
+## Line breaks in a label
+LINE_BREAKS = re.compile(r'\\[nlr]|&#92;[nlr]')
+
+## A point, as written in the pos, lp and bb attributes
+POINT = re.compile(r'(-?[0-9.]+(?:e[-+]?[0-9]+)?),(-?[0-9.]+(?:e[-+]?[0-9]+)?)')
+
+## The attributes holding coordinates
+POSITION_ATTRS = frozenset(['pos', 'lp', 'xlp', 'head_lp', 'tail_lp', 'bb'])
+
+## The keys of the GraphViz JSON output which are not attributes
+STRUCTURE_KEYS = frozenset(['name', 'nodes', 'edges', 'subgraphs', 'tail',
+                            'head', 'directed', 'strict'])
+
+## Time between two checks of the running layouts, in seconds
+POLL_INTERVAL = 0.01
+
+## Translates the points in a position attribute
+# @param str $value
+#        The attribute value
+# @param float $dx
+#        The horizontal offset, in points
+# @param float $dy
+#        The vertical offset, in points
+# @return The translated value
+def translate(value, dx, dy):
+	return POINT.sub(lambda m: '%.2f,%.2f' % (float(m.group(1)) + dx,
+	                                          float(m.group(2)) + dy), value)
+
+## Extracts the attributes of an object of the GraphViz JSON output
+# @param dict $obj
+#        The graph, node or edge object
+# @param float $dx
+#        The horizontal offset of the positions, in points
+# @param float $dy
+#        The vertical offset of the positions, in points
+# @return A dictionary with the attributes
+def layoutAttrs(obj, dx, dy):
+	attrs = {}
+	for key, value in obj.iteritems():
+		if key.startswith('_') or key in STRUCTURE_KEYS:
+			continue
+		if key in POSITION_ATTRS:
+			value = translate(value, dx, dy)
+		attrs[key] = value
+	return attrs
+
+## The graph of one composite process, written to its own DOT file.
+## Its composite children are replaced by box nodes, whose size is set
+## once the children are laid out. The node names are written relative
+## to the composite, so that all the instances of a component give the
+## same file, and thus share their layout.
+class LayoutBlock(DotWriter):
+	## @var children
+	#       The blocks of the composite children, by subgraph name
+	## @var key
+	#       The structural hash of the block, set when it is laid out
+	## @var bb
+	#       The bounding box of the layout, as (llx, lly, urx, ury)
+	## @var frameSize
+	#       The size of the block with its frame, as (width, height), in
+	#       points
+
+	## Class constructor
+	# @param LayoutBlock $self
+	#        The object pointer
+	# @param HierarchicalLayout $layout
+	#        The layout the block belongs to
+	# @param LayoutBlock $parent
+	#        The parent block, or \c None for the top graph
+	# @param str $name
+	#        The name of the subgraph of the composite
+	# @param str $prefix
+	#        The prefix shared by the names of the nodes in the composite
+	# @param dict $attrs
+	#        The attributes of the subgraph of the composite
+	def __init__(self, layout, parent, name, prefix, attrs):
+		self.layout = layout
+		self.parentBlock = parent
+		self.prefix = prefix
+		self.frameAttrs = attrs
+		self.children = {}
+		self.childPrefixes = {}
+		self.sep = None
+		self.pending = 0
+		self.key = None
+		self.bb = None
+		self.frameSize = None
+		self.labelHeight = 0.0
+		self.dotFile = os.path.join(layout.directory, 'block%d.dot' % len(layout.blocks))
+		layout.blocks.append(self)
+		DotWriter.__init__(self, self.dotFile, directed=layout.directed,
+		                   **layout.graphAttrs)
+		self.name = name
+		for element, defaults in layout.defaults:
+			DotWriter.setDefaults(self, element, **defaults)
+
+	## Makes a name relative to the block
+	# @param LayoutBlock $self
+	#        The object pointer
+	# @param str $name
+	#        The node or subgraph name
+	# @return The relative name
+	def relative(self, name):
+		if self.prefix and name.startswith(self.prefix):
+			return LOCAL + name[len(self.prefix):]
+		if self.name and name.startswith(self.name):
+			return LOCAL * 2 + name[len(self.name):]
+		return name
+
+	## Restores a name made relative with relative
+	# @param LayoutBlock $self
+	#        The object pointer
+	# @param str $name
+	#        The relative name
+	# @return The full name
+	def absolute(self, name):
+		if name.startswith(LOCAL * 2):
+			return self.name + name[2:]
+		if name.startswith(LOCAL):
+			return self.prefix + name[1:]
+		return name
+
+	## Finds the child block a node belongs to
+	# @param LayoutBlock $self
+	#        The object pointer
+	# @param str $name
+	#        The node name
+	# @return The child block, or \c None if the node is in this block
+	def childOf(self, name):
+		if self.sep is None:
+			return None
+		return self.childPrefixes.get(name[:name.rfind(self.sep) + 1])
+
+	def nodeStatement(self, n, attrs, common=None):
+		return DotWriter.nodeStatement(self, self.relative(n), attrs, common)
+
+	## Formats an edge statement. The edges to the nodes of a child
+	## block are drawn to its box, and remember their real end.
+	def edgeStatement(self, u, v, attrs, common=None):
+		tail = self.childOf(u)
+		head = self.childOf(v)
+		if tail or head:
+			attrs = dict(common or {}, **attrs)
+			common = None
+			if tail:
+				attrs['f2dot_tail'] = self.relative(u)
+				attrs['tailport'] = attrs.get('tailport', '').split(':')[-1]
+				u = tail.name
+			if head:
+				attrs['f2dot_head'] = self.relative(v)
+				attrs['headport'] = attrs.get('headport', '').split(':')[-1]
+				v = head.name
+		return DotWriter.edgeStatement(self, self.relative(u), self.relative(v),
+		                               attrs, common)
+
+	def subgraphName(self, name):
+		return self.relative(name)
+
+	## Adds the block of a composite child, and its box
+	def addComposite(self, sub, name, prefix, attrs):
+		child = LayoutBlock(self.layout, self, name, prefix, attrs)
+		self.children[name] = child
+		self.childPrefixes[prefix] = child
+		# the prefix ends with the separator of the node names
+		self.sep = prefix[-1]
+		sub.add_node(name, shape='box', label='')
+		return child
+
+	## Records the defaults set on the top graph, for all blocks
+	def setDefaults(self, element, **attrs):
+		if self.parentBlock is None:
+			self.layout.defaults.append((element, attrs))
+		DotWriter.setDefaults(self, element, **attrs)
+
+	## Closes the DOT file of the block. The file is completed with the
+	## sizes of the children boxes when it is laid out.
+	# @param LayoutBlock $self
+	#        The object pointer
+	def finish(self):
+		self.enter(self)
+		self.file.close()
+
+	## Completes the DOT file with the sizes of the children boxes
+	# @param LayoutBlock $self
+	#        The object pointer
+	# @return The structural hash of the block
+	def prepare(self):
+		with open(self.dotFile, 'ab') as f:
+			for name, child in sorted(self.children.iteritems()):
+				width, height = child.frameSize
+				f.write(INDENT + self.nodeStatement(name, dict(fixedsize='true',
+				        width='%.3f' % (width / 72), height='%.3f' % (height / 72))) + ';\n')
+			f.write('}\n')
+		self.key = layoutcache.hashFile(self.dotFile)
+		return self.key
+
+	## Records the layout of the block
+	# @param LayoutBlock $self
+	#        The object pointer
+	# @param dict $data
+	#        The layout, as read from the GraphViz JSON output
+	def setLayout(self, data):
+		self.bb = tuple(float(x) for x in data['bb'].split(','))
+		label = self.frameAttrs.get('label', '')
+		if label:
+			self.labelHeight = LABEL_LINE_HEIGHT * (1 + len(LINE_BREAKS.findall(label)))
+		self.frameSize = (self.bb[2] - self.bb[0] + 2 * FRAME_MARGIN,
+		                  self.bb[3] - self.bb[1] + 2 * FRAME_MARGIN + self.labelHeight)
+
+## Lays out a graph composite by composite. The blocks without children
+## are laid out first, in parallel, and each parent as soon as all its
+## children are done. The positioned blocks are then assembled into one
+## graph, rendered with the positions pinned.
+class HierarchicalLayout:
+	## @var root
+	#       The block of the top graph, to be passed to the parser
+	## @var layouts
+	#       The parsed layouts, by structural hash
+
+	## Class constructor
+	# @param HierarchicalLayout $self
+	#        The object pointer
+	# @param str $directory
+	#        The directory where the temporary files are written
+	# @param bool $directed
+	#        \c True for a digraph
+	def __init__(self, directory, directed=True, **graphAttrs):
+		self.directory = tempfile.mkdtemp(prefix='f2dot', dir=directory)
+		self.directed = directed
+		self.graphAttrs = graphAttrs
+		self.defaults = []
+		self.blocks = []
+		self.layouts = {}
+		self.root = LayoutBlock(self, None, '', '', {})
+
+	## Reads a layout made by GraphViz
+	# @param HierarchicalLayout $self
+	#        The object pointer
+	# @param str $key
+	#        The structural hash of the block
+	# @param str $jsonFile
+	#        The JSON output of GraphViz
+	# @return \c True if the layout could be read
+	def load(self, key, jsonFile):
+		try:
+			with open(jsonFile, 'rb') as f:
+				self.layouts[key] = json.load(f)
+		except (IOError, ValueError), e:
+			logger.error('Cannot read the layout %s: %s', jsonFile, e)
+			return False
+		return True
+
+	## Records the layout of a block and schedules its parent if it was
+	## the last child waited for
+	# @param HierarchicalLayout $self
+	#        The object pointer
+	# @param LayoutBlock $block
+	#        The block
+	# @param list $ready
+	#        The blocks ready to be laid out
+	def done(self, block, ready):
+		block.setLayout(self.layouts[block.key])
+		parent = block.parentBlock
+		if parent is not None:
+			parent.pending -= 1
+			if parent.pending == 0:
+				ready.append(parent)
+
+	## Lays out all blocks, running at most one GraphViz process per
+	## processor at a time. Blocks with the same structural hash are laid
+	## out once.
+	# @param HierarchicalLayout $self
+	#        The object pointer
+	# @param function $choose
+	#        Chooses the layout program of a block from its number of
+	#        nodes and edges, as layoutengine.chooseEngine
+	# @param LayoutCache $cache
+	#        (optional) The layout cache
+	# @return \c True if all blocks were laid out
+	def layout(self, choose, cache=None):
+		start = time.time()
+		for block in self.blocks:
+			block.pending = len(block.children)
+		ready = [block for block in self.blocks if not block.children]
+		running = []
+		waiting = {}
+		progs = {}
+		jobs = max(1, multiprocessing.cpu_count())
+		ok = True
+		while running or (ok and ready):
+			while ok and ready and len(running) < jobs:
+				block = ready.pop()
+				key = block.prepare()
+				if key in self.layouts:
+					self.done(block, ready)
+				elif key in waiting:
+					waiting[key].append(block)
+				else:
+					prog, options = choose(block.nodeCount, block.edgeCount)
+					progs[prog] = progs.get(prog, 0) + 1
+					jsonFile = os.path.join(self.directory, key + '.json')
+					cacheKey = None
+					if cache is not None:
+						cacheKey = cache.key(key, renderer.progIdentity(prog), prog,
+						                     'json0', *options)
+						if cache.get(cacheKey, jsonFile):
+							ok = self.load(key, jsonFile)
+							if ok:
+								self.done(block, ready)
+							continue
+					waiting[key] = [block]
+					command = [prog, '-Tjson0'] + options
+					running.append((renderer.startProg(command, block.dotFile, jsonFile),
+					                command, key, jsonFile, cacheKey, time.time()))
+			for r in running:
+				renderer.checkTimeout(r[0])
+			finished = [r for r in running if r[0].poll() is not None]
+			if not finished:
+				time.sleep(POLL_INTERVAL)
+			for r in finished:
+				running.remove(r)
+				process, command, key, jsonFile, cacheKey, started = r
+				if not (renderer.waitProg(process, command) and self.load(key, jsonFile)):
+					ok = False
+					continue
+				logger.debug('Block %s laid out by %s in %.2fs', key,
+				             ' '.join(command), time.time() - started)
+				if cacheKey is not None:
+					cache.put(cacheKey, jsonFile)
+				for block in waiting.pop(key):
+					self.done(block, ready)
+			if not ok:
+				# the layout failed, there is no need to finish the others
+				for r in running:
+					r[0].kill()
+					r[0].wait()
+				del running[:]
+		if ok:
+			logger.info('Laid out %d composites (%d distinct) in %.2fs, with %s',
+			            len(self.blocks), len(self.layouts), time.time() - start,
+			            ', '.join('%s (%d)' % (prog, progs[prog]) for prog in sorted(progs)))
+		return ok
+
+	## Writes the graph with the positions of all the blocks, for
+	## renderer.renderLayout
+	# @param HierarchicalLayout $self
+	#        The object pointer
+	# @param str $outFile
+	#        The DOT file to write
+	def compose(self, outFile):
+		attrs = dict(self.graphAttrs)
+		attrs['bb'] = self.layouts[self.root.key]['bb']
+		out = DotWriter(outFile, directed=self.directed, **attrs)
+		for element, defaults in self.defaults:
+			out.setDefaults(element, **defaults)
+		self.composeBlock(out, self.root, 0.0, 0.0)
+		out.close()
+
+	## Writes the content of a block
+	# @param HierarchicalLayout $self
+	#        The object pointer
+	# @param DotSubgraph $target
+	#        The subgraph to write into
+	# @param LayoutBlock $block
+	#        The block
+	# @param float $dx
+	#        The horizontal offset of the block, in points
+	# @param float $dy
+	#        The vertical offset of the block, in points
+	def composeBlock(self, target, block, dx, dy):
+		data = self.layouts[block.key]
+		objects = data.get('objects', [])
+		# a node is written in the innermost subgraph it belongs to
+		owner = {}
+		stack = [(None, index) for index in data.get('subgraphs', [])]
+		while stack:
+			parent, index = stack.pop()
+			for n in objects[index].get('nodes', []):
+				if owner.get(n, parent) == parent:
+					owner[n] = index
+			stack.extend((index, sub) for sub in objects[index].get('subgraphs', []))
+		members = {}
+		for obj in objects[data.get('_subgraph_cnt', 0):]:
+			members.setdefault(owner.get(obj['_gvid']), []).append(obj)
+		self.composeSubgraph(target, block, data, None, members, dx, dy)
+
+		edges = []
+		for edge in data.get('edges', []):
+			attrs = layoutAttrs(edge, dx, dy)
+			tail = attrs.pop('f2dot_tail', None) or objects[edge['tail']]['name']
+			head = attrs.pop('f2dot_head', None) or objects[edge['head']]['name']
+			edges.append((block.absolute(tail), block.absolute(head), attrs))
+		target.add_edges_from(edges)
+
+	## Writes the nodes and the subgraphs of a subgraph of a block
+	# @param HierarchicalLayout $self
+	#        The object pointer
+	# @param DotSubgraph $target
+	#        The subgraph to write into
+	# @param LayoutBlock $block
+	#        The block
+	# @param dict $data
+	#        The layout of the block
+	# @param int $index
+	#        The index of the subgraph in the layout, or \c None for the
+	#        block graph
+	# @param dict $members
+	#        The nodes of each subgraph of the layout
+	# @param float $dx
+	#        The horizontal offset of the block, in points
+	# @param float $dy
+	#        The vertical offset of the block, in points
+	def composeSubgraph(self, target, block, data, index, members, dx, dy):
+		objects = data.get('objects', [])
+		graph = data if index is None else objects[index]
+		for sub in graph.get('subgraphs', []):
+			cluster = target.subgraph(block.absolute(objects[sub]['name']),
+			                          **layoutAttrs(objects[sub], dx, dy))
+			self.composeSubgraph(cluster, block, data, sub, members, dx, dy)
+		nodes = []
+		for node in members.get(index, []):
+			name = block.absolute(node['name'])
+			child = block.children.get(name)
+			if child is None:
+				nodes.append((name, layoutAttrs(node, dx, dy)))
+			else:
+				self.composeChild(target, child, node, dx, dy)
+		target.add_nodes_from(nodes)
+
+	## Writes a child block in place of its box
+	# @param HierarchicalLayout $self
+	#        The object pointer
+	# @param DotSubgraph $target
+	#        The subgraph to write into
+	# @param LayoutBlock $child
+	#        The child block
+	# @param dict $node
+	#        The box of the child, from the layout of its parent
+	# @param float $dx
+	#        The horizontal offset of the parent, in points
+	# @param float $dy
+	#        The vertical offset of the parent, in points
+	def composeChild(self, target, child, node, dx, dy):
+		x, y = [float(v) for v in node['pos'].split(',')[:2]]
+		x += dx
+		y += dy
+		width, height = child.frameSize
+		llx = x - width / 2
+		lly = y - height / 2
+		attrs = dict(child.frameAttrs)
+		attrs['bb'] = '%.2f,%.2f,%.2f,%.2f' % (llx, lly, llx + width, lly + height)
+		if child.labelHeight:
+			attrs['lp'] = '%.2f,%.2f' % (x, lly + height - FRAME_MARGIN / 2 -
+			                             child.labelHeight / 2)
+		frame = target.subgraph(child.name, **attrs)
+		self.composeBlock(frame, child, llx + FRAME_MARGIN - child.bb[0],
+		                  lly + FRAME_MARGIN - child.bb[1])
+
+	## Removes the temporary files
+	# @param HierarchicalLayout $self
+	#        The object pointer
+	def cleanup(self):
+		shutil.rmtree(self.directory, ignore_errors=True)
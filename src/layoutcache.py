@@ -0,0 +1,178 @@
+'''
+ * File:    layoutcache.py
+ * Author:  George Ungureanu <ugeorge@kth.se>
+ * Purpose: on-disk cache for the layouts and renderings made by
+            GraphViz, keyed by the content of the DOT file and the
+            layout parameters, with least-recently-used eviction.
+ * License: BSD3
+'''
+
+'''
+Copyright (c) 2014, George Ungureanu
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are
+met:
+
+1. Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its
+contributors may be used to endorse or promote products derived from
+this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+"AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+'''
+
+import os
+import shutil
+import hashlib
+import logging
+import tempfile
+
+logger = logging.getLogger('f2dot.layoutcache')
+
+## Size of the blocks read when hashing a file
+BLOCK_SIZE = 1 << 16
+
+## Hashes the content of a file
+# @param str $path
+#        The file
+# @return The SHA-1 digest of the file, as a hex string
+def hashFile(path):
+	sha = hashlib.sha1()
+	with open(path, 'rb') as f:
+		block = f.read(BLOCK_SIZE)
+		while block:
+			sha.update(block)
+			block = f.read(BLOCK_SIZE)
+	return sha.hexdigest()
+
+## Cache of GraphViz output files. Each entry is a file named after its
+## key, and its modification time records when it was last used.
+class LayoutCache:
+
+	## Class constructor
+	# @param LayoutCache $self
+	#        The object pointer
+	# @param str $directory
+	#        The cache directory, created if needed
+	# @param int $maxSize
+	#        The size limit of the cache, in bytes
+	def __init__(self, directory, maxSize):
+		self.directory = directory
+		self.maxSize = maxSize
+		if not os.path.isdir(directory):
+			try:
+				os.makedirs(directory)
+			except OSError:
+				# another run may have created it meanwhile
+				if not os.path.isdir(directory):
+					raise
+
+	## Hashes the content of a DOT file. The DOT files written by
+	## dotwriter are canonical: the same model and settings always give
+	## the same text.
+	# @param LayoutCache $self
+	#        The object pointer
+	# @param str $dotFile
+	#        The DOT file
+	# @return The SHA-1 digest of the file, as a hex string
+	def hashFile(self, dotFile):
+		return hashFile(dotFile)
+
+	## Builds the key of a cache entry
+	# @param LayoutCache $self
+	#        The object pointer
+	# @param str $digest
+	#        The digest of the DOT file, as returned by hashFile
+	# @param list $params
+	#        The parameters the output depends on besides the DOT file,
+	#        e.g. the layout program and the output format
+	# @return The key, as a hex string
+	def key(self, digest, *params):
+		return hashlib.sha1('\0'.join((digest,) + params)).hexdigest()
+
+	## Copies a cached file to its destination, if the cache has it
+	# @param LayoutCache $self
+	#        The object pointer
+	# @param str $key
+	#        The key of the entry
+	# @param str $outFile
+	#        The destination file
+	# @return \c True on a hit
+	def get(self, key, outFile):
+		entry = os.path.join(self.directory, key)
+		try:
+			shutil.copyfile(entry, outFile)
+			os.utime(entry, None)
+		except (IOError, OSError):
+			return False
+		logger.debug('Layout cache hit for %s', outFile)
+		return True
+
+	## Stores a file in the cache, evicting the least recently used
+	## entries if the cache grows over its size limit
+	# @param LayoutCache $self
+	#        The object pointer
+	# @param str $key
+	#        The key of the entry
+	# @param str $inFile
+	#        The file to store
+	def put(self, key, inFile):
+		tmpFile = None
+		try:
+			fd, tmpFile = tempfile.mkstemp(dir=self.directory, prefix='.tmp')
+			os.close(fd)
+			shutil.copyfile(inFile, tmpFile)
+			# the rename is atomic, so concurrent runs never see
+			# partially written entries
+			os.rename(tmpFile, os.path.join(self.directory, key))
+		except (IOError, OSError), e:
+			logger.warn('Cannot store %s in the layout cache: %s', inFile, e)
+			# evict skips the temporary files, so they must not stay
+			if tmpFile is not None and os.path.exists(tmpFile):
+				os.remove(tmpFile)
+			return
+		self.evict()
+
+	## Removes the least recently used entries until the cache fits in
+	## its size limit
+	# @param LayoutCache $self
+	#        The object pointer
+	def evict(self):
+		entries = []
+		size = 0
+		for name in os.listdir(self.directory):
+			if name.startswith('.'):
+				continue
+			try:
+				stat = os.stat(os.path.join(self.directory, name))
+			except OSError:
+				continue
+			entries.append((stat.st_mtime, stat.st_size, name))
+			size += stat.st_size
+		entries.sort()
+		while size > self.maxSize and entries:
+			mtime, entrySize, name = entries.pop(0)
+			try:
+				os.remove(os.path.join(self.directory, name))
+			except OSError:
+				continue
+			size -= entrySize
+			logger.debug('Evicted %s from the layout cache', name)
@@ -0,0 +1,117 @@
+'''
+ * File:    layoutengine.py
+ * Author:  George Ungureanu <ugeorge@kth.se>
+ * Purpose: chooses the GraphViz layout program and its limits from the
+            size of the graph.
+ * License: BSD3
+'''
+'''
+Copyright (c) 2014, George Ungureanu
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are
+met:
+
+1. Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its
+contributors may be used to endorse or promote products derived from
+this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+"AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+'''
+
+import os
+
+import logging
+
+logger = logging.getLogger('f2dot.layoutengine')
+
+## The settings tuning the layout programs, with the graph attribute
+## each one sets and the programs which use it
+TUNING_SETTINGS = {
+	'MCLIMIT'    : ('mclimit', ('dot',)),
+	'NSLIMIT'    : ('nslimit', ('dot',)),
+	'SEARCHSIZE' : ('searchsize', ('dot',)),
+	'MAXITER'    : ('maxiter', ('neato', 'fdp')),
+}
+
+## The limits used in draft mode, by program
+DRAFT_LIMITS = {
+	'dot'   : dict(mclimit='0.1', nslimit='1', nslimit1='1', searchsize='10'),
+	'neato' : dict(maxiter='100'),
+	'fdp'   : dict(maxiter='100'),
+}
+
+## The default number of negative cut edges searched by dot
+DEFAULT_SEARCHSIZE = 30
+
+## Chooses the layout program and its limits. With \c PROG=auto, dot is
+## used for graphs up to AUTO_DOT_NODES nodes and AUTO_DOT_EDGES edges.
+## Up to AUTO_LARGE_NODES nodes and AUTO_LARGE_EDGES edges, dot is
+## still used, with its crossing minimization and network simplex
+## iterations cut in proportion to the graph size. Larger graphs are
+## laid out with AUTO_LARGE_PROG, which is also used with the \c engine
+## layout fallback. In draft mode the DRAFT_LIMITS are used. The limits
+## set in the configuration override the chosen ones.
+# @param Settings $settings
+#        The f2dot.settings.Settings object holding the run-time settings
+# @param int $nodes
+#        The number of nodes in the graph
+# @param int $edges
+#        The number of edges in the graph
+# @param list $fallbacks
+#        (optional) The layout fallbacks in use (see LAYOUT_FALLBACKS)
+# @return A (program, options) tuple, where options is the list of
+#         \c -G arguments setting the limits
+def chooseEngine(settings, nodes, edges, fallbacks=()):
+	prog = settings['PROG']
+	attrs = {}
+	reason = 'set in the configuration'
+	if 'engine' in fallbacks:
+		prog = settings['AUTO_LARGE_PROG']
+		reason = 'fallback'
+	elif prog == 'auto':
+		dotNodes = int(settings['AUTO_DOT_NODES'])
+		dotEdges = int(settings['AUTO_DOT_EDGES'])
+		if nodes > int(settings['AUTO_LARGE_NODES']) or \
+		   edges > int(settings['AUTO_LARGE_EDGES']):
+			prog = settings['AUTO_LARGE_PROG']
+			reason = 'large graph'
+		elif nodes > dotNodes or edges > dotEdges:
+			prog = 'dot'
+			reason = 'medium graph'
+			factor = min(float(dotNodes) / max(nodes, 1), float(dotEdges) / max(edges, 1))
+			attrs['mclimit'] = '%.2f' % factor
+			attrs['nslimit'] = '%.2f' % factor
+			attrs['nslimit1'] = '%.2f' % factor
+			attrs['searchsize'] = str(max(10, int(DEFAULT_SEARCHSIZE * factor)))
+		else:
+			prog = 'dot'
+			reason = 'small graph'
+	if settings['DRAFT'] == 'YES':
+		attrs.update(DRAFT_LIMITS.get(prog, {}))
+		reason += ', draft'
+	for key, (attr, progs) in TUNING_SETTINGS.iteritems():
+		if settings[key] and prog in progs:
+			attrs[attr] = settings[key]
+	options = ['-G%s=%s' % (attr, attrs[attr]) for attr in sorted(attrs)]
+	logger.debug('Chose %s for %d nodes and %d edges (%s)',
+	             ' '.join([prog] + options), nodes, edges, reason)
+	return prog, options
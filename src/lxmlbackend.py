@@ -0,0 +1,226 @@
+'''
+ * File:    lxmlbackend.py
+ * Author:  George Ungureanu <ugeorge@kth.se>
+ * Purpose: optional XPath backend which evaluates the label queries
+            with lxml (libxml2) instead of the bundled pure-Python
+            engine, whenever lxml is installed.
+ * License: BSD3
+'''
+
+'''
+Copyright (c) 2014, George Ungureanu
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are
+met:
+
+1. Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its
+contributors may be used to endorse or promote products derived from
+this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+"AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+'''
+
+import logging
+from xml.dom import Node
+
+try:
+	from lxml import etree
+except ImportError:
+	etree = None
+
+logger = logging.getLogger('f2dot.lxmlbackend')
+
+## The backend in use: 'lxml', 'bundled' or 'check'
+backend = 'bundled'
+
+## Compiled queries, by (query, namespaces). \c None marks the queries
+## lxml failed to compile.
+compiledQueries = {}
+
+## The number of queries compiled by lxml so far, the cache misses of
+## compileQuery
+compileCount = 0
+
+## Chooses the XPath backend, as given by the XPATH_BACKEND setting.
+## \c auto selects lxml if it is installed, and the bundled engine
+## otherwise. \c check evaluates the queries with both backends and
+## reports the labels which differ.
+# @param str $name
+#        One of \c auto, \c lxml, \c bundled, \c check
+def setBackend(name):
+	global backend
+	if name in ('lxml', 'check') and etree is None:
+		logger.warn("lxml is not installed. Using the bundled XPath engine.")
+		name = 'bundled'
+	if name == 'auto':
+		name = 'lxml' if etree is not None else 'bundled'
+	backend = name
+	logger.debug("Using the %s XPath backend", backend)
+
+## Tells whether the queries should be evaluated with lxml
+# @return \c True for the \c lxml and \c check backends
+def enabled():
+	return backend != 'bundled'
+
+## Container for the lxml tree mirroring a minidom document, along
+## with the mapping from the minidom elements to the lxml ones.
+class LxmlDocument:
+
+	## Class constructor. Serializes the document once, parses it with
+	## lxml and walks both trees in parallel, matching the element,
+	## comment and processing instruction children.
+	# @param LxmlDocument $self
+	#        The object pointer
+	# @param Document $document
+	#        The \c xml.dom.minidom document
+	def __init__(self, document):
+		root = etree.fromstring(document.toxml('utf-8'))
+		# lxml evaluates queries on a tree relative to its root element,
+		# hence only elements are mapped
+		self.elements = {}
+		self.namespaces = dict((k, v) for k, v in root.nsmap.items() if k)
+		# unprefixed names are resolved against the default namespace by
+		# the bundled engine, but never by lxml
+		self.supported = None not in root.nsmap
+		stack = [(document.documentElement, root)]
+		while stack:
+			domNode, lxmlNode = stack.pop()
+			self.elements[domNode] = lxmlNode
+			children = [n for n in domNode.childNodes if n.nodeType in
+			            (Node.ELEMENT_NODE, Node.COMMENT_NODE,
+			             Node.PROCESSING_INSTRUCTION_NODE)]
+			lxmlChildren = list(lxmlNode)
+			if len(children) != len(lxmlChildren):
+				self.supported = False
+				return
+			for child, lxmlChild in zip(children, lxmlChildren):
+				if child.nodeType == Node.ELEMENT_NODE:
+					stack.append((child, lxmlChild))
+
+## Returns the lxml tree mirroring the document a node belongs to. The
+## tree is built on first use and kept with the document.
+# @param Node $node
+#        A \c xml.dom.minidom node
+# @return An LxmlDocument object, or \c None if the document cannot
+#         be mirrored
+def getLxmlDocument(node):
+	document = node
+	if node.nodeType != Node.DOCUMENT_NODE:
+		document = node.ownerDocument
+	try:
+		return document._lxml_document
+	except AttributeError:
+		pass
+	try:
+		lxmlDocument = LxmlDocument(document)
+	except Exception, e:
+		logger.debug("Cannot mirror the document with lxml: %s", e)
+		lxmlDocument = None
+	if lxmlDocument is not None and not lxmlDocument.supported:
+		lxmlDocument = None
+	document._lxml_document = lxmlDocument
+	return lxmlDocument
+
+## Compiles a query with lxml, caching the result
+# @param str $query
+#        The XPath query
+# @param dict $namespaces
+#        The namespace prefixes declared by the document
+# @return A \c lxml.etree.XPath object, or \c None if lxml cannot
+#         compile the query
+def compileQuery(query, namespaces):
+	global compileCount
+	key = (query, tuple(sorted(namespaces.items())))
+	try:
+		return compiledQueries[key]
+	except KeyError:
+		pass
+	compileCount += 1
+	try:
+		compiled = etree.XPath(query, namespaces=namespaces)
+	except etree.XPathError, e:
+		logger.debug("lxml cannot compile %s: %s", query, e)
+		compiled = None
+	compiledQueries[key] = compiled
+	return compiled
+
+## Converts the result of a query evaluated by lxml to the list of
+## values the bundled engine yields for the same query
+# @see parsemethods.getXpathValues
+# @param object $result
+#        The result returned by lxml
+# @return A list of unicode values (\c None for element nodes), or
+#         \c None for results the labels do not support
+def getLxmlValues(result):
+	if isinstance(result, basestring):
+		return [unicode(result)]
+	if not isinstance(result, list):
+		# numbers and booleans are not supported by the labels
+		return None
+	values = []
+	for item in result:
+		if isinstance(item, basestring):
+			values.append(unicode(item))
+		elif isinstance(item, (etree._Comment, etree._ProcessingInstruction)):
+			values.append(unicode(item.text or u''))
+		elif isinstance(item, etree._Element):
+			values.append(None)
+		else:
+			return None
+	return values
+
+## Evaluates a list of queries with lxml for each node in a sequence
+## of nodes of the same document
+# @param list $queries
+#        List of XPath queries
+# @param list $nodes
+#        \c xml.dom.minidom nodes, the roots for the queries
+# @return A list with, for each node, the list of values returned by
+#         each query, or \c None if any query cannot be evaluated by
+#         lxml the same way as by the bundled engine
+def findEach(queries, nodes):
+	if not nodes:
+		return []
+	lxmlDocument = getLxmlDocument(nodes[0])
+	if lxmlDocument is None:
+		return None
+	compiled = [compileQuery(q, lxmlDocument.namespaces) for q in queries]
+	if None in compiled:
+		return None
+	results = []
+	for node in nodes:
+		try:
+			lxmlNode = lxmlDocument.elements[node]
+		except KeyError:
+			return None
+		row = []
+		for query, xpathQuery in zip(queries, compiled):
+			try:
+				values = getLxmlValues(xpathQuery(lxmlNode))
+			except etree.XPathError, e:
+				logger.debug("lxml cannot evaluate %s: %s", query, e)
+				return None
+			if values is None:
+				return None
+			row.append(values)
+		results.append(row)
+	return results
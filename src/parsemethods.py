@@ -40,9 +40,12 @@ OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 '''
 
 import xpath
-import utils
+import lxmlbackend
+import xpathprofiler
+import os
 import re
 import logging
+from timeit import default_timer as timer
 from itertools import izip_longest
 
 VAR_START='<<'
@@ -52,8 +55,21 @@ PAT_START='{'
 PAT_STOP='}'
 PAT_SEP='&&'
 
+LABEL_SANITIZER=re.compile('[^0-9a-zA-Z_-]+')
+LABEL_CELL_SEP=' : '
+LABEL_ROW_END='&#92;n'
+
 logger = logging.getLogger('f2dot.parsermethods')
 
+## Printed lables, by rows of lables
+printedLabels = {}
+
+## Record strings, by process lables and ports
+builtRecords = {}
+
+## Extracted labels, by (component file, element path, label template)
+extractedLabels = {}
+
 
 ## Method that receives a list of XPath queries, as defined by the
 ## user, and returns a list of lists of information extracted from the
@@ -75,33 +91,373 @@ logger = logging.getLogger('f2dot.parsermethods')
 #        \c xml.dom.Node representing the root for the XPath query
 # @param list $queryList
 #        List of querries, as defined by the user
+# @param XPathContext $context
+#        (optional) XPath context to evaluate the queries in, shared
+#        between calls for nodes of the same document
 # @return A list of lists if pieces of information
 # @see parseLableTags
 # @see prettyPrintLables
-def getXpathList(node, queryList):
+def getXpathList(node, queryList, context=None):
+	queries = [query for queryLine in queryList for query in queryLine]
+	return splitXpathValues(queryList, findXpathValues(queries, [node], context)[0])
+
+## Method that evaluates a list of XPath queries, as defined by the
+## user, for each node in a sequence of sibling nodes.
+#
+# The queries are compiled once, as one fused group, and evaluated for
+# all nodes in one shared XPath context, instead of building a new
+# context and looking up every query for each node.
+# @param list $nodes
+#        \c xml.dom.Node objects of the same document, each being the
+#        root for the XPath queries
+# @param list $queryList
+#        List of querries, as defined by the user
+# @param str $var
+#        (optional) Querry for pre-extracting variables
+# @return A list with the information extracted for each node, as
+#         returned by getXpathList
+# @see getXpathList
+# @see getXpathVarList
+def getXpathLists(nodes, queryList, var=''):
+	nodes = list(nodes)
+	if not nodes:
+		return []
+	context = xpath.XPathContext(nodes[0])
+	if var:
+		# the queries differ from node to node after replacing the variables
+		return [getXpathVarList(node, queryList, var, context) for node in nodes]
+	queries = [query for queryLine in queryList for query in queryLine]
+	return [splitXpathValues(queryList, values)
+            for values in findXpathValues(queries, nodes, context)]
+
+## Extracts the labels defined by a label setting for a sequence of
+## sibling nodes. The labels are extracted in one pass, but only when
+## the first one of them is actually used.
+# @param list $nodes
+#        \c xml.dom.Node objects of the same document
+# @param LabelTemplate $template
+#        The compiled label setting
+# @return A list with the label of each node, as LazyLabel objects
+#         unless already extracted
+# @see LabelTemplate
+# @see setComponentFile
+def getXpathLabels(nodes, template):
+	nodes = list(nodes)
+	if not nodes or template.empty:
+		return template.evaluateEach(nodes)
+	keys = None
+	document = nodes[0].ownerDocument
+	fileName = getattr(document, '_f2dot_component', None)
+	if fileName is not None:
+		paths = getElementPaths(document)
+		keys = [(fileName, paths[node], template) for node in nodes]
+		try:
+			return [extractedLabels[key] for key in keys]
+		except KeyError:
+			pass
+	batch = LabelBatch(nodes, template, keys)
+	return [LazyLabel(batch, i) for i in xrange(len(nodes))]
+
+## Container for a sequence of sibling nodes whose labels are extracted
+## together, on first use
+# @see getXpathLabels
+class LabelBatch:
+
+	## Class constructor
+	# @param LabelBatch $self
+	#        The object pointer
+	# @param list $nodes
+	#        \c xml.dom.Node objects of the same document
+	# @param LabelTemplate $template
+	#        The compiled label setting
+	# @param list $keys
+	#        (optional) The keys for storing the labels of each node in
+	#        the extracted labels cache
+	def __init__(self, nodes, template, keys=None):
+		self.nodes = nodes
+		self.template = template
+		self.keys = keys
+		self.labels = None
+
+	## Extracts the labels of all nodes, once
+	# @param LabelBatch $self
+	#        The object pointer
+	# @return A list with the label of each node
+	def evaluate(self):
+		if self.labels is None:
+			self.labels = self.template.evaluateEach(self.nodes)
+			if self.keys is not None:
+				extractedLabels.update(zip(self.keys, self.labels))
+			# the nodes are not needed any more
+			self.nodes = self.keys = None
+		return self.labels
+
+## A label which is extracted only when used, i.e. iterated, indexed or
+## printed. It otherwise behaves as the list returned by getXpathList.
+# @see getXpathLabels
+class LazyLabel:
+
+	## Class constructor
+	# @param LazyLabel $self
+	#        The object pointer
+	# @param LabelBatch $batch
+	#        The nodes whose labels are extracted together
+	# @param int $index
+	#        The index of the labelled node in the batch
+	def __init__(self, batch, index):
+		self.batch = batch
+		self.index = index
+
+	## Extracts the label
+	# @param LazyLabel $self
+	#        The object pointer
+	# @return The label, as returned by getXpathList
+	def get(self):
+		return self.batch.evaluate()[self.index]
+
+	def __iter__(self):
+		return iter(self.get())
+
+	def __len__(self):
+		return len(self.get())
+
+	def __getitem__(self, index):
+		return self.get()[index]
+
+	def __str__(self):
+		return str(self.get())
+
+	def __repr__(self):
+		return repr(self.get())
+
+## Records the file a document was parsed from. The labels extracted
+## from the document depend only on this file, and are reused for all
+## instances of the component it defines.
+# @param Document $document
+#        The \c xml.dom.minidom document
+# @param str $fileName
+#        The path to the XML file
+# @see getXpathLabels
+def setComponentFile(document, fileName):
+	document._f2dot_component = os.path.abspath(fileName)
+
+## Returns the paths of all elements in a document, as tuples of child
+## indexes from the document node. The paths are computed in one walk
+## on first use and kept with the document.
+# @param Document $document
+#        The \c xml.dom.minidom document
+# @return A dictionary with the path of each element
+def getElementPaths(document):
+	try:
+		return document._f2dot_paths
+	except AttributeError:
+		pass
+	paths = {}
+	stack = [(document, ())]
+	while stack:
+		node, path = stack.pop()
+		for i, child in enumerate(node.childNodes):
+			if child.nodeType == child.ELEMENT_NODE:
+				paths[child] = path + (i,)
+				stack.append((child, paths[child]))
+	document._f2dot_paths = paths
+	return paths
+
+## A label setting (one of the \c *_TAGS settings), parsed once from
+## the custom layout markup, with its queries compiled
+# @see parseLableTags
+class LabelTemplate:
+
+	## Class constructor
+	# @param LabelTemplate $self
+	#        The object pointer
+	# @param str $tags
+	#        The label setting, written in the custom layout markup
+	def __init__(self, tags):
+		self.tags = tags
+		self.variables, self.queryList = parseLableTags(tags)
+		self.queries = [query for queryLine in self.queryList for query in queryLine]
+		self.empty = not self.queries
+		self.group = None
+		self.varGroup = None
+		if self.empty:
+			return
+		if self.variables:
+			# the queries are only known once the variables are replaced
+			self.varGroup = xpath.XPathGroup(self.variables)
+		else:
+			self.group = xpath.XPathGroup(self.queries)
+
+	## Extracts the label of a node
+	# @param LabelTemplate $self
+	#        The object pointer
+	# @param Node $node
+	#        \c xml.dom.Node representing the root for the XPath queries
+	# @param XPathContext $context
+	#        (optional) XPath context shared between calls
+	# @return The label, as returned by getXpathList
+	def evaluate(self, node, context=None):
+		if self.empty:
+			return []
+		if self.variables:
+			values = findXpathValues(self.variables, [node], context, self.varGroup)[0]
+			variables = [str(s) for s in zipXpathValues(values)[0]]
+			queryList = replaceXpathVars(self.queryList, variables)
+			return getXpathList(node, queryList, context)
+		values = findXpathValues(self.queries, [node], context, self.group)[0]
+		return splitXpathValues(self.queryList, values)
+
+	## Extracts the labels of a sequence of sibling nodes, in one pass
+	# @param LabelTemplate $self
+	#        The object pointer
+	# @param list $nodes
+	#        \c xml.dom.Node objects of the same document
+	# @return A list with the label of each node
+	def evaluateEach(self, nodes):
+		nodes = list(nodes)
+		if not nodes:
+			return []
+		if self.empty:
+			return [[] for node in nodes]
+		context = xpath.XPathContext(nodes[0])
+		if self.variables:
+			return [self.evaluate(node, context) for node in nodes]
+		return [splitXpathValues(self.queryList, values) for values in
+		        findXpathValues(self.queries, nodes, context, self.group)]
+
+## Evaluates a list of XPath queries for each node in a sequence of
+## nodes of the same document, using the backend chosen by the
+## XPATH_BACKEND setting. Queries which lxml cannot evaluate the way
+## the bundled engine does are left to the bundled engine.
+# @param list $queries
+#        List of XPath queries
+# @param list $nodes
+#        \c xml.dom.Node objects, each being the root for the queries
+# @param XPathContext $context
+#        (optional) XPath context for the bundled engine
+# @param XPathGroup $group
+#        (optional) The queries, already compiled for the bundled engine
+# @return A list with, for each node, the list of values returned by
+#         each query
+# @see getXpathValues
+# @see lxmlbackend.setBackend
+def findXpathValues(queries, nodes, context=None, group=None):
+	if xpathprofiler.active:
+		return profileXpathValues(queries, nodes, context)
+	return evalXpathValues(queries, nodes, context, group)
+
+## Evaluates a list of XPath queries for each node in a sequence of
+## nodes of the same document
+# @see findXpathValues
+def evalXpathValues(queries, nodes, context=None, group=None):
+	values = None
+	if lxmlbackend.enabled():
+		values = lxmlbackend.findEach(queries, nodes)
+	if values is None or lxmlbackend.backend == 'check':
+		if context is None:
+			context = xpath.XPathContext(nodes[0])
+		bundled = [[getXpathValues(result) for result in results]
+		           for results in context.findgroupeach(group or queries, nodes)]
+		if values is not None:
+			checkXpathValues(queries, nodes, values, bundled)
+		values = bundled
+	return values
+
+## Evaluates a list of XPath queries like findXpathValues, but one
+## query and one node at a time, recording the statistics of each
+## query with the profiler
+# @see findXpathValues
+# @see xpathprofiler.record
+def profileXpathValues(queries, nodes, context=None):
+	if context is None:
+		context = xpath.XPathContext(nodes[0])
+	values = []
+	for node in nodes:
+		row = []
+		for query in queries:
+			compiled = xpath.XPath.compiled + lxmlbackend.compileCount
+			start = timer()
+			queryValues = evalXpathValues([query], [node], context)[0][0]
+			# a hit if neither engine had to compile the query
+			cached = compiled == xpath.XPath.compiled + lxmlbackend.compileCount
+			xpathprofiler.record(query, timer() - start, len(queryValues), cached)
+			row.append(queryValues)
+		values.append(row)
+	return values
+
+## Registers the queries of all label settings with the profiler, so
+## that it can report the setting each query comes from
+# @param Settings $settings
+#        The f2dot.settings.Settings object holding the run-time
+#        settings
+def profileLabelSettings(settings):
+	for key, template in settings.labelDict.iteritems():
+		for query in template.variables + template.queries:
+			xpathprofiler.addOrigin(query, key)
+
+## Reports the queries for which the lxml backend and the bundled
+## engine return different values
+# @param list $queries
+#        List of XPath queries
+# @param list $nodes
+#        \c xml.dom.Node objects, the roots for the queries
+# @param list $lxmlValues
+#        The values returned by lxml, as returned by findXpathValues
+# @param list $bundledValues
+#        The values returned by the bundled engine
+def checkXpathValues(queries, nodes, lxmlValues, bundledValues):
+	for node, lxmlRow, bundledRow in zip(nodes, lxmlValues, bundledValues):
+		for query, lxmlValue, bundledValue in zip(queries, lxmlRow, bundledRow):
+			if lxmlValue != bundledValue:
+				name = ''
+				if node.nodeType == node.ELEMENT_NODE:
+					name = node.getAttribute('name')
+				logger.warn("XPath backends differ for '%s' on <%s name='%s'>: lxml %s, bundled %s",
+				            query, node.nodeName, name, lxmlValue, bundledValue)
+
+## Converts the result of an XPath query to a list of unicode values
+# @param unicode|list $queryReturn
+#        A string value or a node-set returned by the query
+# @return A list of unicode values
+def getXpathValues(queryReturn):
+	if isinstance(queryReturn, basestring):
+		return [unicode(queryReturn)]
+	return [attr.nodeValue for attr in queryReturn]
+
+## Splits the values of a list of queries back into label lines
+# @param list $queryList
+#        List of querries, as defined by the user
+# @param list $values
+#        The values returned by all queries in \c queryList, in order
+# @return A list of lists if pieces of information, as returned by
+#         getXpathList
+def splitXpathValues(queryList, values):
 	label = []
-	context = xpath.XPathContext(node)
+	values = iter(values)
 	for queryLine in queryList:
-		returnList = []
-		for query in queryLine:				
-			queryReturn = context.find(query, node)
-			if isinstance(queryReturn, unicode):
-				returnList.append([queryReturn])
-			else:
-				returnList.append([attr.nodeValue for attr in queryReturn])
-		label.append([list(row) for row in izip_longest(*returnList, fillvalue=u'')])
+		returnList = [next(values) for query in queryLine]
+		label.append(zipXpathValues(returnList))
 	return label
 
+## Zips the values returned by the queries on one label line into rows
+# @param list $returnList
+#        List with the values returned by each query on the line
+# @return A list of rows, padded with empty strings
+def zipXpathValues(returnList):
+	return [list(row) for row in izip_longest(*returnList, fillvalue=u'')]
+
 ## Function that receives an list of XPath queries, as defined by the
 ## user, and returns the first piece of information extracted as a string.
 # @param Node $node
 #        \c xml.dom.Node representing the root for the XPath query
 # @param list $query
 #        List of querries, as defined by the user
+# @param XPathContext $context
+#        (optional) XPath context shared between calls
 # @return A list of lists if pieces of information
 # @see getXpathList
-def getXpathStrs(node, query):
-	return map ((lambda s: str(s)), getXpathList(node, query)[0][0]);
+def getXpathStrs(node, query, context=None):
+	return map ((lambda s: str(s)), getXpathList(node, query, context)[0][0]);
 
 
 ## Function that pre-extracts a set of varialbes through XPath querries and 
@@ -112,20 +468,38 @@ def getXpathStrs(node, query):
 #        List of querries, containing variables
 # @param str $var
 #        Querry for pre-extracting the variable
+# @param XPathContext $context
+#        (optional) XPath context shared between calls
 # @return A list of lists if pieces of information
 # @see getXpathList
-def getXpathVarList(node, queryList, var=''):
+def getXpathVarList(node, queryList, var='', context=None):
 	if var:	
-		variables = {}
-		for i, v in enumerate(getXpathStrs(node, [var])):
-			variables['$'+str(i+1)] = v
-		queryList = map ((lambda l1: map (
-                           (lambda s: reduce(
-                              lambda x, y: x.replace(y, variables[y]), variables, 
-                            s)), 
-                          l1)), queryList)
-		#print queryList
-	return getXpathList(node, queryList)
+		queryList = replaceXpathVars(queryList, getXpathStrs(node, [var], context))
+	return getXpathList(node, queryList, context)
+
+## Replaces the variables \c $1, \c $2, ... in a list of queries with
+## their pre-extracted values
+# @param list $queryList
+#        List of querries, containing variables
+# @param list $values
+#        The values of the variables, in order
+# @return The list of querries, with the variables replaced
+# @see getXpathVarList
+def replaceXpathVars(queryList, values):
+	variables = {}
+	for i, v in enumerate(values):
+		variables['$'+str(i+1)] = v
+	templates = queryList
+	queryList = map ((lambda l1: map (
+                       (lambda s: reduce(
+                          lambda x, y: x.replace(y, variables[y]), variables, 
+                        s)), 
+                      l1)), queryList)
+	if xpathprofiler.active:
+		for templateLine, queryLine in zip(templates, queryList):
+			for template, query in zip(templateLine, queryLine):
+				xpathprofiler.addAlias(query, template)
+	return queryList
 
 
 	
@@ -137,44 +511,58 @@ def getXpathVarList(node, queryList, var=''):
 #        that need to be printed
 # @return The readable string of lables
 def prettyPrintLables(lstOfLabels):
-	infoLabels = [x for y in lstOfLabels  for x in y]
-	nodeLabel=''
-	for trInfo in infoLabels:
-		for tdInfo in trInfo:
-			tdInfo = re.sub('[^0-9a-zA-Z_-]+', '', tdInfo)
-			if tdInfo:
-				nodeLabel = nodeLabel + tdInfo + ' : '
-		nodeLabel = utils.rreplace(nodeLabel, ' : ', '', 1)
-		nodeLabel = nodeLabel + '&#92;n'
+	return printLabelRows(getLabelRows(lstOfLabels))
+
+## Flattens a list of lables into a hashable tuple of rows, used as key
+## for the printed lables and records
+# @param list $lstOfLabels List of lists of extracted lables
+# @return A tuple of rows, each being a tuple of cells
+def getLabelRows(lstOfLabels):
+	return tuple(tuple(row) for line in lstOfLabels for row in line)
+
+## Prints the rows of a list of lables as prettyPrintLables does. Equal
+## rows are printed only once, and share the same string.
+# @param tuple $rows
+#        The rows of lables, as returned by getLabelRows
+# @return The readable string of lables
+def printLabelRows(rows):
+	try:
+		return printedLabels[rows]
+	except KeyError:
+		pass
+	lines = []
+	for row in rows:
+		cells = [LABEL_SANITIZER.sub('', cell) for cell in row]
+		lines.append(LABEL_CELL_SEP.join([cell for cell in cells if cell]))
+		lines.append(LABEL_ROW_END)
+	nodeLabel = printedLabels[rows] = ''.join(lines)
 	return nodeLabel
 
 ## Builds the record node label to display the ports in both
-## directions for horizontal plots
+## directions for horizontal plots. Processes with the same label and
+## ports share the same record string.
 # @param getBasicLeafInfo|getBasicCompositeInfo $processInfo
 #        The process information
 # @param getLeafPortList|getCompositePortList $listOfPorts
 #        List of ports associated with their information
 # @return A record string which is parsed by Pygraphviz to build nodes
 def buildRecord(processInfoLabel, listOfPorts):
-	record = '{ { '
-
-	for in_port in listOfPorts.in_ports:
-		portID = in_port[0]
-		portInfoList = in_port[1]
-		portLabel = prettyPrintLables(portInfoList)
-		record = record + '<' + portID + '>'+ portLabel + '|'
-	record = record.rstrip('|')
-
-	nodeLabel = prettyPrintLables(processInfoLabel)
-	record = record + ' } | { ' + nodeLabel + ' } | { '
-
-	for out_port in listOfPorts.out_ports:
-		portID = out_port[0]
-		portInfoList = out_port[1]
-		portLabel = prettyPrintLables(portInfoList)
-		record = record + '<' + portID + '>' +  portLabel + '|'
-	record = record.rstrip('|')		
-	record = record + ' } }'
+	key = (getLabelRows(processInfoLabel),
+	       tuple((portID, getLabelRows(info)) for portID, info in listOfPorts.in_ports),
+	       tuple((portID, getLabelRows(info)) for portID, info in listOfPorts.out_ports))
+	try:
+		return builtRecords[key]
+	except KeyError:
+		pass
+	nodeRows, inPorts, outPorts = key
+	record = ''.join(['{ { ',
+	                  '|'.join(['<' + portID + '>' + printLabelRows(rows)
+	                            for portID, rows in inPorts]),
+	                  ' } | { ', printLabelRows(nodeRows), ' } | { ',
+	                  '|'.join(['<' + portID + '>' + printLabelRows(rows)
+	                            for portID, rows in outPorts]),
+	                  ' } }'])
+	builtRecords[key] = record
 	return record
 
 
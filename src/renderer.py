@@ -0,0 +1,264 @@
+'''
+ * File:    renderer.py
+ * Author:  George Ungureanu <ugeorge@kth.se>
+ * Purpose: renders a DOT file in several output formats with the
+            GraphViz tools, running the layout only once.
+ * License: BSD3
+'''
+
+'''
+Copyright (c) 2014, George Ungureanu
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are
+met:
+
+1. Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its
+contributors may be used to endorse or promote products derived from
+this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+"AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+'''
+
+import os
+import time
+import logging
+import tempfile
+import subprocess
+import multiprocessing
+from distutils.spawn import find_executable
+
+try:
+	import resource
+except ImportError:
+	resource = None
+
+logger = logging.getLogger('f2dot.renderer')
+
+## Wall-time limit of a GraphViz process, in seconds, or 0 for none
+timeout = 0
+
+## Memory limit of a GraphViz process, in bytes, or 0 for none
+memoryLimit = 0
+
+## Time between two checks of a running process, in seconds
+POLL_INTERVAL = 0.05
+
+## The program rendering a graph which already has a layout. With
+## \c -n2, neato keeps the node positions and edge splines as given.
+RENDER_PROG = ['neato', '-n2']
+
+## The identities of the GraphViz programs, by name
+progIdentities = {}
+
+## Sets the limits of the GraphViz processes
+# @param int $seconds
+#        The wall-time limit, in seconds, or 0 for none
+# @param int $memory
+#        The memory limit, in bytes, or 0 for none
+def setLimits(seconds, memory):
+	global timeout, memoryLimit
+	timeout = seconds
+	memoryLimit = memory
+	if memoryLimit and resource is None:
+		logger.warn('Memory limits are not supported on this platform')
+		memoryLimit = 0
+
+## Applies the memory limit in a new GraphViz process
+def limitMemory():
+	resource.setrlimit(resource.RLIMIT_AS, (memoryLimit, memoryLimit))
+
+## Identifies a GraphViz program for the cache keys, by its version
+## and the path and modification time of its binary, so that the
+## layouts made by another installation of GraphViz are not reused
+# @param str $prog
+#        The program
+# @return The identity, as a string
+def progIdentity(prog):
+	try:
+		return progIdentities[prog]
+	except KeyError:
+		pass
+	path = find_executable(prog)
+	if path is None:
+		identity = prog
+	else:
+		path = os.path.realpath(path)
+		try:
+			version = subprocess.Popen([path, '-V'], stdout=subprocess.PIPE,
+			                           stderr=subprocess.STDOUT).communicate()[0]
+		except OSError:
+			version = ''
+		identity = '%s %s %d' % (version.strip(), path, os.stat(path).st_mtime)
+	progIdentities[prog] = identity
+	return identity
+
+## Starts a GraphViz program
+# @param list $command
+#        The program and its arguments
+# @param str $inFile
+#        The input DOT file
+# @param str $outFile
+#        The output file
+# @return The \c subprocess.Popen object
+def startProg(command, inFile, outFile):
+	logger.debug('Running %s on %s', ' '.join(command), inFile)
+	try:
+		process = subprocess.Popen(command + ['-o', outFile, inFile],
+		                           preexec_fn=limitMemory if memoryLimit else None)
+	except OSError, e:
+		logger.error('Cannot run %s: %s. Is GraphViz installed?', command[0], e)
+		os._exit(1)
+	process.started = time.time()
+	process.timedOut = False
+	return process
+
+## Kills a GraphViz program if it ran longer than the time limit
+# @param Popen $process
+#        The process, as returned by startProg
+# @return \c True if the process was killed
+def checkTimeout(process):
+	if not timeout or process.poll() is not None:
+		return False
+	if time.time() - process.started < timeout:
+		return False
+	process.kill()
+	process.wait()
+	process.timedOut = True
+	return True
+
+## Waits for a GraphViz program to finish, or kills it when it exceeds
+## the time limit
+# @param Popen $process
+#        The process, as returned by startProg
+# @param list $command
+#        The program and its arguments
+# @return \c True if the program succeeded
+def waitProg(process, command):
+	while timeout and process.poll() is None and not checkTimeout(process):
+		time.sleep(POLL_INTERVAL)
+	status = process.wait()
+	if process.timedOut:
+		logger.error('%s was stopped after %d seconds', ' '.join(command), timeout)
+	elif status < 0:
+		logger.error('%s was killed by signal %d', ' '.join(command), -status)
+	elif status != 0:
+		logger.error('%s failed with exit status %d', ' '.join(command), status)
+	return status == 0 and not process.timedOut
+
+## Computes the layout of a graph
+# @param str $dotFile
+#        The DOT file describing the graph
+# @param str $prog
+#        The layout program (dot, neato, twopi, circo, fdp, sfdp, osage,
+#        patchwork)
+# @param str $layoutFile
+#        The DOT file to write the positioned graph to
+# @param list $options
+#        (optional) More arguments for the layout program, e.g.
+#        \c -Gmclimit=0.5
+# @return \c True if the layout succeeded
+def layout(dotFile, prog, layoutFile, options=()):
+	command = [prog, '-Tdot'] + list(options)
+	start = time.time()
+	ok = waitProg(startProg(command, dotFile, layoutFile), command)
+	if ok:
+		logger.info('Layout computed by %s in %.2fs', ' '.join([prog] + list(options)),
+		            time.time() - start)
+	return ok
+
+## Renders a positioned graph in several formats. The renderers run in
+## parallel, at most one per processor at a time.
+# @param str $layoutFile
+#        The DOT file of the positioned graph, as written by layout
+# @param list $outputs
+#        The (format, output file) pairs to render
+# @return \c True if all formats were rendered
+def renderLayout(layoutFile, outputs):
+	ok = True
+	pending = list(outputs)
+	running = []
+	jobs = max(1, multiprocessing.cpu_count())
+	while pending or running:
+		while pending and len(running) < jobs:
+			fmt, outFile = pending.pop(0)
+			command = RENDER_PROG + ['-T' + fmt]
+			running.append((startProg(command, layoutFile, outFile), command))
+		process, command = running.pop(0)
+		ok = waitProg(process, command) and ok
+	return ok
+
+## Lays out a graph once and renders it in several formats. With a
+## cache, the formats rendered before from the same DOT file are copied
+## from the cache, and the layout is reused for the other ones.
+# @param str $dotFile
+#        The DOT file describing the graph
+# @param str $prog
+#        The layout program
+# @param list $outputs
+#        The (format, output file) pairs to render
+# @param LayoutCache $cache
+#        (optional) The layout cache
+# @param list $options
+#        (optional) More arguments for the layout program
+# @return \c True if all formats were rendered
+def render(dotFile, prog, outputs, cache=None, options=()):
+	options = list(options)
+	if cache is not None:
+		digest = cache.hashFile(dotFile)
+		layoutId = progIdentity(prog)
+		renderId = progIdentity(RENDER_PROG[0])
+		outputs = [(fmt, outFile) for fmt, outFile in outputs
+		           if not cache.get(cache.key(digest, layoutId, renderId, prog, fmt,
+		                                      *options), outFile)]
+		if not outputs:
+			logger.info('Reusing the cached renderings of the graph')
+			return True
+	if len(outputs) == 1 and cache is None:
+		# nothing to share, lay out and render in one go
+		fmt, outFile = outputs[0]
+		command = [prog, '-T' + fmt] + options
+		start = time.time()
+		ok = waitProg(startProg(command, dotFile, outFile), command)
+		if ok:
+			logger.info('Graph laid out by %s and rendered in %.2fs',
+			            ' '.join([prog] + options), time.time() - start)
+		return ok
+	fd, layoutFile = tempfile.mkstemp(suffix='.dot', dir=os.path.dirname(dotFile))
+	os.close(fd)
+	try:
+		if cache is not None:
+			layoutKey = cache.key(digest, layoutId, prog, 'layout', *options)
+			if not cache.get(layoutKey, layoutFile):
+				if not layout(dotFile, prog, layoutFile, options):
+					return False
+				cache.put(layoutKey, layoutFile)
+		elif not layout(dotFile, prog, layoutFile, options):
+			return False
+		if not renderLayout(layoutFile, outputs):
+			return False
+		if cache is not None:
+			for fmt, outFile in outputs:
+				cache.put(cache.key(digest, layoutId, renderId, prog, fmt, *options),
+				          outFile)
+		return True
+	finally:
+		os.remove(layoutFile)
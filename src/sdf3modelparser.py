@@ -43,6 +43,7 @@ import logging
 import utils
 import xml.dom.minidom as xmlparser
 from parsemethods import *
+from dotwriter import nonDefaultAttrs
 
 ## Controller class for parsing SDF3-XML models.
 #
@@ -62,6 +63,7 @@ class Sdf3ModelParser:
 			self.vertical = True
 		else:
 			self.vertical = False
+		self.draft = settings['DRAFT'] == 'YES'
 		
 		## @var logger 
 		#  Logger for this class
@@ -71,6 +73,9 @@ class Sdf3ModelParser:
 
 		## @var vertical 
 		#  \c True if the plot was set to TB (top-bottom)
+
+		## @var draft 
+		#  \c True for a quick preview, without records nor edge labels
 		
 
 	## Function to parse a ForSyDe-XML model and plot a DOT graph,
@@ -98,52 +103,67 @@ class Sdf3ModelParser:
 	
 	def __parseXmlFile(self, root, graph):
 		graph.add_node('dummy',style='invisible')
+		graph.setDefaults('node', shape='box' if self.draft else 'record',
+			style='rounded,filled',
+			fontname='Helvetica', fontsize='12', fillcolor=self.set['ACTOR_BASE_COLOR'])
+		if self.vertical:
+			compassIn='n'
+			compassOut='s'
+		else:
+			compassIn='w'
+			compassOut='e'
 
 		# sdf graph
 		for sdf in root.getElementsByTagName('sdf'):
 			list_of_actors = []
+			nodes = []
+			edges = []
 
 			#child actors
-			for actor in sdf.getElementsByTagName('actor'):
+			actors = sdf.getElementsByTagName('actor')
+			labels = getXpathLabels(actors, self.set.label('ACTOR_TAGS'))
+			for actor, actorLabel in zip(actors, labels):
 
 				actorId    = actor.getAttribute('name')
-				var1, exp  = parseLableTags(self.set['ACTOR_TAGS'])
-				actorLabel = getXpathVarList(actor, exp, var1)
-				logger.debug('Labels for leaf process <' + actorId + '>: ' + str(actorLabel))
+				logger.debug('Labels for leaf process <%s>: %s', actorId, actorLabel)
 
 				list_of_actors.append(actorId)				
 				list_of_ports = getActorPortList(actor, self.set)
-				nodeLabel = buildRecord(actorLabel, list_of_ports)
+				if self.draft:
+					nodeLabel = prettyPrintLables(actorLabel)
+				else:
+					nodeLabel = buildRecord(actorLabel, list_of_ports)
 
 				# add actor node to the graph
-				graph.add_node(actorId, shape='record',\
-                    label = nodeLabel, style='rounded,filled',  fontname='Helvetica', fontsize='12',\
-                    fillcolor = self.set['ACTOR_BASE_COLOR'])
+				nodes.append((actorId, dict(label = nodeLabel)))
+			graph.add_nodes_from(nodes)
 
 			self.logger.debug( 'Found ' + str(len(list_of_actors)) + ' actors' 
 				+ ' \n\t' + str(list_of_actors))
 
 			
 			#channes child nodes
-			for channel in sdf.getElementsByTagName('channel'):
-				channelInfo = getBasicChannelInfo(channel, self.set)
-
-				if self.vertical:
-					compassIn='n'
-					compassOut='s'
-				else:
-					compassIn='w'
-					compassOut='e'
+			channels = sdf.getElementsByTagName('channel')
+			labels = getXpathLabels(channels, self.set.label('CHANNEL_TAGS'))
+			for channel, label in zip(channels, labels):
+				channelInfo = getBasicChannelInfo(channel, self.set, label)
 
 				src = channelInfo.source
 				dst = channelInfo.target
 				src_p = channelInfo.source_port + ':' + compassOut
 				dst_p = channelInfo.target_port + ':' + compassIn
 
-				#add edge
-				graph.add_edge(src, dst, tailport=src_p, headport=dst_p, \
-					label=prettyPrintLables(channelInfo.label))
+				#add edge; in draft mode the edges end on the nodes and
+				#their label is a tooltip
+				if self.draft:
+					attrs = dict(tailport=compassOut, headport=compassIn,
+						tooltip=prettyPrintLables(channelInfo.label))
+				else:
+					attrs = dict(tailport=src_p, headport=dst_p,
+						label=prettyPrintLables(channelInfo.label))
+				edges.append((src, dst, nonDefaultAttrs(attrs, {})))
 				self.logger.debug( 'Added channel %s:%s->%s:%s',src, src_p, dst, dst_p )
+			graph.add_edges_from(edges)
 
 		# flush the root node
 		del root
@@ -172,13 +192,12 @@ class getActorPortList(object):
 	def __init__(self, parentNode, settings):
 		self.in_ports = []
 		self.out_ports = []
-		for port in parentNode.getElementsByTagName('port'):		
+		ports = parentNode.getElementsByTagName('port')
+		labels = getXpathLabels(ports, settings.label('PORT_TAGS'))
+		for port, info in zip(ports, labels):		
 			port_name = port.getAttribute('name')
 			port_dir  = port.getAttribute('type')
-			var1, exp = parseLableTags(settings['PORT_TAGS'])	
-			info = getXpathVarList(port, exp, var1)
-			logger.debug('Labels for port <' + port_name + '>: ' +
-                     str(info))
+			logger.debug('Labels for port <%s>: %s', port_name, info)
 			# build port lists having tuples of name and info
 			if port_dir == 'in':
 				self.in_ports.append((port_name, info))
@@ -207,14 +226,17 @@ class getBasicChannelInfo(object):
     # @param Settings $settings
     #        The f2dot.settings.Settings object holding the run-time
     #        settings
-	def __init__(self, node, settings):
+    # @param list $label
+    #        (optional) The label, if already extracted in bulk
+	def __init__(self, node, settings, label=None):
 		self.name = node.getAttribute('name')
 		self.source = node.getAttribute('srcActor')
 		self.source_port = node.getAttribute('srcPort')
 		self.target = node.getAttribute('dstActor')
 		self.target_port = node.getAttribute('dstPort')
-		var1, exp = parseLableTags(settings['CHANNEL_TAGS'])			
-		self.label = getXpathVarList(node, exp, var1)
+		if label is None:
+			label = settings.label('CHANNEL_TAGS').evaluate(node)
+		self.label = label
 		logger.debug('Labels for channel %s:%s->%s:%s\n  %s', \
 					 self.source, self.source_port, self.target, \
                      self.target_port, self.label)
@@ -45,6 +45,8 @@ import os
 import re
 import utils
 import logging
+import xpath
+from parsemethods import LabelTemplate
 
 
 ## Model class for storing configuration  parameters
@@ -130,7 +132,25 @@ class Settings:
 			self.settingDict['FORMAT'] = args.format
 		if args.prog:
 			self.settingDict['PROG'] = args.prog       
-		self.outPathAndFile = os.path.join(self.outPath, utils.getFileName(self.inFile) + '.' + self.settingDict['FORMAT'])
+		if args.draft:
+			self.settingDict['DRAFT'] = 'YES'
+		if args.focus:
+			self.settingDict['FOCUS'] = args.focus
+		if args.radius is not None:
+			self.settingDict['FOCUS_RADIUS'] = str(args.radius)
+		self.formats = utils.splitBy(self.settingDict['FORMAT'], ',')
+		self.outPathAndFile = self.outputFile(self.formats[0])
+
+		# compiling the label settings once, for all nodes
+		self.labelDict = {}
+		for tag, value in self.settingDict.iteritems():
+			if tag.endswith('_TAGS'):
+				try:
+					self.labelDict[tag] = LabelTemplate(value)
+				except xpath.XPathError, e:
+					self.logger.error("The value for %s (%s) is not a valid label: %s",
+					                  tag, value, e)
+					raise
 		self.logger.debug('Runtime configuration successful')
 
 
@@ -156,12 +176,29 @@ class Settings:
 		utils.copySection(os.path.join(self.runPath,'config',self.configFileName), confFile, '[default settings]')
 		return confFile
 
+	## Returns the path to the output file in a given format
+	# @param str $fmt
+	#        The output format, one of the FORMAT values
+	# @return The absolute path to the output file
+	def outputFile(self, fmt):
+		path = os.path.join(self.outPath, utils.getFileName(self.inFile) + '.' + fmt)
+		if fmt == 'dot' and self.settingDict['COMPRESS_DOT'] == 'YES':
+			path = path + '.gz'
+		return path
+
 	## Method to enable treating a Settings object as a dictionary.
 	# @param str $key 
 	#        the setting name, as defined in the .conf file
 	# @return The value of the config parameter with the name 'key' 
 	def __getitem__(self, key):
 		return self.settingDict[key]
+
+	## Returns a compiled label setting
+	# @param str $key 
+	#        the setting name, one of the \c *_TAGS settings
+	# @return The LabelTemplate object for the setting 'key' 
+	def label(self, key):
+		return self.labelDict[key]
 		
 	## Prints the current settings
 	# @param Settings $self The object pointer
@@ -202,10 +239,16 @@ class Settings:
 	#  Absolte path to the configuration file (str)
 
     ## @var outPathAndFile 
-	#  Absolute path to the output file (str)
+	#  Absolute path to the output file, in the first output format (str)
+
+	## @var formats
+	#  The output formats (list)
 
 	## @var settingDict
 	#  Dictionary containing all other settings (dict)
 
 	## @var constraintDict
 	#  Dictionary containing lists with allowed values for the same keys in settingDict
+
+	## @var labelDict
+	#  Dictionary containing the compiled LabelTemplate objects for the *_TAGS keys in settingDict
@@ -0,0 +1,267 @@
+'''
+ * File:    shardrenderer.py
+ * Author:  George Ungureanu <ugeorge@kth.se>
+ * Purpose: sharded rendering. Each component of a ForSyDe model is
+            plotted on its own, with its composite processes as black
+            boxes linking to the plots of their components, and an
+            index page ties the plots together.
+ * License: BSD3
+'''
+
+'''
+Copyright (c) 2014, George Ungureanu
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are
+met:
+
+1. Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its
+contributors may be used to endorse or promote products derived from
+this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+"AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+'''
+
+import os
+import cgi
+import hashlib
+import logging
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+import renderer
+import dotwriter
+import layoutengine
+from forsydemodelparser import countComponent
+
+logger = logging.getLogger('f2dot.shardrenderer')
+
+## The formats linked through an image map, in an HTML page per shard,
+## rather than through hyperlinks in the image itself
+IMAGE_MAP_FORMATS = ('png', 'gif', 'jpg', 'jpeg', 'jpe', 'bmp')
+
+## Finds the components of a model, from its top component
+# @param str $inPath
+#        The folder of the model
+# @param str $top
+#        The name of the top component
+# @return A dictionary with the names of the child components of each
+#         component, in order of appearance
+def findComponents(inPath, top):
+	children = {}
+	stack = [top]
+	while stack:
+		component = stack.pop()
+		if component in children:
+			continue
+		nodes, edges, composites = countComponent(
+			os.path.join(inPath, component) + '.xml')
+		names = []
+		for name, child in composites:
+			if child not in names:
+				names.append(child)
+		children[component] = names
+		stack.extend(names)
+	return children
+
+## Hashes what the plot of a component depends on: its XML file, the
+## settings and the layout parameters. The components of its composite
+## processes are not part of it, since they are drawn as black boxes.
+# @param str $xmlFile
+#        The XML file of the component
+# @param Settings $settings
+#        The run-time settings
+# @param dict $graphAttrs
+#        The graph attributes
+# @param list $fallbacks
+#        The layout fallbacks in use
+# @return The SHA-1 digest, as a hex string
+def shardDigest(xmlFile, settings, graphAttrs, fallbacks):
+	sha = hashlib.sha1()
+	with open(xmlFile, 'rb') as f:
+		sha.update(f.read())
+	sha.update(repr(sorted(settings.settingDict.items())))
+	sha.update(repr(sorted(graphAttrs.items())))
+	sha.update(repr(list(fallbacks)))
+	return sha.hexdigest()
+
+## Checks whether a shard was rendered before from the same input
+# @param str $stampFile
+#        The file holding the digest of the last rendering
+# @param str $digest
+#        The digest of the input, as returned by shardDigest
+# @param list $outputs
+#        The (format, output file) pairs of the shard
+# @return \c True if the shard is up to date
+def isUpToDate(stampFile, digest, outputs):
+	try:
+		with open(stampFile) as f:
+			if f.read().strip() != digest:
+				return False
+	except IOError:
+		return False
+	return all(os.path.exists(outFile) for fmt, outFile in outputs)
+
+## Renders a shard and records its digest when it succeeds
+# @param tuple $job
+#        The (component, DOT file, program, options, outputs, stamp
+#        file, digest, keepDot) tuple of the shard
+# @param LayoutCache $cache
+#        The layout cache, or \c None
+# @return \c True if the shard was rendered
+def renderShard(job, cache):
+	component, dotFile, prog, options, outputs, stampFile, digest, keepDot = job
+	outputs = [(fmt, outFile) for fmt, outFile in outputs if fmt != 'dot']
+	ok = renderer.render(dotFile, prog, outputs, cache, options)
+	if not keepDot:
+		os.remove(dotFile)
+	if ok:
+		with open(stampFile, 'w') as f:
+			f.write(digest + '\n')
+	else:
+		logger.error('Cannot render the shard of component "%s"', component)
+	return ok
+
+## Writes the HTML page showing a shard rendered as an image, with its
+## image map
+# @param str $shardDir
+#        The folder of the shards
+# @param str $component
+#        The name of the component
+# @param str $fmt
+#        The image format
+# @param str $index
+#        The URL of the index page, relative to the shards
+def writeMapPage(shardDir, component, fmt, index):
+	with open(os.path.join(shardDir, component + '.cmapx')) as f:
+		imageMap = f.read()
+	name = cgi.escape(component, True)
+	with open(os.path.join(shardDir, component + '.html'), 'w') as f:
+		f.write('<html>\n<head><title>' + name + '</title></head>\n<body>\n'
+		        '<p><a href="' + cgi.escape(index, True) + '">index</a></p>\n'
+		        '<img src="' + cgi.escape(component + '.' + fmt, True) +
+		        '" usemap="#' + name + '" alt="' + name + '"/>\n' +
+		        imageMap + '</body>\n</html>\n')
+
+## Writes the index page, with the tree of the components, each one
+## linked to its shard
+# @param str $indexFile
+#        The index page
+# @param str $top
+#        The name of the top component
+# @param dict $children
+#        The child components of each component, as returned by
+#        findComponents
+# @param function $link
+#        Gives the URL of the shard of a component, relative to the
+#        index page
+def writeIndex(indexFile, top, children, link):
+	lines = []
+	def addTree(component, depth):
+		indent = dotwriter.INDENT * depth
+		lines.append(indent + '<li><a href="' + cgi.escape(link(component), True) +
+		             '">' + cgi.escape(component) + '</a>')
+		if children[component]:
+			lines.append(indent + '<ul>')
+			for child in children[component]:
+				addTree(child, depth + 1)
+			lines.append(indent + '</ul>')
+		lines.append(indent + '</li>')
+	addTree(top, 1)
+	with open(indexFile, 'w') as f:
+		f.write('<html>\n<head><title>' + cgi.escape(top) + '</title></head>\n'
+		        '<body>\n<h1>' + cgi.escape(top) + '</h1>\n<ul>\n' +
+		        '\n'.join(lines) + '\n</ul>\n</body>\n</html>\n')
+
+## Plots each component of a ForSyDe model in its own shard, in the
+## folder \c <top>_shards of the output folder, and writes the index
+## page \c <top>.html. The shards whose component and settings did not
+## change since the last run are kept as they are; the other ones are
+## rendered in parallel.
+# @param Settings $settings
+#        The run-time settings
+# @param ForsydeModelParser $parser
+#        The model parser
+# @param dict $graphAttrs
+#        The graph attributes
+# @param LayoutCache $cache
+#        The layout cache, or \c None
+# @param list $fallbacks
+#        The layout fallbacks in use
+# @return \c True if all the shards were plotted
+def plotShards(settings, parser, graphAttrs, cache, fallbacks):
+	top = parser.rootProcess
+	shardName = top + '_shards'
+	shardDir = os.path.join(settings.outPath, shardName)
+	if not os.path.isdir(shardDir):
+		os.makedirs(shardDir)
+
+	# the shards are linked in the first rendered format, through
+	# pages with image maps for the raster formats
+	formats = list(settings.formats)
+	linkFormat = [fmt for fmt in formats if fmt != 'dot'][0]
+	imageMap = linkFormat in IMAGE_MAP_FORMATS
+	if imageMap and 'cmapx' not in formats:
+		formats.append('cmapx')
+	if imageMap:
+		page = lambda component: component + '.html'
+	else:
+		page = lambda component: component + '.' + linkFormat
+
+	children = findComponents(settings.inPath, top)
+	jobs = []
+	for component in sorted(children):
+		xmlFile = os.path.join(settings.inPath, component) + '.xml'
+		outputs = [(fmt, os.path.join(shardDir, component + '.' + fmt))
+		           for fmt in formats]
+		stampFile = os.path.join(shardDir, component + '.stamp')
+		digest = shardDigest(xmlFile, settings, graphAttrs, fallbacks)
+		if isUpToDate(stampFile, digest, outputs):
+			logger.debug('The shard of component "%s" is up to date', component)
+			continue
+		dotFile = os.path.join(shardDir, component + '.dot')
+		G = dotwriter.DotWriter(dotFile, directed=True, strict=False,
+		                        name=component, **graphAttrs)
+		parser.plotComponent(G, component, page)
+		G.close()
+		prog, options = layoutengine.chooseEngine(settings, G.nodeCount, G.edgeCount,
+		                                          fallbacks)
+		jobs.append((component, dotFile, prog, options, outputs, stampFile, digest,
+		             'dot' in formats))
+	logger.info('Rendering %d of %d shards', len(jobs), len(children))
+
+	ok = True
+	if jobs:
+		# the renderings wait for GraphViz processes, so threads are enough
+		pool = ThreadPool(min(len(jobs), max(1, multiprocessing.cpu_count())))
+		try:
+			ok = all(pool.map(lambda job: renderShard(job, cache), jobs))
+		finally:
+			pool.close()
+			pool.join()
+	if not ok:
+		return False
+
+	if imageMap:
+		for component in children:
+			writeMapPage(shardDir, component, linkFormat, '../' + top + '.html')
+	writeIndex(settings.outputFile('html'), top, children,
+	           lambda component: shardName + '/' + page(component))
+	return True
@@ -0,0 +1,149 @@
+'''
+ * File:    xpathprofiler.py
+ * Author:  George Ungureanu <ugeorge@kth.se>
+ * Purpose: instrumentation for the label queries. Records, for each
+            XPath query, how often and how long it was evaluated, and
+            reports the slowest ones along with the setting they come
+            from.
+ * License: BSD3
+'''
+
+'''
+Copyright (c) 2014, George Ungureanu
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are
+met:
+
+1. Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its
+contributors may be used to endorse or promote products derived from
+this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+"AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+'''
+
+## \c True while the queries are being profiled
+active = False
+
+## The statistics of each query, by query string
+stats = {}
+
+## The settings each query comes from, by query string
+origins = {}
+
+## Container for the statistics gathered for one query
+class QueryStats:
+
+	## Class constructor
+	# @param QueryStats $self
+	#        The object pointer
+	# @param str $query
+	#        The XPath query
+	def __init__(self, query):
+		self.query = query
+		self.calls = 0
+		self.totalTime = 0.0
+		self.maxTime = 0.0
+		self.results = 0
+		self.maxResults = 0
+		self.cacheHits = 0
+		self.cacheMisses = 0
+
+	## Records one evaluation of the query
+	# @param QueryStats $self
+	#        The object pointer
+	# @param float $elapsed
+	#        The evaluation time, in seconds
+	# @param int $results
+	#        The number of values returned
+	# @param bool $cached
+	#        \c True if the query was found already compiled, \c False
+	#        if it was compiled for this evaluation
+	def record(self, elapsed, results, cached):
+		self.calls += 1
+		self.totalTime += elapsed
+		self.maxTime = max(self.maxTime, elapsed)
+		self.results += results
+		self.maxResults = max(self.maxResults, results)
+		if cached:
+			self.cacheHits += 1
+		else:
+			self.cacheMisses += 1
+
+## Starts profiling the label queries
+def enable():
+	global active
+	active = True
+	stats.clear()
+
+## Records the setting a query comes from
+# @param str $query
+#        The XPath query
+# @param str $key
+#        The setting key, e.g. \c LEAF_INFO_TAGS
+def addOrigin(query, key):
+	keys = origins.setdefault(query, [])
+	if key not in keys:
+		keys.append(key)
+
+## Records that a query was derived from another one, e.g. by
+## replacing the label variables, and thus comes from the same setting
+# @param str $query
+#        The derived XPath query
+# @param str $template
+#        The query it was derived from
+def addAlias(query, template):
+	for key in origins.get(template, []):
+		addOrigin(query, key)
+
+## Records one evaluation of a query
+# @param str $query
+#        The XPath query
+# @param float $elapsed
+#        The evaluation time, in seconds
+# @param int $results
+#        The number of values returned
+# @param bool $cached
+#        \c True if the query was found already compiled
+def record(query, elapsed, results, cached):
+	try:
+		queryStats = stats[query]
+	except KeyError:
+		queryStats = stats[query] = QueryStats(query)
+	queryStats.record(elapsed, results, cached)
+
+## Builds a report of the slowest queries
+# @param int $count
+#        The number of queries to report
+# @return The readable report, as a string
+def report(count=10):
+	slowest = sorted(stats.itervalues(), key=lambda s: s.totalTime,
+	                 reverse=True)[:count]
+	lines = ['The slowest label queries were:',
+	         '%-24s %8s %10s %10s %8s %8s %8s %8s  %s' %
+	         ('setting', 'calls', 'total(s)', 'max(ms)', 'results',
+	          'max res', 'hits', 'misses', 'query')]
+	for s in slowest:
+		lines.append('%-24s %8d %10.3f %10.3f %8d %8d %8d %8d  %s' %
+		             (','.join(origins.get(s.query, ['?'])), s.calls, s.totalTime,
+		              s.maxTime * 1000, s.results, s.maxResults,
+		              s.cacheHits, s.cacheMisses, s.query.strip()))
+	return '\n'.join(lines)
@@ -0,0 +1,190 @@
+'''
+ * File:    test_focus.py
+ * Author:  George Ungureanu <ugeorge@kth.se>
+ * Purpose: checks the graphs plotted with a focus on a sample ForSyDe
+            model: every edge connects nodes which are declared, and
+            the processes outside of the focus are left out.
+ * License: BSD3
+'''
+
+'''
+Copyright (c) 2014, George Ungureanu
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are
+met:
+
+1. Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its
+contributors may be used to endorse or promote products derived from
+this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+"AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+'''
+
+
+import os
+import re
+import sys
+import shutil
+import argparse
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from src.settings import Settings
+from src.dotwriter import DotWriter
+from src.forsydemodelparser import ForsydeModelParser
+
+## The header of the ForSyDe-IR files
+HEADER = '<?xml version="1.0" ?>\n<!-- Automatically generated by ForSyDe -->\n'
+
+## A leaf process with one input and one output port
+LEAF = '''  <leaf_process name="%s">
+    <port name="iport1" type="int" direction="in"/>
+    <port name="oport1" type="int" direction="out"/>
+    <process_constructor name="comb" moc="sy"/>
+  </leaf_process>
+'''
+
+## A composite process with one input and one output port
+COMPOSITE = '''  <composite_process name="%s" component_name="%s">
+    <port name="iport1" type="int" direction="in"/>
+    <port name="oport1" type="int" direction="out"/>
+  </composite_process>
+'''
+
+## A boundary port of a process network
+PORT = '  <port name="%s" type="int" direction="%s" bound_process="%s" bound_port="%s"/>\n'
+
+## A signal between two processes
+SIGNAL = ('  <signal name="%s" moc="sy" type="int" source="%s" source_port="oport1" '
+          'target="%s" target_port="iport1"/>\n')
+
+## The declared nodes of a DOT file written by DotWriter
+NODE = re.compile(r'^\s*"([^"]*)"(?: \[.*\])?;$', re.M)
+
+## The edges of a DOT file written by DotWriter
+EDGE = re.compile(r'^\s*"([^"]*)" -> "([^"]*)"', re.M)
+
+## Builds a process network of processes in a chain, from its input port
+## to its output port
+# @param str $name
+#        The name of the process network
+# @param list $processes
+#        The processes, as (name, component name) pairs; the component
+#        name is \c None for leaf processes
+# @return The content of the XML file
+def chain(name, processes):
+	names = [process for process, component in processes]
+	text = HEADER + '<process_network name="%s">\n' % name
+	text += PORT % ('iport1', 'in', names[0], 'iport1')
+	text += PORT % ('oport1', 'out', names[-1], 'oport1')
+	for i in range(len(names) - 1):
+		text += SIGNAL % ('s%d' % i, names[i], names[i + 1])
+	for process, component in processes:
+		if component is None:
+			text += LEAF % process
+		else:
+			text += COMPOSITE % (process, component)
+	return text + '</process_network>\n'
+
+class FocusTest(unittest.TestCase):
+
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		# top: p0 -> p1 -> p2 -> p3, p1 and p3 being composite
+		# top_c1: q0 -> q1 -> q2 -> q3
+		models = {
+			'top'    : chain('top', [('p0', None), ('p1', 'top_c1'), ('p2', None),
+			                         ('p3', 'top_c3')]),
+			'top_c1' : chain('top_c1', [('q0', None), ('q1', None), ('q2', None),
+			                            ('q3', None)]),
+			'top_c3' : chain('top_c3', [('r0', None), ('r1', None)]),
+		}
+		for name, text in models.iteritems():
+			with open(os.path.join(self.directory, name + '.xml'), 'w') as f:
+				f.write(text)
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	## Plots the sample model
+	# @param FocusTest $self
+	#        The object pointer
+	# @param str $focus
+	#        The hierarchical ID of the focus, or \c None
+	# @param int $radius
+	#        The radius of the focus, or \c None
+	# @return The nodes declared in the DOT file, and its edges
+	def plot(self, focus=None, radius=None):
+		args = argparse.Namespace(mode='forsyde', generate_config=False, config=None,
+		                          input=os.path.join(self.directory, 'top.xml'),
+		                          output=self.directory, format='dot', prog=None,
+		                          draft=False, focus=focus, radius=radius)
+		settings = Settings(args)
+		dotFile = os.path.join(self.directory, 'top.dot')
+		graph = DotWriter(dotFile)
+		ForsydeModelParser(settings).plotModel(graph)
+		graph.close()
+		with open(dotFile) as f:
+			text = f.read()
+		return set(NODE.findall(text)), EDGE.findall(text)
+
+	## Checks that every edge connects declared nodes
+	# @param FocusTest $self
+	#        The object pointer
+	# @param set $nodes
+	#        The declared nodes
+	# @param list $edges
+	#        The edges, as (tail, head) pairs
+	def checkEdges(self, nodes, edges):
+		self.assertTrue(edges)
+		for tail, head in edges:
+			self.assertIn(tail, nodes, '%s -> %s' % (tail, head))
+			self.assertIn(head, nodes, '%s -> %s' % (tail, head))
+
+	def testWholeModel(self):
+		nodes, edges = self.plot()
+		self.checkEdges(nodes, edges)
+		self.assertIn('top@p3@r1', nodes)
+
+	def testFocusOnLeaf(self):
+		for radius in range(3):
+			nodes, edges = self.plot('top@p1@q0', radius)
+			self.checkEdges(nodes, edges)
+			# the boundary ports of the composite on the path
+			self.assertIn('top@p1@iport1', nodes)
+			self.assertIn('top@p1@oport1', nodes)
+			# p3 is off the path: a stub, for the output port of top
+			self.assertIn('top@p3', nodes)
+			self.assertFalse([n for n in nodes if n.startswith('top@p3@')])
+
+	def testFocusOnComposite(self):
+		for radius in range(3):
+			nodes, edges = self.plot('top@p1', radius)
+			self.checkEdges(nodes, edges)
+			self.assertIn('top@p1@q3', nodes)
+			# composite processes off the path are black boxes
+			self.assertFalse([n for n in nodes if n.startswith('top@p3@')])
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,190 @@
+'''
+ * File:    test_lxmlbackend.py
+ * Author:  George Ungureanu <ugeorge@kth.se>
+ * Purpose: checks that the lxml backend and the bundled XPath engine
+            return identical labels for the label settings, on a
+            sample ForSyDe model. Skipped when lxml is not installed.
+ * License: BSD3
+'''
+
+'''
+Copyright (c) 2014, George Ungureanu
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are
+met:
+
+1. Redistributions of source code must retain the above copyright
+notice, this list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright
+notice, this list of conditions and the following disclaimer in the
+documentation and/or other materials provided with the distribution.
+
+3. Neither the name of the copyright holder nor the names of its
+contributors may be used to endorse or promote products derived from
+this software without specific prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+"AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+'''
+
+
+import os
+import sys
+import unittest
+import xml.dom.minidom as xmlparser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import xpath
+from src import utils
+from src import lxmlbackend
+from src.parsemethods import parseLableTags, getXpathList, getXpathLists
+
+## The folder of the configuration files
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           os.pardir, 'src', 'config')
+
+## The nodes each label setting applies to, as an XPath query
+TAG_NODES = {
+	'LEAF_INFO_TAGS'           : '//leaf_process',
+	'COMPOSITE_INFO_TAGS'      : '//composite_process',
+	'LEAF_PORT_INFO_TAGS'      : '//leaf_process/port',
+	'COMPOSITE_PORT_INFO_TAGS' : '/process_network/port',
+	'SIGNAL_INFO_TAGS'         : '//signal',
+}
+
+## Label settings besides the defaults, with the query shapes used in
+## the examples: predicates, functions and variables
+EXTRA_TAGS = [
+	('LEAF_INFO_TAGS', '<< ./process_constructor/@name >> { ./@name } '
+	                   '{ ./process_constructor/@name && ./process_constructor/argument/@value } '
+	                   '{ ./process_constructor[@name = "$1"]/argument[1]/@name } '
+	                   '{ string(./process_constructor/argument) }'),
+	('LEAF_PORT_INFO_TAGS', '{ ./@name && ./@type }'),
+	('COMPOSITE_PORT_INFO_TAGS', '{ ./@bound_port }'),
+	('SIGNAL_INFO_TAGS', '{ ./@name } { .[@type != "int"]/@moc }'),
+	('COMPOSITE_INFO_TAGS', '{ ./@name } { string(./@component_name) }'),
+]
+
+## A sample ForSyDe model, with leaf and composite processes, ports
+## and signals
+SAMPLE_MODEL = '''<?xml version="1.0" ?>
+<!-- Automatically generated by ForSyDe -->
+<process_network name="top">
+  <port name="iport1" type="int" direction="in" bound_process="p0" bound_port="iport1"/>
+  <port name="oport1" type="std::vector&lt;double&gt;" direction="out" bound_process="p2" bound_port="oport1"/>
+  <signal name="s0" moc="sdf" type="int" source="p0" source_port="oport1" target="p1" target_port="iport1"/>
+  <signal name="s1" moc="sy" type="double" source="p1" source_port="oport1" target="p2" target_port="iport1"/>
+  <leaf_process name="p0">
+    <port name="iport1" type="int" direction="in"/>
+    <port name="oport1" type="int" direction="out"/>
+    <process_constructor name="comb" moc="sy">
+      <argument name="_func" value="p0_func"/>
+    </process_constructor>
+  </leaf_process>
+  <composite_process name="p1" component_name="top_c1">
+    <port name="iport1" type="int" direction="in"/>
+    <port name="oport1" type="double" direction="out"/>
+  </composite_process>
+  <leaf_process name="p2">
+    <port name="iport1" type="double" direction="in"/>
+    <port name="oport1" type="std::vector&lt;double&gt;" direction="out"/>
+    <process_constructor name="delay" moc="sy">
+      <argument name="init" value="0.0"/>
+      <argument name="_func" value="p2_func"/>
+    </process_constructor>
+  </leaf_process>
+</process_network>
+'''
+
+## Reads the default label settings of a configuration file
+# @param str $confFile
+#        The configuration file
+# @return A list of (setting key, label setting) pairs
+def defaultTags(confFile):
+	tags = []
+	for line in utils.getConfigInSection(confFile, '[default settings]'):
+		tag, value = utils.strBeforeAfter(line, '=')
+		if tag in TAG_NODES and value:
+			tags.append((tag, value))
+	return tags
+
+@unittest.skipIf(lxmlbackend.etree is None, 'lxml is not installed')
+class BackendLabelTest(unittest.TestCase):
+
+	def setUp(self):
+		self.document = xmlparser.parseString(SAMPLE_MODEL)
+
+	def tearDown(self):
+		lxmlbackend.setBackend('bundled')
+
+	## Extracts the labels of a setting with one backend
+	# @param BackendLabelTest $self
+	#        The object pointer
+	# @param str $backend
+	#        The XPath backend
+	# @param str $tag
+	#        The setting key
+	# @param str $tags
+	#        The label setting
+	# @return The labels of the nodes the setting applies to
+	def labels(self, backend, tag, tags):
+		lxmlbackend.setBackend(backend)
+		var, queryList = parseLableTags(tags)
+		nodes = self.find(tag)
+		labels = getXpathLists(nodes, queryList, var)
+		if not var:
+			labels += [getXpathList(node, queryList) for node in nodes]
+		return labels
+
+	## Finds the nodes a label setting applies to in the sample model
+	# @param BackendLabelTest $self
+	#        The object pointer
+	# @param str $tag
+	#        The setting key
+	# @return The list of nodes
+	def find(self, tag):
+		return xpath.find(TAG_NODES[tag], self.document)
+
+	## Checks that both backends return the same labels for the settings
+	# @param BackendLabelTest $self
+	#        The object pointer
+	# @param list $tags
+	#        The (setting key, label setting) pairs
+	def checkTags(self, tags):
+		self.assertTrue(tags)
+		for tag, value in tags:
+			self.assertTrue(self.find(tag), tag)
+			self.assertEqual(self.labels('lxml', tag, value),
+			                 self.labels('bundled', tag, value),
+			                 '%s=%s' % (tag, value))
+
+	def testForsydeDefaults(self):
+		self.checkTags(defaultTags(os.path.join(CONFIG_PATH, 'forsyde.conf')))
+
+	def testExtraTags(self):
+		self.checkTags(EXTRA_TAGS)
+
+	## The default queries must be evaluated by lxml itself, rather than
+	## left to the bundled engine, for the comparison to mean anything
+	def testLxmlEvaluatesDefaults(self):
+		for tag, value in defaultTags(os.path.join(CONFIG_PATH, 'forsyde.conf')):
+			var, queryList = parseLableTags(value)
+			queries = [query for queryLine in queryList for query in queryLine]
+			self.assertIsNotNone(lxmlbackend.findEach(queries, self.find(tag)),
+			                     '%s=%s' % (tag, value))
+
+if __name__ == '__main__':
+	unittest.main()
@@ -1,10 +1,14 @@
 from xpath.exceptions import *
+import xpath.adapters
 import xpath.exceptions
 import xpath.expr
+import xpath.group
+import xpath.optimizer
 import xpath.parser
 import xpath.yappsrt
 
-__all__ = ['find', 'findnode', 'findvalue', 'XPathContext', 'XPath']
+__all__ = ['find', 'findnode', 'findvalue', 'findeach', 'findgroup',
+           'findgroupeach', 'iterate', 'XPathContext', 'XPath', 'XPathGroup']
 __all__.extend((x for x in dir(xpath.exceptions) if not x.startswith('_')))
 
 def api(f):
@@ -30,17 +34,21 @@ class XPathContext(object):
         self.default_namespace = None
         self.namespaces = {}
         self.variables = {}
+        self.invariants = {}
 
         if document is not None:
-            if document.nodeType != document.DOCUMENT_NODE:
-                document = document.ownerDocument
-            if document.documentElement is not None:
-                attrs = document.documentElement.attributes
-                for attr in (attrs.item(i) for i in xrange(attrs.length)):
-                    if attr.name == 'xmlns':
-                        self.default_namespace = attr.value
-                    elif attr.name.startswith('xmlns:'):
-                        self.namespaces[attr.name[6:]] = attr.value
+            a = xpath.adapters.adapter(document)
+            document = a.document(document)
+            root = None
+            if document is not None:
+                root = a.document_element(document)
+            if root is not None:
+                for attr in a.attributes(root):
+                    name = a.name(attr)
+                    if name == 'xmlns':
+                        self.default_namespace = a.value(attr)
+                    elif name.startswith('xmlns:'):
+                        self.namespaces[name[6:]] = a.value(attr)
 
         self.update(**kwargs)
 
@@ -77,18 +85,41 @@ class XPathContext(object):
     def findvalues(self, expr, node, **kwargs):
         return xpath.findvalues(expr, node, context=self, **kwargs)
 
+    @api
+    def findeach(self, expr, nodes, **kwargs):
+        return xpath.findeach(expr, nodes, context=self, **kwargs)
+
+    @api
+    def findgroup(self, exprs, node, **kwargs):
+        return xpath.findgroup(exprs, node, context=self, **kwargs)
+
+    @api
+    def findgroupeach(self, exprs, nodes, **kwargs):
+        return xpath.findgroupeach(exprs, nodes, context=self, **kwargs)
+
+    @api
+    def iterate(self, expr, node, **kwargs):
+        return xpath.iterate(expr, node, context=self, **kwargs)
+
 class XPath():
     _max_cache = 100
     _cache = {}
+    # The number of expressions compiled so far, i.e. the misses of the
+    # cache in 'get' (and of the groups built on it).
+    compiled = 0
 
     def __init__(self, expr):
         """Init docs.
         """
+        XPath.compiled += 1
         try:
             parser = xpath.parser.XPath(xpath.parser.XPathScanner(str(expr)))
-            self.expr = parser.XPath()
+            self.expr = xpath.optimizer.optimize(parser.XPath())
         except xpath.yappsrt.SyntaxError, e:
             raise XPathParseError(str(expr), e.pos, e.msg)
+        # Hoisted subexpressions cache their value in the context, so each
+        # evaluation needs a context of its own.
+        self.hoisted = xpath.optimizer.hoisted(self.expr)
 
     @classmethod
     def get(cls, s):
@@ -103,31 +134,74 @@ class XPath():
             cls._cache[s] = expr
             return expr
 
+    def _evaluate(self, node, context, kwargs):
+        if context is None:
+            context = XPathContext(node, **kwargs)
+        elif kwargs or self.hoisted:
+            context = context.clone()
+            context.update(**kwargs)
+        return self.expr.iterate(node, 1, 1, context)
+
     @api
     def find(self, node, context=None, **kwargs):
+        result = self._evaluate(node, context, kwargs)
+        if xpath.expr.streamp(result):
+            result = list(result)
+        return result
+
+    @api
+    def findeach(self, nodes, context=None, **kwargs):
+        """Evaluate the expression with each node of a sequence as the
+        context node.
+
+        All evaluations share one context, which is built from the first
+        node when none is given, so the nodes should belong to the same
+        document.  Returns the list of results, in the order of 'nodes'.
+
+        """
+        nodes = list(nodes)
+        if not nodes:
+            return []
         if context is None:
-            context = XPathContext(node, **kwargs)
-        elif kwargs:
+            context = XPathContext(nodes[0], **kwargs)
+        elif kwargs or self.hoisted:
             context = context.clone()
             context.update(**kwargs)
-        return self.expr.evaluate(node, 1, 1, context)
+        results = []
+        for node in nodes:
+            result = self.expr.iterate(node, 1, 1, context)
+            if xpath.expr.streamp(result):
+                result = list(result)
+            results.append(result)
+        return results
 
     @api
-    def findnode(self, node, context=None, **kwargs):
-        result = self.find(node, context, **kwargs)
-        if not xpath.expr.nodesetp(result):
+    def iterate(self, node, context=None, **kwargs):
+        """Evaluate the expression lazily.
+
+        Returns an iterator over the resulting node-set, in document
+        order.  Location steps are only walked as far as the consumer
+        advances the iterator.
+
+        """
+        result = self._evaluate(node, context, kwargs)
+        if not xpath.expr.streamp(result):
             raise XPathTypeError("expression is not a node-set")
-        if len(result) == 0:
-            return None
-        return result[0]
+        return iter(result)
+
+    @api
+    def findnode(self, node, context=None, **kwargs):
+        for result in self.iterate(node, context, **kwargs):
+            return result
+        return None
 
     @api
     def findvalue(self, node, context=None, **kwargs):
-        result = self.find(node, context, **kwargs)
-        if xpath.expr.nodesetp(result):
-            if len(result) == 0:
-                return None
-            result = xpath.expr.string(result)
+        result = self._evaluate(node, context, kwargs)
+        if xpath.expr.streamp(result):
+            for n in result:
+                return xpath.expr.string_value(n)
+            return None
         return result
 
     @api
@@ -145,6 +219,66 @@ class XPath():
     def __str__(self):
         return str(self.expr)
 
+class XPathGroup(object):
+    """A group of expressions evaluated together on the same context node.
+
+    The location steps shared by the expressions are walked once for all of
+    them (see xpath.group).  The result is the list of the values 'find'
+    would return for each expression, in order.
+
+    """
+    _max_cache = 100
+    _cache = {}
+
+    def __init__(self, exprs):
+        self.paths = [XPath.get(e) for e in exprs]
+        self.trie = xpath.group.StepTrie([p.expr for p in self.paths])
+        self.hoisted = any(p.hoisted for p in self.paths)
+
+    @classmethod
+    def get(cls, exprs):
+        if isinstance(exprs, cls):
+            return exprs
+        key = tuple(exprs)
+        try:
+            return cls._cache[key]
+        except KeyError:
+            if len(cls._cache) > cls._max_cache:
+                cls._cache.clear()
+            group = cls(key)
+            cls._cache[key] = group
+            return group
+
+    def _context(self, node, context, kwargs):
+        if context is None:
+            context = XPathContext(node, **kwargs)
+        elif kwargs or self.hoisted:
+            context = context.clone()
+            context.update(**kwargs)
+        return context
+
+    @api
+    def find(self, node, context=None, **kwargs):
+        context = self._context(node, context, kwargs)
+        return self.trie.evaluate(node, 1, 1, context)
+
+    @api
+    def findeach(self, nodes, context=None, **kwargs):
+        """Evaluate the group with each node of a sequence as the context
+        node, sharing one context as XPath.findeach does.
+
+        """
+        nodes = list(nodes)
+        if not nodes:
+            return []
+        context = self._context(nodes[0], context, kwargs)
+        return [self.trie.evaluate(node, 1, 1, context) for node in nodes]
+
+    def __repr__(self):
+        return '%s.%s(%s)' % (self.__class__.__module__,
+                              self.__class__.__name__,
+                              repr([str(p) for p in self.paths]))
+
 @api
 def find(expr, node, **kwargs):
     return XPath.get(expr).find(node, **kwargs)
@@ -160,3 +294,19 @@ def findvalue(expr, node, **kwargs):
 @api
 def findvalues(expr, node, **kwargs):
     return XPath.get(expr).findvalues(node, **kwargs)
+
+@api
+def findeach(expr, nodes, **kwargs):
+    return XPath.get(expr).findeach(nodes, **kwargs)
+
+@api
+def findgroup(exprs, node, **kwargs):
+    return XPathGroup.get(exprs).find(node, **kwargs)
+
+@api
+def findgroupeach(exprs, nodes, **kwargs):
+    return XPathGroup.get(exprs).findeach(nodes, **kwargs)
+
+@api
+def iterate(expr, node, **kwargs):
+    return XPath.get(expr).iterate(node, **kwargs)
@@ -0,0 +1,457 @@
+"""Node adapters: the interface between the XPath engine and a tree.
+
+The engine never reads node attributes directly.  It asks the adapter
+registered for the class of a node to walk the tree and describe nodes,
+so that queries can run on any tree for which an adapter exists:
+
+  * DomAdapter, the default, handles xml.dom (e.g. minidom) nodes;
+  * EtreeAdapter handles the compact trees built by parse() and
+    fromstring() on top of xml.etree.ElementTree.
+
+An adapter implements the methods of NodeAdapter.  Node types are the
+xml.dom.Node constants, whatever the tree.
+
+"""
+
+from xml.dom import Node
+import xml.etree.ElementTree as ET
+
+XML_NAMESPACE = 'http://www.w3.org/XML/1998/namespace'
+
+# Adapters by node class.
+registry = {}
+
+def register(cls, adapter):
+    """Use 'adapter' for the nodes of class 'cls' and its subclasses."""
+    registry[cls] = adapter
+
+def adapter(node):
+    """Return the adapter for 'node'."""
+    try:
+        return registry[node.__class__]
+    except KeyError:
+        pass
+    cls = node.__class__
+    for base in mro(cls):
+        if base in registry:
+            registry[cls] = registry[base]
+            return registry[cls]
+    # Anything else is assumed to implement the DOM interface.
+    registry[cls] = dom_adapter
+    return dom_adapter
+
+def mro(cls):
+    """Return the method resolution order of a (possibly old-style) class."""
+    bases = [cls]
+    for base in cls.__bases__:
+        bases.extend(mro(base))
+    return bases
+
+class NodeAdapter(object):
+    """Abstract base class for node adapters."""
+
+    def node_type(self, node):
+        """Return the xml.dom.Node type constant of 'node'."""
+
+    def document(self, node):
+        """Return the document node 'node' belongs to, or None."""
+
+    def document_element(self, document):
+        """Return the root element of a document node, or None."""
+
+    def parent(self, node):
+        """Return the parent of 'node', or None.  Attributes have none."""
+
+    def owner_element(self, node):
+        """Return the element an attribute node belongs to."""
+
+    def children(self, node):
+        """Return a sequence over the children of 'node'."""
+
+    def next_sibling(self, node):
+        """Return the sibling following 'node', or None."""
+
+    def previous_sibling(self, node):
+        """Return the sibling preceding 'node', or None."""
+
+    def attributes(self, node):
+        """Return a sequence over the attribute nodes of an element."""
+
+    def get_attribute(self, node, name):
+        """Return the value of the attribute 'name' of an element, or None
+        if there is no such attribute.
+
+        """
+
+    def local_name(self, node):
+        """Return the local name of an element or attribute, the target of
+        a processing instruction, or '' for other nodes.
+
+        """
+
+    def namespace_uri(self, node):
+        """Return the namespace URI of 'node', or None."""
+
+    def name(self, node):
+        """Return the qualified name of an element or attribute, the target
+        of a processing instruction, or '' for other nodes.
+
+        """
+
+    def value(self, node):
+        """Return the value of an attribute, or the data of a text,
+        comment or processing instruction node.
+
+        """
+
+    def element_by_id(self, document, id):
+        """Return the element with the ID 'id' in a document, or None."""
+
+class DomAdapter(NodeAdapter):
+    """Adapter for xml.dom nodes."""
+
+    def node_type(self, node):
+        return node.nodeType
+
+    def document(self, node):
+        if node.nodeType == Node.DOCUMENT_NODE:
+            return node
+        return node.ownerDocument
+
+    def document_element(self, document):
+        return document.documentElement
+
+    def parent(self, node):
+        return node.parentNode
+
+    def owner_element(self, node):
+        return node.ownerElement
+
+    def children(self, node):
+        return node.childNodes
+
+    def next_sibling(self, node):
+        return node.nextSibling
+
+    def previous_sibling(self, node):
+        return node.previousSibling
+
+    def attributes(self, node):
+        attrs = node.attributes
+        if attrs is not None:
+            return (attrs.item(i) for i in xrange(attrs.length))
+        return ()
+
+    def get_attribute(self, node, name):
+        if node.hasAttribute(name):
+            return node.getAttribute(name)
+        return None
+
+    def local_name(self, node):
+        if (node.nodeType == Node.ELEMENT_NODE or
+            node.nodeType == Node.ATTRIBUTE_NODE):
+            return node.localName
+        elif node.nodeType == Node.PROCESSING_INSTRUCTION_NODE:
+            return node.target
+        return ''
+
+    def namespace_uri(self, node):
+        return node.namespaceURI
+
+    def name(self, node):
+        if node.nodeType == Node.ELEMENT_NODE:
+            return node.tagName
+        elif node.nodeType == Node.ATTRIBUTE_NODE:
+            return node.name
+        elif node.nodeType == Node.PROCESSING_INSTRUCTION_NODE:
+            return node.target
+        return ''
+
+    def value(self, node):
+        if node.nodeType == Node.ATTRIBUTE_NODE:
+            return node.value
+        return node.data
+
+    def element_by_id(self, document, id):
+        return document.getElementById(id)
+
+dom_adapter = DomAdapter()
+
+#
+# Compact trees over xml.etree.ElementTree.
+#
+# ElementTree elements have no parent pointer, and keep text and attributes
+# as strings rather than nodes.  The elements of a compact tree record
+# their parent and their index in it, and text and attribute nodes are
+# small value objects naming the element they belong to.  Comments and
+# processing instructions are dropped by the ElementTree parser.
+#
+# The elements are built by the ElementTree parser, but are not
+# ElementTree elements: those keep their fields in a per-instance
+# dictionary, while compact elements have slots, and only the part of the
+# Element interface the tree builder and the adapter use.
+#
+
+class EtreeElement(object):
+    """An element of a compact tree."""
+    __slots__ = ('tag', 'attrib', 'text', 'tail', 'children', 'parent',
+                 'index')
+
+    def __init__(self, tag, attrib):
+        self.tag = tag
+        self.attrib = attrib
+        self.text = None
+        self.tail = None
+        self.children = []
+        self.parent = None
+        self.index = 0
+
+    def __len__(self):
+        return len(self.children)
+
+    def __getitem__(self, index):
+        return self.children[index]
+
+    def __iter__(self):
+        return iter(self.children)
+
+    def append(self, element):
+        self.children.append(element)
+
+    def get(self, key, default=None):
+        return self.attrib.get(key, default)
+
+    def iter(self):
+        """Iterate over this element and its descendants, in document
+        order.
+
+        """
+        stack = [iter([self])]
+        while stack:
+            for elem in stack[-1]:
+                yield elem
+                stack.append(iter(elem.children))
+                break
+            else:
+                stack.pop()
+
+class EtreeDocument(object):
+    """The document node of a compact tree."""
+    node_type = Node.DOCUMENT_NODE
+
+    def __init__(self, root):
+        self.root = root
+        self.ids = None
+        root.parent = self
+        stack = [root]
+        while stack:
+            elem = stack.pop()
+            for i, child in enumerate(elem):
+                child.parent = elem
+                child.index = i
+                stack.append(child)
+
+class EtreeText(object):
+    """A text node: the text or the tail of an element."""
+    __slots__ = ('element', 'tail')
+    node_type = Node.TEXT_NODE
+
+    def __init__(self, element, tail):
+        self.element = element
+        self.tail = tail
+
+    def __eq__(self, other):
+        return (isinstance(other, EtreeText) and
+                self.element is other.element and self.tail == other.tail)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash((id(self.element), self.tail))
+
+class EtreeAttribute(object):
+    """An attribute node."""
+    __slots__ = ('element', 'name')
+    node_type = Node.ATTRIBUTE_NODE
+
+    def __init__(self, element, name):
+        self.element = element
+        self.name = name
+
+    def __eq__(self, other):
+        return (isinstance(other, EtreeAttribute) and
+                self.element is other.element and self.name == other.name)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash((id(self.element), self.name))
+
+def split_tag(tag):
+    """Split an ElementTree {uri}name tag into (uri, name)."""
+    tag = unicode(tag)
+    if tag[:1] == u'{':
+        uri, name = tag[1:].split(u'}', 1)
+        return uri, name
+    return None, tag
+
+class EtreeAdapter(NodeAdapter):
+    """Adapter for compact trees.
+
+    Prefixes are not kept by ElementTree, so name() returns the {uri}name
+    form for names in a namespace other than the xml one.
+
+    """
+
+    def node_type(self, node):
+        if isinstance(node, EtreeElement):
+            return Node.ELEMENT_NODE
+        return node.node_type
+
+    def document(self, node):
+        if isinstance(node, (EtreeText, EtreeAttribute)):
+            node = node.element
+        while isinstance(node, EtreeElement):
+            node = node.parent
+        return node
+
+    def document_element(self, document):
+        return document.root
+
+    def parent(self, node):
+        if isinstance(node, EtreeElement):
+            return node.parent
+        if isinstance(node, EtreeText):
+            if node.tail:
+                return node.element.parent
+            return node.element
+        return None
+
+    def owner_element(self, node):
+        return node.element
+
+    def children(self, node):
+        if isinstance(node, EtreeDocument):
+            return [node.root]
+        if not isinstance(node, EtreeElement):
+            return ()
+        children = []
+        if node.text:
+            children.append(EtreeText(node, False))
+        for child in node:
+            children.append(child)
+            if child.tail:
+                children.append(EtreeText(child, True))
+        return children
+
+    def next_sibling(self, node):
+        if isinstance(node, EtreeElement):
+            if node.tail:
+                return EtreeText(node, True)
+            return self.element_after(node.parent, node.index)
+        if isinstance(node, EtreeText):
+            if node.tail:
+                return self.element_after(node.element.parent,
+                                          node.element.index)
+            return self.element_after(node.element, -1)
+        return None
+
+    def element_after(self, parent, index):
+        if isinstance(parent, EtreeElement) and index + 1 < len(parent):
+            return parent[index + 1]
+        return None
+
+    def previous_sibling(self, node):
+        if isinstance(node, EtreeText):
+            if node.tail:
+                return node.element
+            return None
+        if not isinstance(node, EtreeElement):
+            return None
+        parent = node.parent
+        if not isinstance(parent, EtreeElement):
+            return None
+        if node.index > 0:
+            prev = parent[node.index - 1]
+            if prev.tail:
+                return EtreeText(prev, True)
+            return prev
+        if parent.text:
+            return EtreeText(parent, False)
+        return None
+
+    def attributes(self, node):
+        if isinstance(node, EtreeElement):
+            return [EtreeAttribute(node, name) for name in node.attrib]
+        return ()
+
+    def get_attribute(self, node, name):
+        if name.startswith('xml:'):
+            name = '{%s}%s' % (XML_NAMESPACE, name[4:])
+        return node.get(name)
+
+    def local_name(self, node):
+        if isinstance(node, EtreeElement):
+            return split_tag(node.tag)[1]
+        if isinstance(node, EtreeAttribute):
+            return split_tag(node.name)[1]
+        return ''
+
+    def namespace_uri(self, node):
+        if isinstance(node, EtreeElement):
+            return split_tag(node.tag)[0]
+        if isinstance(node, EtreeAttribute):
+            return split_tag(node.name)[0]
+        return None
+
+    def name(self, node):
+        if isinstance(node, EtreeElement):
+            tag = node.tag
+        elif isinstance(node, EtreeAttribute):
+            tag = node.name
+        else:
+            return ''
+        uri, name = split_tag(tag)
+        if uri == XML_NAMESPACE:
+            return u'xml:' + name
+        return unicode(tag)
+
+    def value(self, node):
+        if isinstance(node, EtreeAttribute):
+            return unicode(node.element.attrib[node.name])
+        if node.tail:
+            return unicode(node.element.tail)
+        return unicode(node.element.text)
+
+    def element_by_id(self, document, id):
+        # Without a DTD, only xml:id attributes declare IDs.
+        if document.ids is None:
+            document.ids = {}
+            xml_id = '{%s}id' % XML_NAMESPACE
+            for elem in document.root.iter():
+                if xml_id in elem.attrib:
+                    document.ids.setdefault(elem.attrib[xml_id], elem)
+        return document.ids.get(id)
+
+etree_adapter = EtreeAdapter()
+for cls in (EtreeElement, EtreeDocument, EtreeText, EtreeAttribute):
+    register(cls, etree_adapter)
+
+def parse(source):
+    """Parse an XML file (a file name or file object) into a compact tree,
+    and return its document node.
+
+    """
+    parser = ET.XMLParser(target=ET.TreeBuilder(element_factory=EtreeElement))
+    return EtreeDocument(ET.parse(source, parser).getroot())
+
+def fromstring(text):
+    """Parse an XML string into a compact tree, and return its document
+    node.
+
+    """
+    parser = ET.XMLParser(target=ET.TreeBuilder(element_factory=EtreeElement))
+    parser.feed(text)
+    return EtreeDocument(parser.close())
@@ -6,6 +6,7 @@ import re
 import xml.dom
 import weakref
 
+from xpath.adapters import adapter, Node
 from xpath.exceptions import *
 import xpath
 
@@ -16,21 +17,80 @@ import xpath
 
 def string_value(node):
     """Compute the string-value of a node."""
-    if (node.nodeType == node.DOCUMENT_NODE or
-        node.nodeType == node.ELEMENT_NODE):
-        s = u''
-        for n in axes['descendant'](node):
-            if n.nodeType == n.TEXT_NODE:
-                s += n.data
-        return s
-
-    elif node.nodeType == node.ATTRIBUTE_NODE:
-        return node.value
-
-    elif (node.nodeType == node.PROCESSING_INSTRUCTION_NODE or
-          node.nodeType == node.COMMENT_NODE or
-          node.nodeType == node.TEXT_NODE):
-        return node.data
+    a = adapter(node)
+    node_type = a.node_type(node)
+    if (node_type == Node.DOCUMENT_NODE or
+        node_type == Node.ELEMENT_NODE):
+        return text_index(node).string_value(node)
+
+    elif (node_type == Node.ATTRIBUTE_NODE or
+          node_type == Node.PROCESSING_INSTRUCTION_NODE or
+          node_type == Node.COMMENT_NODE or
+          node_type == Node.TEXT_NODE):
+        return a.value(node)
+
+class TextIndex(object):
+    """The text nodes of a document, in document order.
+
+    Every element of the document (and the document itself) is mapped to
+    the range of the text nodes it contains, so that its string-value is
+    the join of that range.  String-values are memoized per node, which
+    assumes the document is not modified once it is being queried.
+
+    """
+    __slots__ = ('texts', 'ranges', 'values')
+
+    def __init__(self, document):
+        self.texts = []
+        self.ranges = {}
+        self.values = {}
+
+        # Walk the document iteratively, closing the range of an element
+        # once all of its children have been visited.
+        a = adapter(document)
+        stack = [document]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, tuple):
+                node, start = node
+                self.ranges[node] = (start, len(self.texts))
+                continue
+            node_type = a.node_type(node)
+            if node_type == Node.TEXT_NODE:
+                self.texts.append(a.value(node))
+            elif (node_type == Node.ELEMENT_NODE or
+                  node_type == Node.DOCUMENT_NODE):
+                stack.append((node, len(self.texts)))
+                stack.extend(reversed(list(a.children(node))))
+
+    def string_value(self, node):
+        try:
+            return self.values[node]
+        except KeyError:
+            pass
+        try:
+            start, end = self.ranges[node]
+        except KeyError:
+            # Not part of the indexed document.
+            a = adapter(node)
+            return u''.join(a.value(n) for n in axes['descendant'](node)
+                            if a.node_type(n) == Node.TEXT_NODE)
+        value = self.values[node] = u''.join(self.texts[start:end])
+        return value
+
+def text_index(node):
+    """Return the text index of the document 'node' belongs to, building it
+    on first use.
+
+    """
+    document = adapter(node).document(node)
+    if document is None:
+        return TextIndex(node)
+    try:
+        return document._xpath_text_index
+    except AttributeError:
+        index = document._xpath_text_index = TextIndex(document)
+        return index
 
 def document_order(node):
     """Compute a document order value for the node.
@@ -47,25 +107,28 @@ def document_order(node):
 
     """
 
+    a = adapter(node)
+
     # Attributes: parent-order + [-1, attribute-name]
-    if node.nodeType == node.ATTRIBUTE_NODE:
-        order = document_order(node.ownerElement)
-        order.extend((-1, node.name))
+    if a.node_type(node) == Node.ATTRIBUTE_NODE:
+        order = document_order(a.owner_element(node))
+        order.extend((-1, a.name(node)))
         return order
 
     # The document root (hopefully): []
-    if node.parentNode is None:
+    parent = a.parent(node)
+    if parent is None:
         return []
 
     # Determine which child this is of its parent.
     sibpos = 0
-    sib = node
-    while sib.previousSibling is not None:
+    sib = a.previous_sibling(node)
+    while sib is not None:
         sibpos += 1
-        sib = sib.previousSibling
+        sib = a.previous_sibling(sib)
 
     # Order: parent-order + [sibling-position]
-    order = document_order(node.parentNode)
+    order = document_order(parent)
     order.append(sibpos)
     return order
 
@@ -81,6 +144,8 @@ def document_order(node):
 
 def nodeset(v):
     """Convert a value to a nodeset."""
+    if streamp(v):
+        return list(v)
     if not nodesetp(v):
         raise XPathTypeError, "value is not a node-set"
     return v
@@ -90,8 +155,32 @@ def nodesetp(v):
     if isinstance(v, list):
         return True
 
+class NodeStream(object):
+    """A lazily evaluated node-set.
+
+    Wraps an iterator over nodes in document order, as produced by
+    Expr.iterate().  A stream can be consumed only once; consumers which
+    need the node-set more than once must convert it with nodeset().
+
+    """
+    __slots__ = ('nodes',)
+
+    def __init__(self, nodes):
+        self.nodes = iter(nodes)
+
+    def __iter__(self):
+        return self.nodes
+
+def streamp(v):
+    """Return true iff 'v' is a lazily evaluated node-set."""
+    return isinstance(v, NodeStream)
+
 def string(v):
     """Convert a value to a string."""
+    if streamp(v):
+        for node in v:
+            return string_value(node)
+        return u''
     if nodesetp(v):
         if not v:
             return u''
@@ -116,6 +205,10 @@ def stringp(v):
 
 def boolean(v):
     """Convert a value to a boolean."""
+    if streamp(v):
+        for node in v:
+            return True
+        return False
     if nodesetp(v):
         return len(v) > 0
     elif numberp(v):
@@ -132,7 +225,7 @@ def booleanp(v):
 
 def number(v):
     """Convert a value to a number."""
-    if nodesetp(v):
+    if nodesetp(v) or streamp(v):
         v = string(v)
     try:
         return float(v)
@@ -157,6 +250,25 @@ class Expr(object):
 
         """
 
+    def iterate(self, node, pos, size, context):
+        """Evaluate the expression lazily.
+
+        Takes the same arguments as evaluate().  Returns a NodeStream when
+        the expression evaluates to a node-set, and the plain XPath value
+        otherwise.  Expressions which can produce their node-set one node
+        at a time override this, so that consumers needing only the first
+        node, or only whether there is one, stop the evaluation early.
+
+        """
+        result = self.evaluate(node, pos, size, context)
+        if nodesetp(result):
+            return NodeStream(result)
+        return result
+
+    def children(self):
+        """Return the subexpressions of this expression."""
+        return ()
+
 class BinaryOperatorExpr(Expr):
     """Base class for all binary operators."""
 
@@ -170,6 +282,9 @@ class BinaryOperatorExpr(Expr):
         return self.operate(self.left.evaluate(node, pos, size, context),
                             self.right.evaluate(node, pos, size, context))
 
+    def children(self):
+        return (self.left, self.right)
+
     def __str__(self):
         return '(%s %s %s)' % (self.left, self.op, self.right)
 
@@ -178,16 +293,16 @@ class AndExpr(BinaryOperatorExpr):
 
     def evaluate(self, node, pos, size, context):
         # Note that XPath boolean operations short-circuit.
-        return (boolean(self.left.evaluate(node, pos, size, context) and
-                boolean(self.right.evaluate(node, pos, size, context))))
+        return (boolean(self.left.iterate(node, pos, size, context)) and
+                boolean(self.right.iterate(node, pos, size, context)))
 
 class OrExpr(BinaryOperatorExpr):
     """<x> or <y>"""
 
     def evaluate(self, node, pos, size, context):
         # Note that XPath boolean operations short-circuit.
-        return (boolean(self.left.evaluate(node, pos, size, context) or
-                boolean(self.right.evaluate(node, pos, size, context))))
+        return (boolean(self.left.iterate(node, pos, size, context)) or
+                boolean(self.right.iterate(node, pos, size, context)))
 
 class EqualityExpr(BinaryOperatorExpr):
     """<x> = <y>, <x> != <y>, etc."""
@@ -201,14 +316,22 @@ class EqualityExpr(BinaryOperatorExpr):
         '>'  : operator.gt,
     }
 
+    def evaluate(self, node, pos, size, context):
+        # Node-set operands are compared lazily, so that an existence test
+        # like @x != 0 stops at the first matching node.
+        return self.operate(self.left.iterate(node, pos, size, context),
+                            self.right.iterate(node, pos, size, context))
+
     def operate(self, a, b):
-        if nodesetp(a):
+        if nodesetp(a) or streamp(a):
+            if streamp(b):
+                b = list(b)
             for node in a:
                 if self.operate(string_value(node), b):
                     return True
             return False
 
-        if nodesetp(b):
+        if nodesetp(b) or streamp(b):
             for node in b:
                 if self.operate(a, string_value(node)):
                     return True
@@ -271,6 +394,9 @@ class NegationExpr(Expr):
     def evaluate(self, node, pos, size, context):
         return -number(self.expr.evaluate(node, pos, size, context))
 
+    def children(self):
+        return (self.expr,)
+
     def __str__(self):
         return '(-%s)' % self.expr
 
@@ -289,8 +415,38 @@ class LiteralExpr(Expr):
                 return '"%s"' % self.literal
             else:
                 return "'%s'" % self.literal
+        if booleanp(self.literal):
+            return '%s()' % string(self.literal)
         return string(self.literal)
 
+class InvariantExpr(Expr):
+    """A subexpression which depends neither on the context node nor on
+    the context position and size, as marked by xpath.optimizer.
+
+    Its value is computed once per evaluation context, and reused for
+    every node the enclosing predicate is evaluated for.
+
+    """
+
+    def __init__(self, expr):
+        self.expr = expr
+
+    def evaluate(self, node, pos, size, context):
+        try:
+            value = context.invariants[self]
+        except KeyError:
+            value = self.expr.evaluate(node, pos, size, context)
+            context.invariants[self] = value
+        if nodesetp(value):
+            return list(value)
+        return value
+
+    def children(self):
+        return (self.expr,)
+
+    def __str__(self):
+        return str(self.expr)
+
 class VariableReference(Expr):
     """Variable references."""
 
@@ -333,6 +489,9 @@ class Function(Expr):
             len(self.args) > self.evaluate.maxargs):
             raise XPathTypeError, 'too many arguments for "%s()"' % name
 
+    def children(self):
+        return self.args
+
     #
     # XPath functions are implemented by methods of the Function class.
     #
@@ -350,15 +509,25 @@ class Function(Expr):
                     of the current context node when passed no argument.
                     (e.g., string() and number().)
         convert -- When non-None, a function used to filter function arguments.
+
+        Functions which only look at the first node of their node-set
+        arguments (first, or one of the string, boolean and number
+        conversions) evaluate those arguments lazily.
         """
+        lazy = first or convert in (string, boolean, number)
         def decorator(f):
             def new_f(self, node, pos, size, context):
                 if implicit and len(self.args) == 0:
                     args = [[node]]
+                elif lazy:
+                    args = [x.iterate(node, pos, size, context)
+                            for x in self.args]
                 else:
                     args = [x.evaluate(node, pos, size, context)
                             for x in self.args]
-                if first:
+                if first and streamp(args[0]):
+                    args[0] = next(iter(args[0]), None)
+                elif first:
                     args[0] = nodeset(args[0])
                     if len(args[0]) > 0:
                         args[0] = args[0][0]
@@ -395,38 +564,28 @@ class Function(Expr):
             ids = (string_value(x) for x in arg)
         else:
             ids = [string(arg)]
-        if node.nodeType != node.DOCUMENT_NODE:
-            node = node.ownerDocument
-        return list(filter(None, (node.getElementById(id) for id in ids)))
+        a = adapter(node)
+        document = a.document(node)
+        elements = (a.element_by_id(document, id) for id in ids)
+        return [e for e in elements if e is not None]
 
     @function(0, 1, implicit=True, first=True)
     def f_local_name(self, node, pos, size, context, argnode):
         if argnode is None:
             return ''
-        if (argnode.nodeType == argnode.ELEMENT_NODE or
-            argnode.nodeType == argnode.ATTRIBUTE_NODE):
-            return argnode.localName
-        elif argnode.nodeType == argnode.PROCESSING_INSTRUCTION_NODE:
-            return argnode.target
-        return ''
+        return adapter(argnode).local_name(argnode)
 
     @function(0, 1, implicit=True, first=True)
     def f_namespace_uri(self, node, pos, size, context, argnode):
         if argnode is None:
             return ''
-        return argnode.namespaceURI
+        return adapter(argnode).namespace_uri(argnode)
 
     @function(0, 1, implicit=True, first=True)
     def f_name(self, node, pos, size, context, argnode):
         if argnode is None:
             return ''
-        if argnode.nodeType == argnode.ELEMENT_NODE:
-            return argnode.tagName
-        elif argnode.nodeType == argnode.ATTRIBUTE_NODE:
-            return argnode.name
-        elif argnode.nodeType == argnode.PROCESSING_INSTRUCTION_NODE:
-            return argnode.target
-        return ''
+        return adapter(argnode).name(argnode)
 
     # String Functions
 
@@ -531,9 +690,13 @@ class Function(Expr):
     @function(1, 1, convert=string)
     def f_lang(self, node, pos, size, context, s):
         s = s.lower()
+        a = adapter(node)
         for n in axes['ancestor-or-self'](node):
-            if n.nodeType == n.ELEMENT_NODE and n.hasAttribute('xml:lang'):
-                lang = n.getAttribute('xml:lang').lower()
+            if a.node_type(n) != Node.ELEMENT_NODE:
+                continue
+            lang = a.get_attribute(n, 'xml:lang')
+            if lang is not None:
+                lang = lang.lower()
                 if s == lang or lang.startswith(s + u'-'):
                     return True
                 break
@@ -592,62 +755,78 @@ def make_axes():
 
     @axisfn()
     def child(node):
-        return node.childNodes
+        return adapter(node).children(node)
 
     @axisfn()
     def descendant(node):
-        for child in node.childNodes:
-            for node in descendant_or_self(child):
-                yield node
+        # Walk the subtree with a stack of child iterators, rather than
+        # chaining a generator per level.
+        a = adapter(node)
+        stack = [iter(a.children(node))]
+        while stack:
+            for child in stack[-1]:
+                yield child
+                stack.append(iter(a.children(child)))
+                break
+            else:
+                stack.pop()
 
     @axisfn()
     def parent(node):
-        if node.parentNode is not None:
-            yield node.parentNode
+        parent = adapter(node).parent(node)
+        if parent is not None:
+            yield parent
 
     @axisfn(reverse=True)
     def ancestor(node):
-        while node.parentNode is not None:
-            node = node.parentNode
+        a = adapter(node)
+        node = a.parent(node)
+        while node is not None:
             yield node
+            node = a.parent(node)
 
     @axisfn()
     def following_sibling(node):
-        while node.nextSibling is not None:
-            node = node.nextSibling
+        a = adapter(node)
+        node = a.next_sibling(node)
+        while node is not None:
             yield node
+            node = a.next_sibling(node)
 
     @axisfn(reverse=True)
     def preceding_sibling(node):
-        while node.previousSibling is not None:
-            node = node.previousSibling
+        a = adapter(node)
+        node = a.previous_sibling(node)
+        while node is not None:
             yield node
+            node = a.previous_sibling(node)
 
     @axisfn()
     def following(node):
+        a = adapter(node)
         while node is not None:
-            while node.nextSibling is not None:
-                node = node.nextSibling
-                for n in descendant_or_self(node):
+            sib = a.next_sibling(node)
+            while sib is not None:
+                for n in descendant_or_self(sib):
                     yield n
-            node = node.parentNode
+                sib = a.next_sibling(sib)
+            node = a.parent(node)
 
     @axisfn(reverse=True)
     def preceding(node):
+        a = adapter(node)
         while node is not None:
-            while node.previousSibling is not None:
-                node = node.previousSibling
+            sib = a.previous_sibling(node)
+            while sib is not None:
                 # Could be more efficient here.
-                for n in reversed(list(descendant_or_self(node))):
+                for n in reversed(list(descendant_or_self(sib))):
                     yield n
-            node = node.parentNode
+                sib = a.previous_sibling(sib)
+            node = a.parent(node)
 
     @axisfn(principal_node_type=xml.dom.Node.ATTRIBUTE_NODE)
     def attribute(node):
-        if node.attributes is not None:
-            return (node.attributes.item(i)
-                    for i in xrange(node.attributes.length))
-        return ()
+        return adapter(node).attributes(node)
 
     @axisfn()
     def namespace(node):
@@ -660,9 +839,8 @@ def make_axes():
     @axisfn()
     def descendant_or_self(node):
         yield node
-        for child in node.childNodes:
-            for node in descendant_or_self(child):
-                yield node
+        for child in descendant(node):
+            yield child
 
     @axisfn(reverse=True)
     def ancestor_or_self(node):
@@ -699,6 +877,76 @@ def merge_into_nodeset(target, source):
         target.extend(source)
         target.sort(key=document_order)
 
+#
+# Lazy evaluation helpers.
+#
+
+# Axes along which the nodes selected from a node-set with no node being
+# an ancestor of another are again such a node-set, in document order.
+flat_axes = ('child', 'attribute', 'self')
+
+def step_axis(step):
+    """Return the name of the axis a location step walks along, or None if
+    the step is a filter expression.
+
+    """
+    if isinstance(step, PredicateList):
+        step = step.expr
+    if isinstance(step, AxisStep):
+        return step.axis.__name__
+    return None
+
+def uses_last(expr):
+    """Return true iff the last() function occurs anywhere in 'expr'."""
+    if isinstance(expr, Function) and expr.name == 'last':
+        return True
+    for child in expr.children():
+        if uses_last(child):
+            return True
+    return False
+
+def constant_position(expr):
+    """Return the position selected by a constant numeric predicate such as
+    [1], or None if the predicate is not a numeric literal.
+
+    """
+    if isinstance(expr, PathExpr) and len(expr.steps) == 1:
+        expr = expr.steps[0]
+    if isinstance(expr, LiteralExpr) and numberp(expr.literal):
+        return expr.literal
+    return None
+
+def filter_nodes(pred, nodes, context):
+    """Lazily filter a node iterator through one predicate.
+
+    The predicate must not depend on the context size.  A constant
+    positional predicate stops consuming 'nodes' once its position has
+    been reached.
+
+    """
+    position = constant_position(pred)
+    if position is not None:
+        for i, node in izip(count(1), nodes):
+            if i == position:
+                yield node
+            if i >= position:
+                return
+        return
+
+    for i, node in izip(count(1), nodes):
+        r = pred.iterate(node, i, None, context)
+        if numberp(r):
+            if r == i:
+                yield node
+        elif boolean(r):
+            yield node
+
+def chain_step(step, nodes, context):
+    """Lazily evaluate a location step for each node of a node iterator."""
+    for i, node in enumerate(nodes):
+        for n in step.iterate(node, i+1, None, context):
+            yield n
+
 class AbsolutePathExpr(Expr):
     """Absolute location paths."""
 
@@ -706,12 +954,22 @@ class AbsolutePathExpr(Expr):
         self.path = path
 
     def evaluate(self, node, pos, size, context):
-        if node.nodeType != node.DOCUMENT_NODE:
-            node = node.ownerDocument
+        node = adapter(node).document(node)
         if self.path is None:
             return [node]
         return self.path.evaluate(node, 1, 1, context)
 
+    def iterate(self, node, pos, size, context):
+        node = adapter(node).document(node)
+        if self.path is None:
+            return NodeStream([node])
+        return self.path.iterate(node, 1, 1, context)
+
+    def children(self):
+        if self.path is None:
+            return ()
+        return (self.path,)
+
     def __str__(self):
         return '/%s' % (self.path or '')
 
@@ -743,6 +1001,41 @@ class PathExpr(Expr):
 
         return result
 
+    def streamable(self):
+        """Return true iff the steps of this path can be chained lazily.
+
+        This is the case when every step except the last one selects
+        nodes none of which is an ancestor of another, so that walking
+        the next axis from each of them in turn yields nodes in document
+        order and without duplicates.
+
+        """
+        axes = [step_axis(step) for step in self.steps]
+        if axes[0] not in flat_axes and axes[0] != 'parent':
+            return False
+        for axis in axes[1:-1]:
+            if axis not in flat_axes:
+                return False
+        return axes[-1] in flat_axes or axes[-1] in ('descendant',
+                                                     'descendant-or-self')
+
+    def iterate(self, node, pos, size, context):
+        if len(self.steps) == 1:
+            return self.steps[0].iterate(node, pos, size, context)
+        if not self.streamable():
+            return Expr.iterate(self, node, pos, size, context)
+
+        result = self.steps[0].iterate(node, pos, size, context)
+        if not streamp(result):
+            raise XPathTypeError("path step is not a node-set")
+        nodes = iter(result)
+        for step in self.steps[1:]:
+            nodes = chain_step(step, nodes, context)
+        return NodeStream(nodes)
+
+    def children(self):
+        return self.steps
+
     def __str__(self):
         return '/'.join((str(s) for s in self.steps))
 
@@ -757,6 +1050,10 @@ class PredicateList(Expr):
         self.predicates = predicates
         self.expr = expr
         self.axis = axes[axis]
+        # Without last(), the predicates only need the nodes before the
+        # one being tested, and can filter a node-set lazily.
+        self.streamable = (not self.axis.reverse and
+                           not any(uses_last(p) for p in predicates))
 
     def evaluate(self, node, pos, size, context):
         result = self.expr.evaluate(node, pos, size, context)
@@ -769,7 +1066,7 @@ class PredicateList(Expr):
         for pred in self.predicates:
             match = []
             for i, node in izip(count(1), result):
-                r = pred.evaluate(node, i, len(result), context)
+                r = pred.iterate(node, i, len(result), context)
 
                 # If a predicate evaluates to a number, select the node
                 # with that position.  Otherwise, select nodes for which
@@ -786,6 +1083,21 @@ class PredicateList(Expr):
 
         return result
 
+    def iterate(self, node, pos, size, context):
+        if not self.streamable:
+            return Expr.iterate(self, node, pos, size, context)
+
+        result = self.expr.iterate(node, pos, size, context)
+        if not streamp(result):
+            raise XPathTypeError("predicate input is not a node-set")
+        nodes = iter(result)
+        for pred in self.predicates:
+            nodes = filter_nodes(pred, nodes, context)
+        return NodeStream(nodes)
+
+    def children(self):
+        return [self.expr] + self.predicates
+
     def __str__(self):
         s = str(self.expr)
         if '/' in s:
@@ -812,6 +1124,12 @@ class AxisStep(Expr):
 
         return match
 
+    def iterate(self, node, pos, size, context):
+        if self.axis.reverse:
+            return Expr.iterate(self, node, pos, size, context)
+        return NodeStream(n for n in self.axis(node)
+                          if self.test.match(n, self.axis, context))
+
     def __str__(self):
         return '%s::%s' % (self.axis.__name__, self.test)
 
@@ -833,7 +1151,8 @@ class NameTest(object):
             self.prefix = '*'
 
     def match(self, node, axis, context):
-        if node.nodeType != axis.principal_node_type:
+        a = adapter(node)
+        if a.node_type(node) != axis.principal_node_type:
             return False
 
         if self.prefix != '*':
@@ -843,12 +1162,12 @@ class NameTest(object):
                     namespaceURI = context.namespaces[self.prefix]
                 except KeyError:
                     raise XPathUnknownPrefixError(self.prefix)
-            elif axis.principal_node_type == node.ELEMENT_NODE:
+            elif axis.principal_node_type == Node.ELEMENT_NODE:
                 namespaceURI = context.default_namespace
-            if namespaceURI != node.namespaceURI:
+            if namespaceURI != a.namespace_uri(node):
                 return False
         if self.localName != '*':
-            if self.localName != node.localName:
+            if self.localName != a.local_name(node):
                 return False
         return True
 
@@ -863,8 +1182,9 @@ class PITest(object):
         self.name = name
 
     def match(self, node, axis, context):
-        return (node.nodeType == node.PROCESSING_INSTRUCTION_NODE and
-                (self.name is None or node.target == self.name))
+        a = adapter(node)
+        return (a.node_type(node) == Node.PROCESSING_INSTRUCTION_NODE and
+                (self.name is None or a.name(node) == self.name))
 
     def __str__(self):
         if self.name is None:
@@ -877,14 +1197,14 @@ class PITest(object):
 
 class CommentTest(object):
     def match(self, node, axis, context):
-        return node.nodeType == node.COMMENT_NODE
+        return adapter(node).node_type(node) == Node.COMMENT_NODE
 
     def __str__(self):
         return 'comment()'
 
 class TextTest(object):
     def match(self, node, axis, context):
-        return node.nodeType == node.TEXT_NODE
+        return adapter(node).node_type(node) == Node.TEXT_NODE
 
     def __str__(self):
         return 'text()'
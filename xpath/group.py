@@ -0,0 +1,111 @@
+"""Fused evaluation of several XPath expressions on the same node.
+
+The expressions of a group are split into their location steps, which are
+stored in a trie keyed by step.  A prefix shared by several expressions,
+such as child::process_constructor in
+
+    ./process_constructor/@name
+    ./process_constructor/argument/@value
+
+is then walked once per context node, and every expression ending at a
+node of the trie takes its value from the node-set computed there.
+Expressions which are not location paths occupy a trie node of their own,
+and are evaluated as usual.
+
+"""
+
+import xpath.expr as X
+from xpath.exceptions import XPathTypeError
+
+class Branch(object):
+    """A node of the trie: one location step, following the steps of the
+    branches above it.
+
+    'flat' is true when no node selected by the steps up to and including
+    this one is an ancestor of another, so that the node-sets selected from
+    each of them can be concatenated without reordering.
+
+    """
+    __slots__ = ('step', 'flat', 'branches', 'ends')
+
+    def __init__(self, step, flat):
+        self.step = step
+        self.flat = flat
+        self.branches = {}
+        self.ends = []
+
+def path_steps(expr):
+    """Return the location steps of 'expr', or [expr] if it is not a
+    relative location path.
+
+    """
+    if isinstance(expr, X.PathExpr):
+        return expr.steps
+    return [expr]
+
+class StepTrie(object):
+    """A trie of the location steps of a list of parsed expressions."""
+
+    def __init__(self, exprs):
+        self.size = len(exprs)
+        self.branches = {}
+        for i, expr in enumerate(exprs):
+            branches = self.branches
+            flat = True
+            for depth, step in enumerate(path_steps(expr)):
+                axis = X.step_axis(step)
+                if depth == 0:
+                    flat = axis in X.flat_axes or axis == 'parent'
+                else:
+                    flat = flat and axis in X.flat_axes
+                key = str(step)
+                branch = branches.get(key)
+                if branch is None:
+                    branch = branches[key] = Branch(step, flat)
+                branches = branch.branches
+            branch.ends.append(i)
+
+    def evaluate(self, node, pos, size, context):
+        """Evaluate every expression with 'node' as the context node.
+
+        Returns the list of values, in the order of the expressions given
+        to the constructor; node-sets are returned as lists.
+
+        """
+        values = [None] * self.size
+        for branch in self.branches.itervalues():
+            value = branch.step.iterate(node, pos, size, context)
+            if X.streamp(value):
+                value = list(value)
+            self.fill(branch, value, values, context)
+        return values
+
+    def fill(self, branch, value, values, context):
+        for i in branch.ends:
+            if X.nodesetp(value) and len(branch.ends) > 1:
+                values[i] = list(value)
+            else:
+                values[i] = value
+        if not branch.branches:
+            return
+        if not X.nodesetp(value):
+            raise XPathTypeError("path step is not a node-set")
+        for child in branch.branches.itervalues():
+            self.fill(child, walk(child, value, context), values, context)
+
+def walk(branch, nodes, context):
+    """Evaluate the step of 'branch' for each node of a node-set, and
+    return the union of the selected node-sets.
+
+    """
+    result = []
+    size = len(nodes)
+    for i, node in enumerate(nodes):
+        selected = branch.step.iterate(node, i+1, size, context)
+        if not X.streamp(selected):
+            raise XPathTypeError("path step is not a node-set")
+        if branch.flat:
+            result.extend(selected)
+        else:
+            X.merge_into_nodeset(result, list(selected))
+    return result
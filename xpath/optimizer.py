@@ -0,0 +1,329 @@
+"""Static optimization of parsed XPath expressions.
+
+optimize() rewrites an expression tree, as built by xpath.parser, into an
+equivalent tree which is cheaper to evaluate:
+
+  * constant subexpressions are folded into literals, and paths made of a
+    single step are replaced by that step;
+  * descendant-or-self::node()/child::x is collapsed into descendant::x
+    when no predicate of the child step depends on the context position,
+    and self::node() steps followed by another location step are dropped;
+  * subexpressions of predicates which do not depend on the context node,
+    position or size are hoisted, so that they are evaluated once per
+    query rather than once per node tested by the predicate;
+  * the operands of 'and' and 'or' are reordered by estimated cost, so that
+    cheap operands get the chance to short-circuit expensive ones.
+
+"""
+
+import xpath.expr as X
+from xpath.exceptions import XPathError
+
+# Functions whose value depends on the context, beyond their arguments.
+context_functions = ('last', 'position', 'lang')
+
+# Functions which use the context node when called without arguments.
+implicit_functions = ('local-name', 'namespace-uri', 'name', 'string',
+                      'string-length', 'normalize-space', 'number')
+
+function_types = {
+    'last' : 'number', 'position' : 'number', 'count' : 'number',
+    'id' : 'nodeset', 'local-name' : 'string', 'namespace-uri' : 'string',
+    'name' : 'string', 'string' : 'string', 'concat' : 'string',
+    'starts-with' : 'boolean', 'contains' : 'boolean',
+    'substring-before' : 'string', 'substring-after' : 'string',
+    'substring' : 'string', 'string-length' : 'number',
+    'normalize-space' : 'string', 'translate' : 'string',
+    'boolean' : 'boolean', 'not' : 'boolean', 'true' : 'boolean',
+    'false' : 'boolean', 'lang' : 'boolean', 'number' : 'number',
+    'sum' : 'number', 'floor' : 'number', 'ceiling' : 'number',
+    'round' : 'number',
+}
+
+# Rough relative cost of walking each axis from one node.
+axis_costs = {
+    'self' : 1, 'attribute' : 2, 'parent' : 2, 'namespace' : 2,
+    'child' : 4, 'ancestor' : 6, 'ancestor-or-self' : 6,
+    'following-sibling' : 8, 'preceding-sibling' : 8,
+    'descendant' : 20, 'descendant-or-self' : 20,
+    'following' : 40, 'preceding' : 40,
+}
+
+# Assumed number of nodes a location step selects from one node.
+fanout = 4
+
+def optimize(expr):
+    """Return an optimized expression equivalent to 'expr'.
+
+    The tree is rewritten in place; 'expr' must not be used afterwards.
+
+    """
+    expr = rewrite(expr)
+    expr = hoist(expr, False)
+    expr = reorder(expr)
+    return expr
+
+def hoisted(expr):
+    """Return true iff 'expr' contains hoisted subexpressions."""
+    if isinstance(expr, X.InvariantExpr):
+        return True
+    for child in expr.children():
+        if hoisted(child):
+            return True
+    return False
+
+def map_children(expr, f):
+    """Replace every subexpression of 'expr' with f(subexpression)."""
+    if isinstance(expr, X.BinaryOperatorExpr):
+        expr.left = f(expr.left)
+        expr.right = f(expr.right)
+    elif isinstance(expr, (X.NegationExpr, X.InvariantExpr)):
+        expr.expr = f(expr.expr)
+    elif isinstance(expr, X.Function):
+        expr.args = [f(x) for x in expr.args]
+    elif isinstance(expr, X.PathExpr):
+        expr.steps = [f(x) for x in expr.steps]
+    elif isinstance(expr, X.AbsolutePathExpr):
+        if expr.path is not None:
+            expr.path = f(expr.path)
+    elif isinstance(expr, X.PredicateList):
+        expr.expr = f(expr.expr)
+        expr.predicates = [f(x) for x in expr.predicates]
+    return expr
+
+#
+# Static analysis.
+#
+
+def value_type(expr):
+    """Return the type of the value 'expr' evaluates to ('nodeset',
+    'string', 'boolean' or 'number'), or None if it is not known statically.
+
+    """
+    if isinstance(expr, X.LiteralExpr):
+        if X.booleanp(expr.literal):
+            return 'boolean'
+        if X.numberp(expr.literal):
+            return 'number'
+        return 'string'
+    if isinstance(expr, (X.AndExpr, X.OrExpr, X.EqualityExpr)):
+        return 'boolean'
+    if isinstance(expr, (X.ArithmeticalExpr, X.NegationExpr)):
+        return 'number'
+    if isinstance(expr, (X.UnionExpr, X.AbsolutePathExpr, X.AxisStep)):
+        return 'nodeset'
+    if isinstance(expr, X.PathExpr):
+        if len(expr.steps) == 1:
+            return value_type(expr.steps[0])
+        return 'nodeset'
+    if isinstance(expr, (X.PredicateList, X.InvariantExpr)):
+        return value_type(expr.expr)
+    if isinstance(expr, X.Function):
+        return function_types.get(expr.name)
+    return None
+
+def uses_position(expr):
+    """Return true iff position() or last() occurs anywhere in 'expr'."""
+    if isinstance(expr, X.Function) and expr.name in ('position', 'last'):
+        return True
+    for child in expr.children():
+        if uses_position(child):
+            return True
+    return False
+
+def positional(pred):
+    """Return true iff the predicate may select nodes by their position."""
+    return (value_type(pred) not in ('nodeset', 'string', 'boolean') or
+            uses_position(pred))
+
+def invariant(expr):
+    """Return true iff the value of 'expr' does not depend on the context
+    node, position or size.
+
+    """
+    if isinstance(expr, (X.LiteralExpr, X.VariableReference,
+                         X.AbsolutePathExpr, X.InvariantExpr)):
+        return True
+    if isinstance(expr, (X.BinaryOperatorExpr, X.NegationExpr)):
+        return all(invariant(x) for x in expr.children())
+    if isinstance(expr, X.Function):
+        if expr.name in context_functions:
+            return False
+        if expr.name in implicit_functions and not expr.args:
+            return False
+        return all(invariant(x) for x in expr.args)
+    if isinstance(expr, X.PathExpr):
+        # Later steps are evaluated relative to the first one.
+        return invariant(expr.steps[0])
+    if isinstance(expr, X.PredicateList):
+        return invariant(expr.expr)
+    return False
+
+def cost(expr):
+    """Estimate the relative cost of evaluating 'expr' once."""
+    if isinstance(expr, X.LiteralExpr):
+        return 0
+    if isinstance(expr, (X.VariableReference, X.InvariantExpr)):
+        return 1
+    if isinstance(expr, X.AxisStep):
+        return axis_costs.get(expr.axis.__name__, fanout)
+    if isinstance(expr, X.PredicateList):
+        return cost(expr.expr) + fanout * sum(cost(p) for p in
+                                              expr.predicates)
+    if isinstance(expr, X.PathExpr):
+        c = cost(expr.steps[0])
+        for step in expr.steps[1:]:
+            c += fanout * cost(step)
+        return c
+    return 1 + sum(cost(x) for x in expr.children())
+
+#
+# Rewriting passes.
+#
+
+def literal(expr):
+    return isinstance(expr, X.LiteralExpr)
+
+def fold(expr):
+    """Evaluate a constant expression into a literal.
+
+    Expressions which fail to evaluate are kept, so that the error is
+    raised when the query is evaluated, as it would be without folding.
+
+    """
+    try:
+        return X.LiteralExpr(expr.evaluate(None, 1, 1, None))
+    except (XPathError, TypeError, AttributeError):
+        return expr
+
+def rewrite(expr):
+    """Fold constants and simplify location paths, bottom-up."""
+    expr = map_children(expr, rewrite)
+
+    if isinstance(expr, X.PathExpr):
+        steps = collapse_steps(expr.steps)
+        if len(steps) == 1:
+            return steps[0]
+        expr.steps = steps
+        return expr
+
+    if isinstance(expr, (X.AndExpr, X.OrExpr)):
+        return fold_boolean(expr)
+
+    if isinstance(expr, (X.ArithmeticalExpr, X.EqualityExpr,
+                         X.NegationExpr)):
+        if all(literal(x) for x in expr.children()):
+            return fold(expr)
+        return expr
+
+    if isinstance(expr, X.Function):
+        if (expr.name not in context_functions and expr.name != 'id' and
+            (expr.args or expr.name not in implicit_functions) and
+            all(literal(x) for x in expr.args)):
+            return fold(expr)
+        return expr
+
+    return expr
+
+def fold_boolean(expr):
+    """Drop the literal operands of an 'and' or 'or' chain which do not
+    decide its value, and fold the chain if one of them does.
+
+    """
+    cls = expr.__class__
+    deciding = isinstance(expr, X.OrExpr)
+    operands = []
+    for x in flatten(expr, cls):
+        if literal(x):
+            if X.boolean(x.literal) == deciding:
+                return X.LiteralExpr(deciding)
+        else:
+            operands.append(x)
+    if not operands:
+        return X.LiteralExpr(not deciding)
+    if len(operands) == 1:
+        return X.Function('boolean', operands)
+    return build(cls, expr.op, operands)
+
+def collapse_steps(steps):
+    """Simplify a list of location steps.
+
+    descendant-or-self::node()/child::x becomes descendant::x, and a
+    self::node() step followed by another location step is dropped.
+
+    """
+    result = []
+    i = 0
+    while i < len(steps):
+        step = steps[i]
+        following = steps[i+1] if i+1 < len(steps) else None
+        if (following is not None and anynode_step(step) and
+            X.step_axis(following) is not None):
+            axis = step.axis.__name__
+            if axis == 'self':
+                i += 1
+                continue
+            if axis == 'descendant-or-self':
+                descendant = descendant_step(following)
+                if descendant is not None:
+                    result.append(descendant)
+                    i += 2
+                    continue
+        result.append(step)
+        i += 1
+    return result
+
+def anynode_step(step):
+    return (isinstance(step, X.AxisStep) and
+            isinstance(step.test, X.AnyKindTest))
+
+def descendant_step(step):
+    """Return a descendant step equivalent to descendant-or-self::node()
+    followed by the child step 'step', or None if there is none.
+
+    """
+    if isinstance(step, X.AxisStep):
+        if step.axis.__name__ != 'child':
+            return None
+        return X.AxisStep('descendant', step.test)
+    if (isinstance(step, X.PredicateList) and
+        isinstance(step.expr, X.AxisStep) and
+        step.expr.axis.__name__ == 'child' and
+        not any(positional(p) for p in step.predicates)):
+        return X.PredicateList(X.AxisStep('descendant', step.expr.test),
+                               step.predicates, 'descendant')
+    return None
+
+def hoist(expr, in_predicate):
+    """Wrap the context-independent subexpressions of predicates."""
+    if in_predicate and invariant(expr):
+        if isinstance(expr, (X.LiteralExpr, X.VariableReference,
+                             X.InvariantExpr)):
+            return expr
+        return X.InvariantExpr(expr)
+    if isinstance(expr, X.PredicateList):
+        expr.expr = hoist(expr.expr, in_predicate)
+        expr.predicates = [hoist(p, True) for p in expr.predicates]
+        return expr
+    return map_children(expr, lambda x: hoist(x, in_predicate))
+
+def flatten(expr, cls):
+    """Return the operands of a chain of 'cls' operators."""
+    if isinstance(expr, cls):
+        return flatten(expr.left, cls) + flatten(expr.right, cls)
+    return [expr]
+
+def build(cls, op, operands):
+    expr = operands[0]
+    for x in operands[1:]:
+        expr = cls(op, expr, x)
+    return expr
+
+def reorder(expr):
+    """Sort the operands of 'and' and 'or' chains by increasing cost."""
+    expr = map_children(expr, reorder)
+    if isinstance(expr, (X.AndExpr, X.OrExpr)):
+        operands = flatten(expr, expr.__class__)
+        operands.sort(key=cost)
+        return build(expr.__class__, expr.op, operands)
+    return expr
@@ -1,8 +1,6 @@
 import xpath.expr as X
 from xpath.yappsrt import *
 
-
-from string import *
 import re
 
 class XPathScanner(Scanner):
@@ -2,7 +2,6 @@
 #
 # This module is needed to run generated parsers.
 
-from string import join, count, find, rfind
 import re
 
 class SyntaxError(Exception):
@@ -20,6 +19,10 @@ class NoMoreTokens(Exception):
     pass
 
 class Scanner:
+    # Combined regexes for scanners sharing class-level patterns, keyed by
+    # the scanner class and the restriction they were built for
+    masters = {}
+
     def __init__(self, patterns, ignore, input):
 	"""Patterns is [(terminal,regex)...]
         Ignore is [terminal,...];
@@ -37,6 +40,7 @@ class Scanner:
             self.patterns = []
             for k, r in patterns:
                 self.patterns.append( (k, re.compile(r)) )
+            self.masters = {}
 	
     def token(self, i, restrict=0):
 	"""Get the i'th token, and if i is one past the end, then scan
@@ -45,10 +49,9 @@ class Scanner:
 	if i == len(self.tokens): self.scan(restrict)
 	if i < len(self.tokens):
 	    # Make sure the restriction is more restricted
-	    if restrict and self.restrictions[i]:
-		for r in restrict:
-		    if r not in self.restrictions[i]:
-			raise NotImplementedError("Unimplemented: restriction set changed")
+	    if (restrict and self.restrictions[i] and
+		not self.restrictions[i].issuperset(restrict)):
+		raise NotImplementedError("Unimplemented: restriction set changed")
 	    return self.tokens[i]
 	raise NoMoreTokens()
     
@@ -59,30 +62,56 @@ class Scanner:
 	    output = '%s\n  (@%s)  %s  =  %s' % (output,t[0],t[2],repr(t[3]))
 	return output
     
+    def master(self, restrict):
+	"""Return a regex matching all the patterns allowed by restrict
+	at once, along with the (group index, terminal) pairs to read
+	their matches from, in order of preference."""
+	if restrict:
+	    key = (self.__class__, tuple(restrict))
+	else:
+	    key = (self.__class__, ())
+	try:
+	    return self.masters[key]
+	except KeyError:
+	    pass
+	# Each pattern sits in an optional lookahead with a named group,
+	# so a single match reports every pattern matching at a position
+	# together with its length
+	source = []
+	groups = []
+	for i, (p, regexp) in enumerate(self.patterns):
+	    if restrict and p not in restrict and p not in self.ignore:
+		continue
+	    source.append('(?:(?=(?P<t%d>%s))|)' % (i, regexp.pattern))
+	    groups.append(('t%d' % i, p))
+	master = re.compile(''.join(source))
+	groups = [(master.groupindex[g], p) for g, p in groups]
+	self.masters[key] = (master, groups)
+	return master, groups
+
     def scan(self, restrict):
 	"""Should scan another token and add it to the list, self.tokens,
 	and add the restriction to self.restrictions"""
+	master, groups = self.master(restrict)
 	# Keep looking for a token, ignoring any in self.ignore
 	while 1:
 	    # Search the patterns for the longest match, with earlier
 	    # tokens in the list having preference
 	    best_match = -1
 	    best_pat = '(error)'
-	    for p, regexp in self.patterns:
-		# First check to see if we're ignoring this token
-		if restrict and p not in restrict and p not in self.ignore:
-		    continue
-		m = regexp.match(self.input, self.pos)
-		if m and len(m.group(0)) > best_match:
+	    regs = master.match(self.input, self.pos).regs
+	    for i, p in groups:
+		start, end = regs[i]
+		if start >= 0 and end - start > best_match:
 		    # We got a match that's better than the previous one
 		    best_pat = p
-		    best_match = len(m.group(0))
-		    
+		    best_match = end - start
+
 	    # If we didn't find anything, raise an error
 	    if best_pat == '(error)' and best_match < 0:
 		msg = "Bad Token"
 		if restrict:
-		    msg = "Trying to find one of "+join(restrict,", ")
+		    msg = "Trying to find one of "+", ".join(restrict)
 		raise SyntaxError(self.pos, msg)
 
 	    # If we found something that isn't to be ignored, return it
@@ -95,7 +124,7 @@ class Scanner:
 		# (to prevent looping)
 		if not self.tokens or token != self.tokens[-1]:
 		    self.tokens.append(token)
-		    self.restrictions.append(restrict)
+		    self.restrictions.append(restrict and frozenset(restrict))
 		return
 	    else:
 		# This token should be ignored ..
@@ -126,23 +155,23 @@ def print_error(input, err, scanner):
     """This is a really dumb long function to print error messages nicely."""
     p = err.pos
     # Figure out the line number
-    line = count(input[:p], '\n')
+    line = input[:p].count('\n')
     print err.msg+" on line "+repr(line+1)+":"
     # Now try printing part of the line
     text = input[max(p-80, 0):p+80]
     p = p - max(p-80, 0)
 
     # Strip to the left
-    i = rfind(text[:p], '\n')
-    j = rfind(text[:p], '\r')
+    i = text[:p].rfind('\n')
+    j = text[:p].rfind('\r')
     if i < 0 or (0 <= j < i): i = j
     if 0 <= i < p:
 	p = p - i - 1
 	text = text[i+1:]
 
     # Strip to the right
-    i = find(text,'\n', p)
-    j = find(text,'\r', p)
+    i = text.find('\n', p)
+    j = text.find('\r', p)
     if i < 0 or (0 <= j < i): i = j
     if i >= 0:
 	text = text[:i]
@@ -167,7 +196,7 @@ def wrap_error_reporter(parser, rule):
         try:
             print_error(input, s, parser._scanner)
         except ImportError:
-            print 'Syntax Error',s.msg,'on line',1+count(input[:s.pos], '\n')
+            print 'Syntax Error',s.msg,'on line',1+input[:s.pos].count('\n')
     except NoMoreTokens:
         print 'Could not complete parsing; stopped around here:'
         print parser._scanner